@@ -12,6 +12,7 @@ sys.path.append(str(Path(__file__).parent.parent))
 from models.database import Base
 from models.task import Task, TaskLog
 from models.project import Project
+from models.outbox import TaskOutbox
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
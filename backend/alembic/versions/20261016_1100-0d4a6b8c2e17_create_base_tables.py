@@ -0,0 +1,96 @@
+"""create base tables
+
+Creates ``projects``, ``tasks`` and ``task_logs`` as they were before the
+later revisions added columns and indexes, so ``alembic upgrade head``
+builds the whole schema on an empty database.
+
+Tables that already exist (databases created with
+``Base.metadata.create_all``) are left as they are.
+
+Revision ID: 0d4a6b8c2e17
+Revises:
+Create Date: 2026-10-16 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0d4a6b8c2e17'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+TASK_STATUS = sa.Enum(
+    "PENDING", "PROCESSING", "COMPLETED", "FAILED", "CANCELLED",
+    name="taskstatus"
+)
+
+
+def upgrade() -> None:
+    tables = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if "projects" not in tables:
+        op.create_table(
+            "projects",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("name", sa.String(length=200), nullable=False),
+            sa.Column("description", sa.Text(), nullable=True),
+            sa.Column("xml_path", sa.String(length=500), nullable=True),
+            sa.Column("audio_path", sa.String(length=500), nullable=True),
+            sa.Column("video_path", sa.String(length=500), nullable=True),
+            sa.Column("output_dir", sa.String(length=500), nullable=True),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+            sa.Column("updated_at", sa.DateTime(timezone=True), nullable=True),
+        )
+        op.create_index("ix_projects_id", "projects", ["id"])
+
+    if "tasks" not in tables:
+        op.create_table(
+            "tasks",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("task_id", sa.String(length=100), nullable=False),
+            sa.Column("project_id", sa.Integer(), sa.ForeignKey("projects.id"), nullable=True),
+            sa.Column("task_type", sa.String(length=50), nullable=False),
+            sa.Column("status", TASK_STATUS, nullable=False),
+            sa.Column("progress", sa.Float(), nullable=True),
+            sa.Column("current_step", sa.String(length=200), nullable=True),
+            sa.Column("total_steps", sa.Integer(), nullable=True),
+            sa.Column("completed_steps", sa.Integer(), nullable=True),
+            sa.Column("input_data", sa.Text(), nullable=True),
+            sa.Column("output_data", sa.Text(), nullable=True),
+            sa.Column("error_message", sa.Text(), nullable=True),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+            sa.Column("started_at", sa.DateTime(timezone=True), nullable=True),
+            sa.Column("completed_at", sa.DateTime(timezone=True), nullable=True),
+            sa.Column("updated_at", sa.DateTime(timezone=True), nullable=True),
+            sa.Column("estimated_time", sa.Float(), nullable=True),
+            sa.Column("actual_time", sa.Float(), nullable=True),
+        )
+        op.create_index("ix_tasks_id", "tasks", ["id"])
+        op.create_index("ix_tasks_task_id", "tasks", ["task_id"], unique=True)
+
+    if "task_logs" not in tables:
+        op.create_table(
+            "task_logs",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("task_id", sa.Integer(), sa.ForeignKey("tasks.id"), nullable=False),
+            sa.Column("timestamp", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+            sa.Column("level", sa.String(length=20), nullable=True),
+            sa.Column("message", sa.Text(), nullable=True),
+            sa.Column("step_name", sa.String(length=200), nullable=True),
+            sa.Column("step_progress", sa.Float(), nullable=True),
+            sa.Column("metadata", sa.Text(), nullable=True),
+        )
+        op.create_index("ix_task_logs_id", "task_logs", ["id"])
+
+
+def downgrade() -> None:
+    op.drop_table("task_logs")
+    op.drop_table("tasks")
+    op.drop_table("projects")
+    TASK_STATUS.drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,78 @@
+"""add task priority and hot-path indexes
+
+Adds ``tasks.priority`` and composite indexes backing the list, filter and
+summary queries. On PostgreSQL the indexes are built with
+``CREATE INDEX CONCURRENTLY`` outside the migration transaction so writes to
+``tasks`` / ``task_logs`` are not blocked while they build.
+
+Every step is idempotent, so the revision also applies cleanly to databases
+that were created with ``Base.metadata.create_all``.
+
+Revision ID: 3f9c2a7d1b64
+Revises: 0d4a6b8c2e17
+Create Date: 2026-10-16 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f9c2a7d1b64'
+down_revision: Union[str, None] = '0d4a6b8c2e17'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+INDEXES = [
+    ("ix_tasks_priority_created_id", "tasks", ["priority", "created_at", "id"]),
+    ("ix_tasks_status_priority_created_id", "tasks", ["status", "priority", "created_at", "id"]),
+    ("ix_tasks_project_status_priority_created_id", "tasks",
+     ["project_id", "status", "priority", "created_at", "id"]),
+    ("ix_tasks_status_completed_at", "tasks", ["status", "completed_at"]),
+    ("ix_task_logs_task_timestamp_id", "task_logs", ["task_id", "timestamp", "id"]),
+]
+
+
+def _is_postgresql() -> bool:
+    return op.get_bind().dialect.name == "postgresql"
+
+
+def upgrade() -> None:
+    columns = {c["name"] for c in sa.inspect(op.get_bind()).get_columns("tasks")}
+    if "priority" not in columns:
+        op.add_column(
+            "tasks",
+            sa.Column("priority", sa.Integer(), server_default="5", nullable=False)
+        )
+
+    if _is_postgresql():
+        # CONCURRENTLY cannot run inside a transaction block
+        with op.get_context().autocommit_block():
+            for name, table, columns in INDEXES:
+                op.create_index(
+                    name, table, columns,
+                    postgresql_concurrently=True,
+                    if_not_exists=True
+                )
+    else:
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, if_not_exists=True)
+
+
+def downgrade() -> None:
+    if _is_postgresql():
+        with op.get_context().autocommit_block():
+            for name, table, _ in reversed(INDEXES):
+                op.drop_index(
+                    name, table_name=table,
+                    postgresql_concurrently=True,
+                    if_exists=True
+                )
+    else:
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, if_exists=True)
+
+    op.drop_column("tasks", "priority")
@@ -0,0 +1,34 @@
+"""add task version
+
+Adds ``tasks.version``, a counter bumped on every change to a task so
+clients can long-poll ``GET /api/tasks/{task_id}?wait_for_version=N``.
+
+Revision ID: 8b1e4c2f9a03
+Revises: 3f9c2a7d1b64
+Create Date: 2026-10-16 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b1e4c2f9a03'
+down_revision: Union[str, None] = '3f9c2a7d1b64'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    columns = {c["name"] for c in sa.inspect(op.get_bind()).get_columns("tasks")}
+    if "version" not in columns:
+        op.add_column(
+            "tasks",
+            sa.Column("version", sa.Integer(), server_default="1", nullable=False)
+        )
+
+
+def downgrade() -> None:
+    op.drop_column("tasks", "version")
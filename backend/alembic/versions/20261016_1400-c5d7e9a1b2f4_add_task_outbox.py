@@ -0,0 +1,39 @@
+"""add task outbox
+
+Adds ``task_outbox``, written in the same transaction as the tasks it
+dispatches and drained in batches by the ``relay_task_outbox`` beat task.
+
+Revision ID: c5d7e9a1b2f4
+Revises: 8b1e4c2f9a03
+Create Date: 2026-10-16 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5d7e9a1b2f4'
+down_revision: Union[str, None] = '8b1e4c2f9a03'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if "task_outbox" in sa.inspect(op.get_bind()).get_table_names():
+        return
+    op.create_table(
+        "task_outbox",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("task_id", sa.String(length=100), nullable=False),
+        sa.Column("task_type", sa.String(length=50), nullable=False),
+        sa.Column("priority", sa.Integer(), nullable=True),
+        sa.Column("payload", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("task_outbox")
@@ -0,0 +1,38 @@
+"""
+Weak ETag / conditional GET helpers
+
+Read endpoints attach a weak ``ETag`` derived from a version counter or a
+cheap fingerprint of the data. When the request's ``If-None-Match`` matches,
+the endpoint returns ``304 Not Modified`` without re-serializing (and, where
+the fingerprint is cheaper than the data, without loading the rows).
+"""
+import hashlib
+import json
+from typing import Any, Optional
+
+from fastapi import Request, Response
+
+
+def weak_etag(*parts: Any) -> str:
+    """Build a weak ETag from JSON-serializable parts"""
+    raw = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return f'W/"{hashlib.blake2b(raw.encode(), digest_size=12).hexdigest()}"'
+
+
+def _opaque(tag: str) -> str:
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def etag_matches(request: Request, etag: Optional[str]) -> bool:
+    """Weak comparison of ``etag`` against the request's If-None-Match"""
+    header = request.headers.get("if-none-match")
+    if not header or etag is None:
+        return False
+    if header.strip() == "*":
+        return True
+    return _opaque(etag) in {_opaque(tag) for tag in header.split(",")}
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag})
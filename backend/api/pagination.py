@@ -0,0 +1,80 @@
+"""
+Keyset (cursor) pagination helpers
+
+Cursors are opaque, URL-safe tokens that encode the sort-key values of the
+last row on a page. The next page is fetched with a row-value comparison
+against those values instead of OFFSET, so page N costs the same as page 1
+when an index covers the sort key.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Sequence
+
+from fastapi import HTTPException
+from sqlalchemy import tuple_
+
+from models import Task, TaskLog, Project
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """Encode sort-key values into an opaque cursor"""
+    payload = [
+        {"dt": value.isoformat()} if isinstance(value, datetime) else value
+        for value in values
+    ]
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    """Decode a cursor produced by ``encode_cursor``; 400 on malformed input"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        if not isinstance(payload, list) or len(payload) != size:
+            raise ValueError("cursor size mismatch")
+        return [
+            datetime.fromisoformat(value["dt"]) if isinstance(value, dict) else value
+            for value in payload
+        ]
+    except (ValueError, TypeError, KeyError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+class Keyset:
+    """Sort key for a listing, all columns in the same direction"""
+
+    def __init__(self, *columns, descending: bool = True):
+        self.columns = columns
+        self.descending = descending
+
+    def order_by(self):
+        return [column.desc() if self.descending else column.asc() for column in self.columns]
+
+    def paginate(self, query, cursor: Optional[str] = None, offset: int = 0):
+        """Apply ordering plus either the cursor predicate or OFFSET"""
+        query = query.order_by(*self.order_by())
+
+        if cursor is None:
+            return query.offset(offset)
+
+        if offset:
+            raise HTTPException(status_code=400, detail="offset cannot be combined with cursor")
+
+        values = tuple(decode_cursor(cursor, len(self.columns)))
+        key = tuple_(*self.columns)
+        return query.where(key < values if self.descending else key > values)
+
+    def next_cursor(self, rows: Sequence[Any], limit: int) -> Optional[str]:
+        """Cursor for the page after ``rows``, or None on the last page"""
+        if not rows or len(rows) < limit:
+            return None
+        last = rows[-1]
+        return encode_cursor([getattr(last, column.key) for column in self.columns])
+
+
+# Sort keys used by the list endpoints
+TASK_KEYSET = Keyset(Task.priority, Task.created_at, Task.id)
+TASK_LOG_KEYSET = Keyset(TaskLog.timestamp, TaskLog.id)
+PROJECT_KEYSET = Keyset(Project.id, descending=False)
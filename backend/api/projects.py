@@ -1,7 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from typing import List, Optional
-from models import get_db, Project
+from fastapi import APIRouter, Depends, HTTPException, Query, Header, Request, Response
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Dict, List, Optional
+from datetime import datetime
+from models import get_async_db, AsyncSessionLocal, Project, Task, TaskStatus
+from api.pagination import PROJECT_KEYSET, TASK_KEYSET
+from api.etag import weak_etag, etag_matches, not_modified
+from api.serialization import TASK_COLUMNS, parse_fields, select_tasks, rows_to_dicts, json_response
+from api.sse import open_event_stream, event_stream_response
+from api.websocket import manager
+from services.task_events import task_event
+from services.entity_cache import project_cache, project_key, invalidate_project, task_key
+from services.status_snapshot import status_snapshot
+from services.task_logs import task_pk_cache
 from pydantic import BaseModel
 
 router = APIRouter()
@@ -22,8 +33,31 @@ class ProjectUpdate(BaseModel):
     video_path: Optional[str] = None
     output_dir: Optional[str] = None
 
+async def _task_counts(db: AsyncSession, project_ids: List[int]) -> Dict[int, Dict[str, int]]:
+    """プロジェクトごと・ステータスごとのタスク数を1クエリで集計"""
+    counts = {
+        project_id: {status.value: 0 for status in TaskStatus}
+        for project_id in project_ids
+    }
+    if not project_ids:
+        return counts
+    
+    result = await db.execute(
+        select(Task.project_id, Task.status, func.count())
+        .where(Task.project_id.in_(project_ids))
+        .group_by(Task.project_id, Task.status)
+    )
+    for project_id, status, count in result:
+        counts[project_id][status.value] = count
+    return counts
+
+async def _get_project_or_none(db: AsyncSession, project_id: int) -> Optional[Project]:
+    """IDでプロジェクトを1件取得"""
+    result = await db.execute(select(Project).where(Project.id == project_id))
+    return result.scalar_one_or_none()
+
 @router.post("/")
-async def create_project(project: ProjectCreate, db: Session = Depends(get_db)):
+async def create_project(project: ProjectCreate, db: AsyncSession = Depends(get_async_db)):
     """新しいプロジェクトを作成"""
     db_project = Project(
         name=project.name,
@@ -35,8 +69,8 @@ async def create_project(project: ProjectCreate, db: Session = Depends(get_db)):
     )
     
     db.add(db_project)
-    db.commit()
-    db.refresh(db_project)
+    await db.commit()
+    await db.refresh(db_project)
     
     return {
         "project_id": db_project.id,
@@ -48,36 +82,68 @@ async def create_project(project: ProjectCreate, db: Session = Depends(get_db)):
 async def list_projects(
     limit: int = Query(100, le=1000),
     offset: int = Query(0),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = Query(None, description="前ページの next_cursor（指定時は OFFSET を使わない）"),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """プロジェクト一覧を取得"""
-    projects = db.query(Project).offset(offset).limit(limit).all()
+    """プロジェクト一覧を取得（id の昇順）"""
+    result = await db.execute(PROJECT_KEYSET.paginate(select(Project), cursor, offset).limit(limit))
+    projects = result.scalars().all()
+    
+    # タスク数はページ内の全プロジェクト分をまとめて集計（N+1 を避ける）
+    task_counts = await _task_counts(db, [project.id for project in projects])
+    
+    total = None
+    if cursor is None:
+        total = await db.scalar(select(func.count()).select_from(Project))
     
     return {
-        "projects": [project.to_dict() for project in projects],
-        "total": db.query(Project).count(),
+        "projects": [project.to_dict(task_counts[project.id]) for project in projects],
+        "total": total,
         "limit": limit,
-        "offset": offset
+        "offset": offset,
+        "next_cursor": PROJECT_KEYSET.next_cursor(projects, limit)
     }
 
 @router.get("/{project_id}")
-async def get_project(project_id: int, db: Session = Depends(get_db)):
-    """特定のプロジェクトの詳細を取得"""
-    project = db.query(Project).filter(Project.id == project_id).first()
+async def get_project(
+    project_id: int,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    特定のプロジェクトの詳細を取得（Redis キャッシュ経由）
     
-    if not project:
+    ETag は応答の内容（updated_at・ステータス別のタスク数を含む）から作り、If-None-Match が一致すれば
+    304 を返す（キャッシュにあれば DB を読まない）。
+    """
+    async def load_project():
+        project = await _get_project_or_none(db, project_id)
+        if not project:
+            return None
+        task_counts = await _task_counts(db, [project.id])
+        return project.to_dict(task_counts[project.id])
+    
+    data = await project_cache.get_or_load(project_key(project_id), load_project)
+    
+    if data is None:
         raise HTTPException(status_code=404, detail=f"Project {project_id} not found")
     
-    return project.to_dict()
+    etag = weak_etag("project", data)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    
+    response.headers["ETag"] = etag
+    return data
 
 @router.put("/{project_id}")
 async def update_project(
     project_id: int,
     update: ProjectUpdate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """プロジェクトを更新"""
-    project = db.query(Project).filter(Project.id == project_id).first()
+    project = await _get_project_or_none(db, project_id)
     
     if not project:
         raise HTTPException(status_code=404, detail=f"Project {project_id} not found")
@@ -100,8 +166,9 @@ async def update_project(
     if update.output_dir is not None:
         project.output_dir = update.output_dir
     
-    db.commit()
-    db.refresh(project)
+    await db.commit()
+    await db.refresh(project)
+    await invalidate_project(project_id)
     
     return {
         "project_id": project.id,
@@ -110,16 +177,24 @@ async def update_project(
     }
 
 @router.delete("/{project_id}")
-async def delete_project(project_id: int, db: Session = Depends(get_db)):
+async def delete_project(project_id: int, db: AsyncSession = Depends(get_async_db)):
     """プロジェクトを削除（関連するタスクも削除）"""
-    project = db.query(Project).filter(Project.id == project_id).first()
+    project = await _get_project_or_none(db, project_id)
     
     if not project:
         raise HTTPException(status_code=404, detail=f"Project {project_id} not found")
     
     project_name = project.name
-    db.delete(project)
-    db.commit()
+    # 一緒に削除されるタスクはサマリー・キャッシュからも取り除く
+    tasks = (await db.execute(
+        select(Task.task_id, Task.status).where(Task.project_id == project_id)
+    )).all()
+    await db.delete(project)
+    await db.commit()
+    for task in tasks:
+        status_snapshot.remove(task)
+        task_pk_cache.discard(task.task_id)
+    await project_cache.invalidate(project_key(project_id), *[task_key(task.task_id) for task in tasks])
     
     return {
         "project_id": project_id,
@@ -133,32 +208,78 @@ async def get_project_tasks(
     status: Optional[str] = Query(None),
     limit: int = Query(100, le=1000),
     offset: int = Query(0),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = Query(None, description="前ページの next_cursor（指定時は OFFSET を使わない）"),
+    fields: Optional[str] = Query(None, description="返す列（カンマ区切り、例: task_id,status,progress）"),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """プロジェクトに関連するタスクを取得"""
-    project = db.query(Project).filter(Project.id == project_id).first()
+    """プロジェクトに関連するタスクを取得（priority, created_at, id の降順）"""
+    columns = parse_fields(fields, TASK_COLUMNS)
+    project = await _get_project_or_none(db, project_id)
     
     if not project:
         raise HTTPException(status_code=404, detail=f"Project {project_id} not found")
     
-    from models import Task, TaskStatus
-    
-    query = db.query(Task).filter(Task.project_id == project_id)
+    query = select_tasks(columns, TASK_KEYSET.columns).where(Task.project_id == project_id)
     
     if status:
         try:
             status_enum = TaskStatus(status)
-            query = query.filter(Task.status == status_enum)
+            query = query.where(Task.status == status_enum)
         except ValueError:
             raise HTTPException(status_code=400, detail=f"Invalid status: {status}")
     
-    tasks = query.offset(offset).limit(limit).all()
+    result = await db.execute(TASK_KEYSET.paginate(query, cursor, offset).limit(limit))
+    tasks = result.all()
     
-    return {
+    total = None
+    if cursor is None:
+        total = await db.scalar(select(func.count()).select_from(query.subquery()))
+    
+    return json_response({
         "project_id": project_id,
         "project_name": project.name,
-        "tasks": [task.to_dict() for task in tasks],
-        "total": query.count(),
+        "tasks": rows_to_dicts(tasks, columns),
+        "total": total,
         "limit": limit,
-        "offset": offset
-    }
\ No newline at end of file
+        "offset": offset,
+        "next_cursor": TASK_KEYSET.next_cursor(tasks, limit)
+    })
+
+@router.get("/{project_id}/events")
+async def stream_project_events(
+    project_id: int,
+    since: Optional[str] = Query(None, description="最後に受け取ったイベントID（Last-Event-ID と同じ）"),
+    last_event_id: Optional[str] = Header(None)
+):
+    """
+    プロジェクト内の全タスクの更新を Server-Sent Events で配信
+    
+    イベントIDはタスクの changed_at（updated_at、一度も更新されていなければ created_at）。
+    再接続時は Last-Event-ID より後に更新・作成されたタスクの現在の状態を1クエリで取得して送る。
+    """
+    since = last_event_id or since
+    changed_tasks = []
+    # ストリーム中に DB 接続を保持しないよう、セッションは送信開始前に閉じる
+    async with AsyncSessionLocal() as db:
+        if not await _get_project_or_none(db, project_id):
+            raise HTTPException(status_code=404, detail=f"Project {project_id} not found")
+        if since is not None:
+            try:
+                since_at = datetime.fromisoformat(since)
+            except ValueError:
+                raise HTTPException(status_code=400, detail=f"Invalid event id: {since}")
+            changed_at = func.coalesce(Task.updated_at, Task.created_at)
+            changed_tasks = (await db.execute(
+                select(Task)
+                .where(Task.project_id == project_id, changed_at > since_at)
+                .order_by(changed_at)
+            )).scalars().all()
+    
+    connection = open_event_stream()
+    manager.subscribe_project(connection, project_id)
+    for task in changed_tasks:
+        connection.enqueue({
+            **task_event(task), "type": "task_update", "task_id": task.task_id, "replayed": True
+        })
+    
+    return event_stream_response(connection, id_field="changed_at")
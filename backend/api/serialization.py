@@ -0,0 +1,179 @@
+"""
+Fast JSON path for list endpoints
+
+List endpoints select only the columns they return and encode the rows with
+orjson, instead of loading ORM objects and building a ``to_dict()`` /
+``TaskResponse.from_orm`` per row for FastAPI to re-encode. orjson handles
+datetimes (ISO 8601, same as ``isoformat()``) and enums (their value) natively,
+so each row is a plain ``dict(zip(fields, row))``.
+
+Listings accept a sparse fieldset (``fields=task_id,status,progress``) that
+narrows both the SELECT and the keys of each row.
+
+Large JSON array request bodies (batch creation) can be parsed element by
+element with ``iter_json_array`` while the body is still being received;
+``read_json_array`` adds the size limit and per-element validation.
+"""
+import codecs
+import json
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Sequence
+
+from fastapi import HTTPException, Request
+from fastapi.responses import ORJSONResponse
+from pydantic import ValidationError
+from sqlalchemy import select
+
+from models import Task
+
+# Same keys and order as Task.to_dict() / schemas.task.TaskResponse
+TASK_COLUMNS = (
+    Task.id,
+    Task.task_id,
+    Task.project_id,
+    Task.task_type,
+    Task.status,
+    Task.progress,
+    Task.current_step,
+    Task.total_steps,
+    Task.completed_steps,
+    Task.priority,
+    Task.version,
+    Task.created_at,
+    Task.started_at,
+    Task.completed_at,
+    Task.estimated_time,
+    Task.actual_time,
+    Task.error_message,
+)
+
+
+def parse_fields(fields: Optional[str], columns: Sequence[Any]) -> tuple:
+    """Columns named by a comma-separated ``fields`` parameter, in request order
+
+    Returns all of ``columns`` when ``fields`` is omitted; 400 on unknown names.
+    """
+    if fields is None:
+        return tuple(columns)
+
+    available = {column.key: column for column in columns}
+    names = list(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+    unknown = [name for name in names if name not in available]
+    if not names or unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid fields: {', '.join(unknown) or fields!r} "
+                   f"(available: {', '.join(available)})"
+        )
+    return tuple(available[name] for name in names)
+
+
+def rows_to_dicts(rows: Iterable[Sequence[Any]], columns: Sequence[Any]) -> List[Dict[str, Any]]:
+    """Turn column tuples into dicts keyed by column name
+
+    Trailing values beyond ``columns`` (see ``select_tasks(extra=...)``) are
+    dropped.
+    """
+    fields = tuple(column.key for column in columns)
+    return [dict(zip(fields, row)) for row in rows]
+
+
+def json_response(content: Any, headers: Optional[Dict[str, str]] = None) -> ORJSONResponse:
+    """Encode ``content`` with orjson, bypassing FastAPI's jsonable_encoder"""
+    return ORJSONResponse(content, headers=headers)
+
+
+async def iter_json_array(chunks: AsyncIterator[bytes]) -> AsyncIterator[Any]:
+    """Yield the elements of a top-level JSON array as soon as each is complete
+
+    Only the unparsed tail of the body is buffered, so a caller can stop (e.g.
+    on a size limit or a validation error) before the rest is read. Raises
+    ``ValueError`` on malformed JSON or when the body is not an array.
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    opened = closed = False
+    expect_item = True  # False right after an element, until the next comma
+    count = 0
+    final = False
+
+    while not final:
+        try:
+            buffer += utf8.decode(await chunks.__anext__())
+        except StopAsyncIteration:
+            buffer += utf8.decode(b"", final=True)
+            final = True
+
+        pos = 0
+        while True:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n":
+                pos += 1
+            if pos == len(buffer):
+                break
+            char = buffer[pos]
+            if closed:
+                raise ValueError("Extra data after the JSON array")
+            if not opened:
+                if char != "[":
+                    raise ValueError("Expected a JSON array")
+                opened = True
+                pos += 1
+            elif char == "]" and (not expect_item or count == 0):
+                closed = True
+                pos += 1
+            elif not expect_item:
+                if char != ",":
+                    raise ValueError(f"Expected ',' or ']' at element {count}")
+                expect_item = True
+                pos += 1
+            else:
+                try:
+                    item, end = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    if final:
+                        raise
+                    break  # element not fully received yet
+                if end == len(buffer) and not final:
+                    break  # a number may continue in the next chunk
+                yield item
+                count += 1
+                expect_item = False
+                pos = end
+        buffer = buffer[pos:]
+
+    if not closed:
+        raise ValueError("Unterminated JSON array")
+
+
+async def read_json_array(request: Request, model, limit: int, item_name: str = "items") -> list:
+    """Parse a JSON array body into ``model`` instances one element at a time
+
+    400 as soon as the body holds more than ``limit`` elements (the rest is
+    not read) or on malformed JSON; 422 with the element index in ``loc``
+    when an element fails validation.
+    """
+    items = []
+    try:
+        async for item in iter_json_array(request.stream()):
+            if len(items) == limit:
+                raise HTTPException(status_code=400, detail=f"Maximum {limit} {item_name} per batch")
+            try:
+                items.append(model.parse_obj(item))
+            except ValidationError as e:
+                raise HTTPException(status_code=422, detail=[
+                    {**error, "loc": ("body", len(items), *error["loc"])} for error in e.errors()
+                ])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid JSON body: {e}")
+    return items
+
+
+def select_tasks(columns: Sequence[Any] = TASK_COLUMNS, extra: Sequence[Any] = ()):
+    """SELECT of the task list columns (rows keep attribute access for keyset cursors)
+
+    ``extra`` columns not already in ``columns`` are appended; they carry what
+    the endpoint needs but does not return, e.g. the keyset sort key for
+    ``next_cursor`` when a fieldset leaves it out.
+    """
+    selected = {column.key for column in columns}
+    return select(*columns, *(column for column in extra if column.key not in selected))
@@ -0,0 +1,102 @@
+"""
+Server-Sent Events によるタスク更新の配信
+
+WebSocket を使えないクライアント向け。購読は api.websocket の ConnectionManager に
+登録するので、WebSocket と同じ更新（Redis pub/sub 経由）を同じまとめ方・送信間隔で受け取る。
+無通信が続くとプロキシに切断されないよう、コメント行をハートビートとして送る。
+"""
+import asyncio
+import json
+from typing import AsyncIterator, Optional
+
+from fastapi.responses import StreamingResponse
+
+from config import get_settings
+from api.websocket import ClientConnection, Message, manager
+
+settings = get_settings()
+
+# EventSource の再接続間隔（ミリ秒）
+RETRY_MS = 3000
+
+
+class SSEChannel:
+    """ClientConnection の送信先（WebSocket の代わりにレスポンスへ書き出す）"""
+
+    def __init__(self):
+        # 1件ずつ受け渡し、読み出しが詰まったら ClientConnection 側の送信タイムアウトで閉じる
+        self._messages: "asyncio.Queue[Optional[Message]]" = asyncio.Queue(maxsize=1)
+        self.closed = False
+
+    async def send_json(self, data: dict):
+        await self._messages.put(data)
+
+    async def send_text(self, data: str):
+        await self._messages.put(data)
+
+    async def close(self):
+        self.closed = True
+        try:
+            self._messages.put_nowait(None)
+        except asyncio.QueueFull:
+            pass
+
+    async def get(self) -> Optional[Message]:
+        return await self._messages.get()
+
+
+def format_event(message: Message, id_field: str) -> str:
+    """1メッセージを SSE のイベントに変換（id_field の値を id: にする）"""
+    lines = []
+    if isinstance(message, dict):
+        event_id = message.get(id_field)
+        if event_id is not None:
+            lines.append(f"id: {event_id}")
+        lines.append(f"event: {message.get('type', 'message')}")
+        lines.append(f"data: {json.dumps(message)}")
+    else:
+        lines.append(f"data: {message}")
+    return "\n".join(lines) + "\n\n"
+
+
+async def _stream(
+    connection: ClientConnection,
+    channel: SSEChannel,
+    id_field: str,
+    heartbeat_interval: float
+) -> AsyncIterator[str]:
+    try:
+        yield f"retry: {RETRY_MS}\n\n"
+        while not channel.closed:
+            try:
+                message = await asyncio.wait_for(channel.get(), heartbeat_interval)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            if message is not None:
+                yield format_event(message, id_field)
+    finally:
+        await manager.disconnect(connection)
+
+
+def open_event_stream() -> ClientConnection:
+    """SSE 用の接続を ConnectionManager に登録する（購読・リプレイはこの接続に対して行う）"""
+    return manager.attach(SSEChannel())
+
+
+def event_stream_response(
+    connection: ClientConnection,
+    id_field: str = "event_id",
+    heartbeat_interval: float = None
+) -> StreamingResponse:
+    """登録済みの接続に届いた更新を text/event-stream で返す"""
+    return StreamingResponse(
+        _stream(
+            connection,
+            connection.websocket,
+            id_field,
+            heartbeat_interval or settings.SSE_HEARTBEAT_INTERVAL
+        ),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -1,171 +1,153 @@
-from fastapi import APIRouter, Depends, WebSocket, WebSocketDisconnect
-from sqlalchemy.orm import Session
-from typing import Dict, List
-import json
-import asyncio
-from models import get_db, Task, TaskStatus
+from typing import Optional
+from fastapi import APIRouter, Depends, Query, Request, Response, WebSocket, WebSocketDisconnect
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import get_async_db, Task, TaskStatus
+from api.etag import weak_etag, etag_matches, not_modified
+from api.serialization import parse_fields, select_tasks, rows_to_dicts, json_response
+from api.websocket import manager, deliver_task_event, replay_task_events
+from services.status_snapshot import status_snapshot
+from services.task_events import TaskEventSubscriber, task_event
 
 router = APIRouter()
 
-# WebSocket接続を管理
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: Dict[str, List[WebSocket]] = {}
-    
-    async def connect(self, websocket: WebSocket, task_id: str):
-        await websocket.accept()
-        if task_id not in self.active_connections:
-            self.active_connections[task_id] = []
-        self.active_connections[task_id].append(websocket)
-    
-    def disconnect(self, websocket: WebSocket, task_id: str):
-        if task_id in self.active_connections:
-            self.active_connections[task_id].remove(websocket)
-            if not self.active_connections[task_id]:
-                del self.active_connections[task_id]
-    
-    async def send_update(self, task_id: str, data: dict):
-        if task_id in self.active_connections:
-            disconnected = []
-            for connection in self.active_connections[task_id]:
-                try:
-                    await connection.send_json(data)
-                except:
-                    disconnected.append(connection)
-            
-            # 切断された接続を削除
-            for conn in disconnected:
-                self.active_connections[task_id].remove(conn)
+async def handle_task_event(task_id: str, data: dict):
+    """ワーカーが Redis に publish した更新をサマリーに反映し、このプロセスの購読者へ転送"""
+    status_snapshot.apply_event(data)
+    await deliver_task_event(task_id, data)
+
+task_events = TaskEventSubscriber(handle_task_event)
 
-manager = ConnectionManager()
+@router.on_event("startup")
+async def start_task_events():
+    await task_events.start()
+
+@router.on_event("shutdown")
+async def stop_task_events():
+    await task_events.stop()
 
 @router.websocket("/ws/{task_id}")
-async def websocket_endpoint(websocket: WebSocket, task_id: str):
-    """WebSocket接続でリアルタイムステータス更新を配信"""
-    await manager.connect(websocket, task_id)
+async def websocket_endpoint(websocket: WebSocket, task_id: str, since: Optional[str] = None):
+    """
+    WebSocket接続でリアルタイムステータス更新を配信（1タスク用）
+    
+    再接続時は最後に受け取った event_id を since に渡すと、取りこぼした更新だけが
+    再送される（GET /api/tasks/{task_id} で状態を取り直す必要はない）。
+    複数タスク・プロジェクトを1本の接続で購読する場合は /ws/tasks を使う。
+    """
+    connection = await manager.connect(websocket)
     
     try:
+        # リプレイに失敗しても finally で接続を外す
+        manager.subscribe_task(connection, task_id)
+        if since is not None:
+            await replay_task_events(connection, task_id, since)
+        
         while True:
             # クライアントからのメッセージを待機
             data = await websocket.receive_text()
             
             # pingメッセージへの応答
             if data == "ping":
-                await websocket.send_text("pong")
+                connection.enqueue("pong")
     
     except WebSocketDisconnect:
-        manager.disconnect(websocket, task_id)
+        pass
+    finally:
+        await manager.disconnect(connection)
 
 @router.get("/summary")
-async def get_status_summary(db: Session = Depends(get_db)):
-    """全体のステータスサマリーを取得"""
-    
-    # 各ステータスのタスク数を集計
-    status_counts = {}
-    for status in TaskStatus:
-        count = db.query(Task).filter(Task.status == status).count()
-        status_counts[status.value] = count
-    
-    # 実行中のタスクの詳細
-    processing_tasks = db.query(Task).filter(
-        Task.status == TaskStatus.PROCESSING
-    ).all()
-    
-    # 最近完了したタスク（最新10件）
-    recent_completed = db.query(Task).filter(
-        Task.status == TaskStatus.COMPLETED
-    ).order_by(Task.completed_at.desc()).limit(10).all()
-    
-    # 最近失敗したタスク（最新5件）
-    recent_failed = db.query(Task).filter(
-        Task.status == TaskStatus.FAILED
-    ).order_by(Task.completed_at.desc()).limit(5).all()
-    
-    return {
-        "status_counts": status_counts,
-        "total_tasks": sum(status_counts.values()),
-        "processing_tasks": [
-            {
-                "task_id": task.task_id,
-                "task_type": task.task_type,
-                "progress": task.progress,
-                "current_step": task.current_step,
-                "started_at": task.started_at.isoformat() if task.started_at else None
-            }
-            for task in processing_tasks
-        ],
-        "recent_completed": [
-            {
-                "task_id": task.task_id,
-                "task_type": task.task_type,
-                "completed_at": task.completed_at.isoformat() if task.completed_at else None,
-                "actual_time": task.actual_time
-            }
-            for task in recent_completed
-        ],
-        "recent_failed": [
-            {
-                "task_id": task.task_id,
-                "task_type": task.task_type,
-                "error_message": task.error_message,
-                "failed_at": task.completed_at.isoformat() if task.completed_at else None
-            }
-            for task in recent_failed
-        ]
-    }
+async def get_status_summary(
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    全体のステータスサマリーを取得
+    
+    API経由の状態遷移を差分反映したスナップショットを返す。
+    ワーカー側の更新は最大 STATUS_SUMMARY_MAX_STALENESS 秒遅れて反映される。
+    If-None-Match が一致すれば 304 を返す（スナップショットが新しければ DB も読まない）。
+    """
+    summary = await status_snapshot.get(db)
+    etag = status_snapshot.etag
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    
+    response.headers["ETag"] = etag
+    return summary
+
+ACTIVE_STATUSES = [TaskStatus.PENDING, TaskStatus.PROCESSING]
+ACTIVE_COLUMNS = (
+    Task.task_id,
+    Task.task_type,
+    Task.status,
+    Task.progress,
+    Task.current_step,
+    Task.total_steps,
+    Task.completed_steps,
+    Task.created_at,
+    Task.started_at,
+    Task.estimated_time,
+)
+
+def _active_etag(versions: list, columns: tuple) -> str:
+    # アクティブな全タスクの (id, version) を id 順に並べたもの。
+    # タスクの入れ替わり・更新（version の増加）は必ずどれかの組に現れる。列の指定ごとに別の表現
+    return weak_etag("active", sorted(versions), [column.key for column in columns])
 
 @router.get("/active")
-async def get_active_tasks(db: Session = Depends(get_db)):
-    """アクティブなタスク（実行中・保留中）を取得"""
-    
-    active_tasks = db.query(Task).filter(
-        Task.status.in_([TaskStatus.PENDING, TaskStatus.PROCESSING])
-    ).order_by(Task.created_at.asc()).all()
-    
-    return {
-        "active_tasks": [
-            {
-                "task_id": task.task_id,
-                "task_type": task.task_type,
-                "status": task.status.value,
-                "progress": task.progress,
-                "current_step": task.current_step,
-                "total_steps": task.total_steps,
-                "completed_steps": task.completed_steps,
-                "created_at": task.created_at.isoformat() if task.created_at else None,
-                "started_at": task.started_at.isoformat() if task.started_at else None,
-                "estimated_time": task.estimated_time
-            }
-            for task in active_tasks
-        ],
+async def get_active_tasks(
+    request: Request,
+    fields: Optional[str] = Query(None, description="返す列（カンマ区切り、例: task_id,status,progress）"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    アクティブなタスク（実行中・保留中）を取得
+    
+    If-None-Match がある場合は id と version だけを読んで ETag を作り、
+    一致すれば表示用の列を読まずに 304 を返す。
+    """
+    columns = parse_fields(fields, ACTIVE_COLUMNS)
+    if request.headers.get("if-none-match"):
+        versions = (await db.execute(
+            select(Task.id, Task.version).where(Task.status.in_(ACTIVE_STATUSES))
+        )).all()
+        etag = _active_etag([tuple(row) for row in versions], columns)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+    
+    # 表示する列（と ETag 用の id, version）だけを取得して orjson でそのまま返す
+    active_tasks = (await db.execute(
+        select_tasks(columns, (Task.id, Task.version)).where(
+            Task.status.in_(ACTIVE_STATUSES)
+        ).order_by(Task.created_at.asc())
+    )).all()
+    
+    etag = _active_etag([(task.id, task.version) for task in active_tasks], columns)
+    return json_response({
+        "active_tasks": rows_to_dicts(active_tasks, columns),
         "total": len(active_tasks)
-    }
+    }, headers={"ETag": etag})
 
 @router.post("/notify/{task_id}")
 async def notify_task_update(
     task_id: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """タスク更新をWebSocketクライアントに通知"""
     
-    task = db.query(Task).filter(Task.task_id == task_id).first()
+    result = await db.execute(select(Task).where(Task.task_id == task_id))
+    task = result.scalar_one_or_none()
     
     if not task:
         return {"error": f"Task {task_id} not found"}
     
     # WebSocketで接続中のクライアントに更新を送信
-    await manager.send_update(task_id, {
-        "task_id": task.task_id,
-        "status": task.status.value,
-        "progress": task.progress,
-        "current_step": task.current_step,
-        "total_steps": task.total_steps,
-        "completed_steps": task.completed_steps,
-        "updated_at": task.updated_at.isoformat() if task.updated_at else None
-    })
+    await deliver_task_event(task_id, task_event(task))
     
     return {
         "task_id": task_id,
         "status": "notified",
-        "connections": len(manager.active_connections.get(task_id, []))
+        "connections": manager.subscriber_count(task_id)
     }
\ No newline at end of file
@@ -1,18 +1,43 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Header, Request, Response
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import select, func, insert, update, bindparam
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
+from collections import defaultdict
 from datetime import datetime
+from types import SimpleNamespace
+import asyncio
+import json
 import uuid
-from models import get_db, Task, TaskStatus, TaskLog
-from pydantic import BaseModel
+from models import get_async_db, AsyncSessionLocal, Task, TaskStatus, TaskLog
+from api.pagination import TASK_KEYSET, TASK_LOG_KEYSET
+from api.etag import weak_etag, etag_matches, not_modified
+from api.serialization import (
+    TASK_COLUMNS, parse_fields, select_tasks, rows_to_dicts, json_response, read_json_array
+)
+from api.sse import open_event_stream, event_stream_response
+from api.websocket import manager, replay_task_events
+from services.task_events import task_event, publish_task_update
+from services.task_waiters import task_waiters
+from services.entity_cache import task_cache, task_key, invalidate_task, invalidate_tasks, invalidate_project
+from services.status_snapshot import status_snapshot
+from services.task_outbox import add_to_outbox, relay_tasks
+from services.task_routing import DEFAULT_PRIORITY
+from services.task_logs import (
+    task_pk_cache, resolve_task_pks_async, write_with_task_pk_async, log_row, insert_task_logs_async
+)
+from config import get_settings
+from pydantic import BaseModel, Field
 
 router = APIRouter()
+settings = get_settings()
 
 class TaskCreate(BaseModel):
     task_type: str
     project_id: Optional[int] = None
     input_data: Optional[str] = None
     estimated_time: Optional[float] = None
+    priority: Optional[int] = Field(None, ge=1, le=10)
 
 class TaskUpdate(BaseModel):
     status: Optional[str] = None
@@ -23,6 +48,12 @@ class TaskUpdate(BaseModel):
     output_data: Optional[str] = None
     error_message: Optional[str] = None
 
+class TaskBulkUpdate(TaskUpdate):
+    task_id: str
+
+class TaskBulkGet(BaseModel):
+    task_ids: List[str]
+
 class TaskLogCreate(BaseModel):
     level: str = "INFO"
     message: str
@@ -30,9 +61,33 @@ class TaskLogCreate(BaseModel):
     step_progress: Optional[float] = None
     metadata: Optional[str] = None
 
+def _worker_input(input_data: Optional[str]) -> Optional[dict]:
+    """ワーカーに渡す入力（input_data は JSON 文字列。オブジェクトでなければ渡さない）"""
+    if not input_data:
+        return None
+    try:
+        value = json.loads(input_data)
+    except ValueError:
+        return None
+    return value if isinstance(value, dict) else None
+
+def _task_priority(task: TaskCreate) -> int:
+    """tasks.priority に保存する値（未指定なら既定の優先度）"""
+    return DEFAULT_PRIORITY if task.priority is None else task.priority
+
+async def _get_task_or_none(db: AsyncSession, task_id: str) -> Optional[Task]:
+    """task_id（文字列）でタスクを1件取得"""
+    result = await db.execute(select(Task).where(Task.task_id == task_id))
+    return result.scalar_one_or_none()
+
 @router.post("/")
-async def create_task(task: TaskCreate, db: Session = Depends(get_db)):
-    """新しいタスクを作成"""
+async def create_task(task: TaskCreate, db: AsyncSession = Depends(get_async_db)):
+    """
+    新しいタスクを作成
+    
+    ワーカーへの投入はタスクと同じトランザクションで outbox に書き込む
+    （relay_task_outbox がまとめて publish する）。
+    """
     task_id = str(uuid.uuid4())
     db_task = Task(
         task_id=task_id,
@@ -43,12 +98,18 @@ async def create_task(task: TaskCreate, db: Session = Depends(get_db)):
         status=TaskStatus.PENDING,
         progress=0.0,
         total_steps=0,
-        completed_steps=0
+        completed_steps=0,
+        priority=_task_priority(task)
     )
     
     db.add(db_task)
-    db.commit()
-    db.refresh(db_task)
+    await add_to_outbox(db, [(task_id, task.task_type, _worker_input(task.input_data), task.priority)])
+    await db.commit()
+    await db.refresh(db_task)
+    status_snapshot.apply(db_task)
+    # プロジェクト詳細のタスク数が変わる
+    if db_task.project_id is not None:
+        await invalidate_project(db_task.project_id)
     
     return {
         "task_id": db_task.task_id,
@@ -56,58 +117,306 @@ async def create_task(task: TaskCreate, db: Session = Depends(get_db)):
         "message": f"Task {task_id} created successfully"
     }
 
+@router.post(
+    "/batch",
+    openapi_extra={"requestBody": {"required": True, "content": {"application/json": {"schema": {
+        "type": "array", "items": {"$ref": "#/components/schemas/TaskCreate"}
+    }}}}}
+)
+async def create_tasks_batch(request: Request, db: AsyncSession = Depends(get_async_db)):
+    """
+    タスクをまとめて作成（1回の INSERT ... RETURNING）
+    
+    ボディの配列は要素ごとに読みながら検証し、TASK_BATCH_MAX_SIZE を超えた時点で
+    残りを読まずに 400 を返す。ワーカーへの投入は同じトランザクションで outbox に書き込み、
+    コミット直後にこのバッチの行だけを1つの group として publish する。
+    """
+    tasks = await read_json_array(request, TaskCreate, settings.TASK_BATCH_MAX_SIZE, "tasks")
+    if not tasks:
+        return json_response([])
+    
+    rows = [
+        {
+            "task_id": str(uuid.uuid4()),
+            "task_type": task.task_type,
+            "project_id": task.project_id,
+            "input_data": task.input_data,
+            "estimated_time": task.estimated_time,
+            "status": TaskStatus.PENDING,
+            "progress": 0.0,
+            "total_steps": 0,
+            "completed_steps": 0,
+            "priority": _task_priority(task)
+        }
+        for task in tasks
+    ]
+    created = (await db.execute(
+        insert(Task).returning(*TASK_COLUMNS, sort_by_parameter_order=True),
+        rows
+    )).all()
+    await add_to_outbox(db, [
+        (row["task_id"], row["task_type"], _worker_input(row["input_data"]), task.priority)
+        for row, task in zip(rows, tasks)
+    ])
+    await db.commit()
+    
+    for task in created:
+        status_snapshot.apply(task)
+    # プロジェクト詳細のタスク数が変わる
+    for project_id in {task.project_id for task in created if task.project_id is not None}:
+        await invalidate_project(project_id)
+    
+    await relay_tasks(db, [row["task_id"] for row in rows])
+    
+    return json_response(rows_to_dicts(created, TASK_COLUMNS))
+
 @router.get("/")
 async def list_tasks(
     project_id: Optional[int] = Query(None),
     status: Optional[str] = Query(None),
     limit: int = Query(100, le=1000),
     offset: int = Query(0),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = Query(None, description="前ページの next_cursor（指定時は OFFSET を使わない）"),
+    fields: Optional[str] = Query(None, description="返す列（カンマ区切り、例: task_id,status,progress）"),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """タスク一覧を取得"""
-    query = db.query(Task)
+    """タスク一覧を取得（priority, created_at, id の降順）"""
+    # ORM オブジェクトを作らず、必要な列だけを取得して orjson でそのまま返す
+    # （fields 指定時はその列とカーソル用のソートキーだけを SELECT する）
+    columns = parse_fields(fields, TASK_COLUMNS)
+    query = select_tasks(columns, TASK_KEYSET.columns)
     
     if project_id:
-        query = query.filter(Task.project_id == project_id)
+        query = query.where(Task.project_id == project_id)
     
     if status:
         try:
             status_enum = TaskStatus(status)
-            query = query.filter(Task.status == status_enum)
+            query = query.where(Task.status == status_enum)
         except ValueError:
             raise HTTPException(status_code=400, detail=f"Invalid status: {status}")
     
-    tasks = query.offset(offset).limit(limit).all()
+    result = await db.execute(TASK_KEYSET.paginate(query, cursor, offset).limit(limit))
+    tasks = result.all()
     
-    return {
-        "tasks": [task.to_dict() for task in tasks],
-        "total": query.count(),
+    # カーソルモードでは全件カウントを行わない
+    total = None
+    if cursor is None:
+        total = await db.scalar(select(func.count()).select_from(query.subquery()))
+    
+    return json_response({
+        "tasks": rows_to_dicts(tasks, columns),
+        "total": total,
         "limit": limit,
-        "offset": offset
+        "offset": offset,
+        "next_cursor": TASK_KEYSET.next_cursor(tasks, limit)
+    })
+
+def _check_bulk_size(count: int):
+    if count > settings.TASK_BULK_MAX_SIZE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Maximum {settings.TASK_BULK_MAX_SIZE} tasks per bulk request"
+        )
+
+@router.post("/bulk-get")
+async def bulk_get_tasks(
+    request: TaskBulkGet,
+    fields: Optional[str] = Query(None, description="返す列（カンマ区切り、例: task_id,status,progress）"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """複数タスクを1回の IN クエリで取得（指定順。見つからない task_id は missing に入る）"""
+    _check_bulk_size(len(request.task_ids))
+    columns = parse_fields(fields, TASK_COLUMNS)
+    task_ids = list(dict.fromkeys(request.task_ids))
+    
+    rows = (await db.execute(
+        select_tasks(columns, (Task.task_id,)).where(Task.task_id.in_(task_ids))
+    )).all() if task_ids else []
+    found = {row.task_id: row for row in rows}
+    
+    return json_response({
+        "tasks": rows_to_dicts([found[task_id] for task_id in task_ids if task_id in found], columns),
+        "missing": [task_id for task_id in task_ids if task_id not in found]
+    })
+
+# 一括更新で書き換えうる列（_apply_update が設定する列）
+BULK_UPDATE_COLUMNS = (
+    Task.status,
+    Task.progress,
+    Task.current_step,
+    Task.total_steps,
+    Task.completed_steps,
+    Task.output_data,
+    Task.error_message,
+    Task.started_at,
+    Task.completed_at,
+    Task.actual_time,
+)
+
+def _bulk_update_statement(keys: tuple):
+    """keys の列を書き換える UPDATE（タスクごとのパラメータで executemany する）"""
+    table = Task.__table__
+    return update(table).where(table.c.id == bindparam("pk")).values(
+        version=table.c.version + 1,
+        updated_at=bindparam("new_updated_at", type_=table.c.updated_at.type),
+        **{key: bindparam(f"new_{key}", type_=table.c[key].type) for key in keys}
+    )
+
+def _publish_all(events: list):
+    for task_id, data in events:
+        publish_task_update(task_id, data)
+
+@router.patch("/bulk")
+async def bulk_update_tasks(
+    updates: List[TaskBulkUpdate],
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    複数タスクの更新を1トランザクションで適用
+    
+    対象の行を1回の IN クエリで読み、PUT /{task_id} と同じ規則（started_at / completed_at /
+    actual_time の記録、進捗率の計算）で新しい値を求めてから、書き換える列の組み合わせごとに
+    1回の executemany で書き込む。同じ task_id が複数あれば指定順に適用する。
+    存在しない task_id や不正なステータスが1件でもあれば何も書き込まない。
+    """
+    _check_bulk_size(len(updates))
+    task_ids = list(dict.fromkeys(item.task_id for item in updates))
+    if not task_ids:
+        return {"updated": 0, "tasks": []}
+    
+    rows = (await db.execute(
+        select(Task.id, Task.task_id, *BULK_UPDATE_COLUMNS).where(Task.task_id.in_(task_ids))
+    )).all()
+    states = {row.task_id: SimpleNamespace(**row._mapping) for row in rows}
+    
+    missing = [task_id for task_id in task_ids if task_id not in states]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Tasks not found: {', '.join(missing)}")
+    
+    previous = {task_id: dict(vars(state)) for task_id, state in states.items()}
+    now = datetime.utcnow()
+    for item in updates:
+        _apply_update(states[item.task_id], item, now)
+    
+    # 単体更新と同じく、値が変わらなくても version と updated_at は進める
+    # 書き込み順は指定順にする（IN クエリの行の順序は決まっていない）
+    params_by_keys = defaultdict(list)
+    for task_id in task_ids:
+        state = states[task_id]
+        keys = tuple(
+            column.key for column in BULK_UPDATE_COLUMNS
+            if getattr(state, column.key) != previous[task_id][column.key]
+        )
+        params_by_keys[keys].append({
+            "pk": state.id,
+            "new_updated_at": now,
+            **{f"new_{key}": getattr(state, key) for key in keys}
+        })
+    for keys, params in params_by_keys.items():
+        await db.execute(_bulk_update_statement(keys), params)
+    await db.commit()
+    
+    tasks = (await db.execute(
+        select(Task).where(Task.task_id.in_(task_ids)).execution_options(populate_existing=True)
+    )).scalars().all()
+    position = {task_id: index for index, task_id in enumerate(task_ids)}
+    tasks = sorted(tasks, key=lambda task: position[task.task_id])
+    for task in tasks:
+        status_snapshot.apply(task, previous[task.task_id]["status"])
+    await invalidate_tasks((task.task_id, task.project_id) for task in tasks)
+    await run_in_threadpool(_publish_all, [
+        (task.task_id, task_event(task, previous[task.task_id]["status"])) for task in tasks
+    ])
+    
+    return {
+        "updated": len(tasks),
+        "tasks": [
+            {
+                "task_id": task.task_id,
+                "current_status": task.status.value,
+                "progress": task.progress,
+                "version": task.version
+            }
+            for task in tasks
+        ]
     }
 
-@router.get("/{task_id}")
-async def get_task(task_id: str, db: Session = Depends(get_db)):
-    """特定のタスクの詳細を取得"""
-    task = db.query(Task).filter(Task.task_id == task_id).first()
+async def _wait_for_version(
+    db: AsyncSession, task_id: str, version: int, timeout: float
+) -> Optional[Task]:
+    """
+    タスクの version が指定より大きくなるか、timeout 秒経つまで待って最新の状態を返す
     
-    if not task:
-        raise HTTPException(status_code=404, detail=f"Task {task_id} not found")
+    変更は Redis 経由のタスクイベントで検知する。イベントを取りこぼしても
+    LONG_POLL_RECHECK_INTERVAL 秒ごとに DB を読み直す。
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
     
-    return task.to_dict()
+    while True:
+        # 読み込みと待機の間に届いた通知を逃さないよう、先に登録する
+        changed = task_waiters.watch(task_id)
+        try:
+            task = await _get_task_or_none(db, task_id)
+            # 待機中に DB 接続を保持しない
+            await db.close()
+            
+            remaining = deadline - loop.time()
+            if task is None or task.version > version or remaining <= 0:
+                return task
+            
+            await asyncio.wait({changed}, timeout=min(remaining, settings.LONG_POLL_RECHECK_INTERVAL))
+        finally:
+            task_waiters.unwatch(task_id, changed)
 
-@router.put("/{task_id}")
-async def update_task(
+def _task_etag(data: dict) -> str:
+    if data.get("version") is None:
+        return weak_etag(data)
+    return weak_etag("task", data["task_id"], data["version"])
+
+@router.get("/{task_id}")
+async def get_task(
     task_id: str,
-    update: TaskUpdate,
-    db: Session = Depends(get_db)
+    request: Request,
+    response: Response,
+    wait_for_version: Optional[int] = Query(
+        None, description="version がこの値より大きくなるまで待つ（ロングポーリング）"
+    ),
+    timeout: float = Query(30, gt=0, le=settings.LONG_POLL_MAX_TIMEOUT, description="最大待機秒数"),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """タスクの状態を更新"""
-    task = db.query(Task).filter(Task.task_id == task_id).first()
+    """
+    特定のタスクの詳細を取得
     
-    if not task:
+    通常は Redis キャッシュを経由する（書き込み側で無効化される）。
+    ETag は version から作り、If-None-Match が一致すれば 304 を返す
+    （キャッシュにあれば DB を読まない）。
+    wait_for_version を指定すると、タスクが変更される（version > wait_for_version）か
+    timeout 秒経つまで応答を保留する。タイムアウト時は変更前の状態がそのまま返る。
+    """
+    if wait_for_version is None:
+        async def load_task():
+            task = await _get_task_or_none(db, task_id)
+            return task.to_dict() if task else None
+        
+        data = await task_cache.get_or_load(task_key(task_id), load_task)
+    else:
+        task = await _wait_for_version(db, task_id, wait_for_version, timeout)
+        data = task.to_dict() if task else None
+    
+    if data is None:
         raise HTTPException(status_code=404, detail=f"Task {task_id} not found")
     
+    etag = _task_etag(data)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    
+    response.headers["ETag"] = etag
+    return data
+
+def _apply_update(task, update: TaskUpdate, now: datetime):
+    """TaskUpdate を task（Task または同じ属性を持つオブジェクト）に反映（単体・一括更新で共通）"""
     # 状態の更新
     if update.status:
         try:
@@ -116,11 +425,11 @@ async def update_task(
             
             # 開始時刻の記録
             if new_status == TaskStatus.PROCESSING and not task.started_at:
-                task.started_at = datetime.utcnow()
+                task.started_at = now
             
             # 完了時刻の記録
             if new_status in [TaskStatus.COMPLETED, TaskStatus.FAILED, TaskStatus.CANCELLED]:
-                task.completed_at = datetime.utcnow()
+                task.completed_at = now
                 if task.started_at:
                     task.actual_time = (task.completed_at - task.started_at).total_seconds()
         except ValueError:
@@ -147,11 +456,31 @@ async def update_task(
     
     if update.error_message is not None:
         task.error_message = update.error_message
+
+@router.put("/{task_id}")
+async def update_task(
+    task_id: str,
+    update: TaskUpdate,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """タスクの状態を更新"""
+    task = await _get_task_or_none(db, task_id)
     
-    task.updated_at = datetime.utcnow()
+    if not task:
+        raise HTTPException(status_code=404, detail=f"Task {task_id} not found")
+    
+    previous_status = task.status
+    now = datetime.utcnow()
+    _apply_update(task, update, now)
+    task.updated_at = now
+    task.version = Task.version + 1
     
-    db.commit()
-    db.refresh(task)
+    await db.commit()
+    await db.refresh(task)
+    status_snapshot.apply(task, previous_status)
+    await invalidate_task(task.task_id, task.project_id)
+    # 各APIプロセスの WebSocket / SSE / ロングポーリングへ配信
+    await run_in_threadpool(publish_task_update, task.task_id, task_event(task, previous_status))
     
     return {
         "task_id": task.task_id,
@@ -161,15 +490,18 @@ async def update_task(
     }
 
 @router.delete("/{task_id}")
-async def delete_task(task_id: str, db: Session = Depends(get_db)):
+async def delete_task(task_id: str, db: AsyncSession = Depends(get_async_db)):
     """タスクを削除"""
-    task = db.query(Task).filter(Task.task_id == task_id).first()
+    task = await _get_task_or_none(db, task_id)
     
     if not task:
         raise HTTPException(status_code=404, detail=f"Task {task_id} not found")
     
-    db.delete(task)
-    db.commit()
+    await db.delete(task)
+    await db.commit()
+    status_snapshot.remove(task)
+    task_pk_cache.discard(task_id)
+    await invalidate_task(task_id, task.project_id)
     
     return {
         "task_id": task_id,
@@ -181,26 +513,27 @@ async def delete_task(task_id: str, db: Session = Depends(get_db)):
 async def add_task_log(
     task_id: str,
     log: TaskLogCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """タスクログを追加"""
-    task = db.query(Task).filter(Task.task_id == task_id).first()
+    async def write(task_pk: int) -> TaskLog:
+        db_log = TaskLog(
+            task_id=task_pk,
+            level=log.level,
+            message=log.message,
+            step_name=log.step_name,
+            step_progress=log.step_progress,
+            meta=log.metadata
+        )
+        db.add(db_log)
+        await db.commit()
+        await db.refresh(db_log)
+        return db_log
     
-    if not task:
-        raise HTTPException(status_code=404, detail=f"Task {task_id} not found")
+    db_log = await write_with_task_pk_async(db, task_id, write)
     
-    db_log = TaskLog(
-        task_id=task.id,
-        level=log.level,
-        message=log.message,
-        step_name=log.step_name,
-        step_progress=log.step_progress,
-        metadata=log.metadata
-    )
-    
-    db.add(db_log)
-    db.commit()
-    db.refresh(db_log)
+    if not db_log:
+        raise HTTPException(status_code=404, detail=f"Task {task_id} not found")
     
     return {
         "log_id": db_log.id,
@@ -209,29 +542,118 @@ async def add_task_log(
         "message": "Log entry added successfully"
     }
 
+@router.post("/{task_id}/logs/batch")
+async def add_task_logs_batch(
+    task_id: str,
+    logs: List[TaskLogCreate],
+    db: AsyncSession = Depends(get_async_db)
+):
+    """タスクログをまとめて追加（1回の INSERT、大量の場合は COPY）"""
+    if len(logs) > settings.TASK_LOG_BATCH_SIZE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Maximum {settings.TASK_LOG_BATCH_SIZE} log entries per batch"
+        )
+    
+    async def write(task_pk: int) -> bool:
+        await insert_task_logs_async(db, [
+            log_row(
+                task_pk,
+                log.message,
+                level=log.level,
+                step_name=log.step_name,
+                step_progress=log.step_progress,
+                metadata=log.metadata
+            )
+            for log in logs
+        ])
+        await db.commit()
+        return True
+    
+    if not await write_with_task_pk_async(db, task_id, write):
+        raise HTTPException(status_code=404, detail=f"Task {task_id} not found")
+    
+    return {
+        "task_id": task_id,
+        "status": "logged",
+        "count": len(logs),
+        "message": f"{len(logs)} log entries added successfully"
+    }
+
 @router.get("/{task_id}/logs")
 async def get_task_logs(
     task_id: str,
+    request: Request,
+    response: Response,
     limit: int = Query(100, le=1000),
     offset: int = Query(0),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = Query(None, description="前ページの next_cursor（指定時は OFFSET を使わない）"),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """タスクログを取得"""
-    task = db.query(Task).filter(Task.task_id == task_id).first()
+    """
+    タスクログを取得（timestamp, id の降順）
     
-    if not task:
+    ログは追記のみなので、件数と最大 id から ETag を作る。
+    If-None-Match が一致すればログの行を読まずに 304 を返す。
+    """
+    task_pk = (await resolve_task_pks_async(db, [task_id])).get(task_id)
+    
+    if not task_pk:
         raise HTTPException(status_code=404, detail=f"Task {task_id} not found")
     
-    logs = db.query(TaskLog).filter(
-        TaskLog.task_id == task.id
-    ).order_by(
-        TaskLog.timestamp.desc()
-    ).offset(offset).limit(limit).all()
+    total, last_log_id = (await db.execute(
+        select(func.count(), func.max(TaskLog.id)).where(TaskLog.task_id == task_pk)
+    )).one()
+    etag = weak_etag("logs", task_id, total, last_log_id, limit, offset, cursor)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    
+    query = select(TaskLog).where(TaskLog.task_id == task_pk)
+    result = await db.execute(TASK_LOG_KEYSET.paginate(query, cursor, offset).limit(limit))
+    logs = result.scalars().all()
     
+    if cursor is not None:
+        total = None
+    
+    response.headers["ETag"] = etag
     return {
         "task_id": task_id,
         "logs": [log.to_dict() for log in logs],
-        "total": db.query(TaskLog).filter(TaskLog.task_id == task.id).count(),
+        "total": total,
         "limit": limit,
-        "offset": offset
-    }
\ No newline at end of file
+        "offset": offset,
+        "next_cursor": TASK_LOG_KEYSET.next_cursor(logs, limit)
+    }
+
+@router.get("/{task_id}/events")
+async def stream_task_events(
+    task_id: str,
+    since: Optional[str] = Query(None, description="最後に受け取った event_id（Last-Event-ID と同じ）"),
+    last_event_id: Optional[str] = Header(None)
+):
+    """
+    タスクの更新を Server-Sent Events で配信
+    
+    接続時に現在の状態を送り、以降は WebSocket と同じ更新を送る。
+    再接続時はブラウザが送る Last-Event-ID 以降の更新だけを再送する。
+    """
+    since = last_event_id or since
+    # ストリーム中に DB 接続を保持しないよう、セッションは送信開始前に閉じる
+    async with AsyncSessionLocal() as db:
+        task = await _get_task_or_none(db, task_id)
+    if not task:
+        raise HTTPException(status_code=404, detail=f"Task {task_id} not found")
+    
+    connection = open_event_stream()
+    manager.subscribe_task(connection, task_id)
+    if since is None:
+        connection.enqueue({**task_event(task), "type": "task_update", "task_id": task_id})
+    else:
+        try:
+            await replay_task_events(connection, task_id, since)
+        except Exception:
+            # レスポンスを返さないので、ストリームの終了処理では外れない
+            await manager.disconnect(connection)
+            raise
+    
+    return event_stream_response(connection)
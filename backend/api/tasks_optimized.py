@@ -1,18 +1,27 @@
 """
 Optimized task API with improved performance
 """
-from fastapi import APIRouter, Depends, HTTPException, Query, BackgroundTasks
-from sqlalchemy.orm import Session
-from sqlalchemy import func, select
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, select, insert
 from typing import List, Optional, Dict, Any
 from datetime import datetime
+import json
 import uuid
-from models import get_db, Task, TaskStatus, TaskLog
+from models import get_async_db, Task, TaskStatus, TaskLog
 from schemas.task import (
     TaskCreate, TaskUpdate, TaskResponse, 
     TaskListResponse, TaskLogCreate, TaskLogResponse
 )
 from middleware.rate_limit import limiter
+from api.pagination import TASK_KEYSET, TASK_LOG_KEYSET
+from api.serialization import (
+    TASK_COLUMNS, parse_fields, select_tasks, rows_to_dicts, json_response, read_json_array
+)
+from services.status_snapshot import status_snapshot
+from services.task_logs import write_with_task_pk_async, log_row, insert_task_logs_async
+from services.entity_cache import invalidate_task, project_cache, project_key
+from services.task_outbox import add_to_outbox, relay_tasks
 from config import get_settings
 import asyncio
 from concurrent.futures import ThreadPoolExecutor
@@ -24,21 +33,41 @@ settings = get_settings()
 executor = ThreadPoolExecutor(max_workers=4)
 
 
+async def _get_task_or_404(
+    db: AsyncSession,
+    task_id: str,
+    for_update: bool = False
+) -> Task:
+    """Fetch a task by its public id or raise 404"""
+    query = select(Task).where(Task.task_id == task_id)
+    if for_update:
+        query = query.with_for_update()
+    
+    task = (await db.execute(query)).scalar_one_or_none()
+    if not task:
+        raise HTTPException(status_code=404, detail=f"Task {task_id} not found")
+    return task
+
+
 @router.post("/", response_model=TaskResponse)
 @limiter.limit("10/minute")
 async def create_task(
     task: TaskCreate,
-    background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Create a new task with validation and background processing"""
+    """
+    Create a new task with validation and background processing
+    
+    The worker dispatch is written to the outbox in the same transaction as
+    the task; the relay_task_outbox beat task publishes it.
+    """
     task_id = str(uuid.uuid4())
     
     db_task = Task(
         task_id=task_id,
         task_type=task.task_type.value,
         project_id=task.project_id,
-        input_data=task.input_data,
+        input_data=json.dumps(task.input_data) if task.input_data is not None else None,
         estimated_time=task.estimated_time,
         status=TaskStatus.PENDING,
         progress=0.0,
@@ -48,12 +77,10 @@ async def create_task(
     )
     
     db.add(db_task)
-    db.commit()
-    db.refresh(db_task)
-    
-    # Queue background task processing
-    if settings.ENVIRONMENT == "production":
-        background_tasks.add_task(process_task_async, db_task.id)
+    await add_to_outbox(db, [(task_id, db_task.task_type, task.input_data, task.priority)])
+    await db.commit()
+    await db.refresh(db_task)
+    status_snapshot.apply(db_task)
     
     return TaskResponse.from_orm(db_task)
 
@@ -65,31 +92,35 @@ async def list_tasks(
     status: Optional[TaskStatus] = Query(None),
     limit: int = Query(100, le=1000),
     offset: int = Query(0),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
     include_count: bool = Query(False, description="Include total count (slower)"),
-    db: Session = Depends(get_db)
+    fields: Optional[str] = Query(None, description="Comma-separated columns to return, e.g. task_id,status,progress"),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     List tasks with optimized query and optional count
     
     Performance optimization:
     - Only count when explicitly requested
-    - Use window functions for efficient pagination
-    - Eager loading of related data
+    - Keyset pagination on (priority, created_at, id) when a cursor is given;
+      OFFSET is kept for backward compatibility
+    - Only the response columns are selected and the rows are encoded
+      straight to JSON with orjson (no TaskResponse per row)
+    - ``fields`` narrows the SELECT to those columns plus the cursor sort key
     """
-    query = db.query(Task)
+    columns = parse_fields(fields, TASK_COLUMNS)
+    query = select_tasks(columns, TASK_KEYSET.columns)
     
     # Apply filters
     if project_id:
-        query = query.filter(Task.project_id == project_id)
+        query = query.where(Task.project_id == project_id)
     
     if status:
-        query = query.filter(Task.status == status)
-    
-    # Order by priority and creation date
-    query = query.order_by(Task.priority.desc(), Task.created_at.desc())
+        query = query.where(Task.status == status)
     
-    # Get paginated results
-    tasks = query.offset(offset).limit(limit).all()
+    # Order by priority and creation date (id breaks ties for stable cursors)
+    result = await db.execute(TASK_KEYSET.paginate(query, cursor, offset).limit(limit))
+    tasks = result.all()
     
     # Only count if requested (expensive operation)
     total = None
@@ -100,31 +131,30 @@ async def list_tasks(
             count_query = count_query.where(Task.project_id == project_id)
         if status:
             count_query = count_query.where(Task.status == status)
-        total = db.execute(count_query).scalar()
+        total = await db.scalar(count_query)
     else:
         # Estimate based on current page
         total = offset + len(tasks) + (1 if len(tasks) == limit else 0)
     
-    return TaskListResponse(
-        tasks=[TaskResponse.from_orm(task) for task in tasks],
-        total=total,
-        limit=limit,
-        offset=offset,
-        has_more=len(tasks) == limit
-    )
+    # Same shape as TaskListResponse, which stays as the documented response_model
+    return json_response({
+        "tasks": rows_to_dicts(tasks, columns),
+        "total": total,
+        "limit": limit,
+        "offset": offset,
+        "has_more": len(tasks) == limit,
+        "next_cursor": TASK_KEYSET.next_cursor(tasks, limit)
+    })
 
 
 @router.get("/{task_id}", response_model=TaskResponse)
 @limiter.limit("60/minute")
 async def get_task(
     task_id: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get task details with caching consideration"""
-    task = db.query(Task).filter(Task.task_id == task_id).first()
-    
-    if not task:
-        raise HTTPException(status_code=404, detail=f"Task {task_id} not found")
+    task = await _get_task_or_404(db, task_id)
     
     return TaskResponse.from_orm(task)
 
@@ -134,16 +164,13 @@ async def get_task(
 async def update_task(
     task_id: str,
     update: TaskUpdate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update task with optimized field updates"""
     # Use FOR UPDATE to prevent concurrent updates
-    task = db.query(Task).filter(
-        Task.task_id == task_id
-    ).with_for_update().first()
+    task = await _get_task_or_404(db, task_id, for_update=True)
     
-    if not task:
-        raise HTTPException(status_code=404, detail=f"Task {task_id} not found")
+    previous_status = task.status
     
     # Batch update fields
     update_data = update.dict(exclude_unset=True)
@@ -170,9 +197,12 @@ async def update_task(
     # Apply all updates at once
     for field, value in update_data.items():
         setattr(task, field, value)
+    task.version = Task.version + 1
     
-    db.commit()
-    db.refresh(task)
+    await db.commit()
+    await db.refresh(task)
+    status_snapshot.apply(task, previous_status)
+    await invalidate_task(task.task_id, task.project_id)
     
     return TaskResponse.from_orm(task)
 
@@ -181,13 +211,10 @@ async def update_task(
 @limiter.limit("10/minute")
 async def cancel_task(
     task_id: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Cancel a task"""
-    task = db.query(Task).filter(Task.task_id == task_id).first()
-    
-    if not task:
-        raise HTTPException(status_code=404, detail=f"Task {task_id} not found")
+    task = await _get_task_or_404(db, task_id)
     
     if task.status in [TaskStatus.COMPLETED, TaskStatus.FAILED]:
         raise HTTPException(
@@ -195,12 +222,18 @@ async def cancel_task(
             detail=f"Cannot cancel task in {task.status} status"
         )
     
+    previous_status = task.status
     task.status = TaskStatus.CANCELLED
     task.completed_at = datetime.utcnow()
     if task.started_at:
         task.actual_time = (task.completed_at - task.started_at).total_seconds()
+    task.version = Task.version + 1
     
-    db.commit()
+    await db.commit()
+    # version is a SQL expression, so reload before reading the row
+    await db.refresh(task)
+    status_snapshot.apply(task, previous_status)
+    await invalidate_task(task_id, task.project_id)
     
     return {"message": f"Task {task_id} cancelled successfully"}
 
@@ -210,91 +243,157 @@ async def cancel_task(
 async def add_task_log(
     task_id: str,
     log: TaskLogCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Add log entry for a task"""
-    # Verify task exists
-    task = db.query(Task).filter(Task.task_id == task_id).first()
-    if not task:
+    async def write(task_pk: int) -> TaskLog:
+        db_log = TaskLog(
+            task_id=task_pk,
+            level=log.level,
+            message=log.message,
+            step_name=log.step_name,
+            step_progress=log.step_progress,
+            meta=log.metadata
+        )
+        db.add(db_log)
+        await db.commit()
+        await db.refresh(db_log)
+        return db_log
+    
+    # Resolve the primary key through the per-process task_id cache
+    # (re-resolved once if the cached task was deleted by another process)
+    db_log = await write_with_task_pk_async(db, task_id, write)
+    if not db_log:
         raise HTTPException(status_code=404, detail=f"Task {task_id} not found")
     
-    db_log = TaskLog(
-        task_id=task.id,
-        level=log.level,
-        message=log.message,
-        step_name=log.step_name,
-        step_progress=log.step_progress,
-        metadata=log.metadata
-    )
+    return TaskLogResponse.from_orm(db_log)
+
+
+@router.post("/{task_id}/logs/batch")
+@limiter.limit("30/minute")
+async def add_task_logs_batch(
+    task_id: str,
+    logs: List[TaskLogCreate],
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Add many log entries for a task with one multi-row INSERT (COPY on PostgreSQL)"""
+    if len(logs) > settings.TASK_LOG_BATCH_SIZE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Maximum {settings.TASK_LOG_BATCH_SIZE} log entries per batch"
+        )
     
-    db.add(db_log)
-    db.commit()
-    db.refresh(db_log)
+    async def write(task_pk: int) -> bool:
+        await insert_task_logs_async(db, [
+            log_row(
+                task_pk,
+                log.message,
+                level=log.level,
+                step_name=log.step_name,
+                step_progress=log.step_progress,
+                metadata=log.metadata
+            )
+            for log in logs
+        ])
+        await db.commit()
+        return True
+    
+    if not await write_with_task_pk_async(db, task_id, write):
+        raise HTTPException(status_code=404, detail=f"Task {task_id} not found")
     
-    return TaskLogResponse.from_orm(db_log)
+    return {"task_id": task_id, "count": len(logs)}
 
 
 @router.get("/{task_id}/logs", response_model=List[TaskLogResponse])
 @limiter.limit("30/minute")
 async def get_task_logs(
     task_id: str,
+    response: Response,
     limit: int = Query(100, le=1000),
     offset: int = Query(0),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor from the previous page"),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get logs for a task with pagination"""
-    task = db.query(Task).filter(Task.task_id == task_id).first()
-    if not task:
-        raise HTTPException(status_code=404, detail=f"Task {task_id} not found")
+    """
+    Get logs for a task with pagination
     
-    logs = db.query(TaskLog).filter(
-        TaskLog.task_id == task.id
-    ).order_by(
-        TaskLog.timestamp.desc()
-    ).offset(offset).limit(limit).all()
+    The body stays a plain list for backward compatibility; the cursor for
+    the next page is returned in the ``X-Next-Cursor`` header.
+    """
+    task = await _get_task_or_404(db, task_id)
+    
+    query = select(TaskLog).where(TaskLog.task_id == task.id)
+    result = await db.execute(TASK_LOG_KEYSET.paginate(query, cursor, offset).limit(limit))
+    logs = result.scalars().all()
+    
+    next_cursor = TASK_LOG_KEYSET.next_cursor(logs, limit)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     
     return [TaskLogResponse.from_orm(log) for log in logs]
 
 
 # Batch operations for better performance
-@router.post("/batch", response_model=List[TaskResponse])
+@router.post(
+    "/batch",
+    response_model=List[TaskResponse],
+    openapi_extra={"requestBody": {"required": True, "content": {"application/json": {"schema": {
+        "type": "array", "items": {"$ref": "#/components/schemas/TaskCreate"}
+    }}}}}
+)
 @limiter.limit("5/minute")
 async def create_tasks_batch(
-    tasks: List[TaskCreate],
-    db: Session = Depends(get_db)
+    request: Request,
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Create multiple tasks in a single transaction"""
-    if len(tasks) > 100:
-        raise HTTPException(status_code=400, detail="Maximum 100 tasks per batch")
-    
-    db_tasks = []
-    for task_data in tasks:
-        task_id = str(uuid.uuid4())
-        db_task = Task(
-            task_id=task_id,
-            task_type=task_data.task_type.value,
-            project_id=task_data.project_id,
-            input_data=task_data.input_data,
-            estimated_time=task_data.estimated_time,
-            status=TaskStatus.PENDING,
-            progress=0.0,
-            priority=task_data.priority
-        )
-        db_tasks.append(db_task)
-        db.add(db_task)
-    
-    db.commit()
-    
-    # Refresh all tasks
-    for task in db_tasks:
-        db.refresh(task)
+    """
+    Create multiple tasks in a single transaction
     
-    return [TaskResponse.from_orm(task) for task in db_tasks]
-
-
-# Helper function for background processing
-async def process_task_async(task_id: int):
-    """Process task asynchronously (placeholder)"""
-    # This would integrate with Celery in production
-    await asyncio.sleep(0.1)  # Simulate async operation
-    pass
\ No newline at end of file
+    Performance optimization:
+    - The body is parsed incrementally, so an oversized batch is rejected
+      without reading it all (limit: TASK_BATCH_MAX_SIZE)
+    - One multi-row INSERT ... RETURNING instead of an INSERT plus a refresh
+      SELECT per task
+    - The worker dispatches go to the outbox in the same transaction and the
+      batch's rows are published right after the commit as one Celery group
+      (left for the relay if the publish fails)
+    """
+    tasks = await read_json_array(request, TaskCreate, settings.TASK_BATCH_MAX_SIZE, "tasks")
+    if not tasks:
+        return json_response([])
+    
+    rows = [
+        {
+            "task_id": str(uuid.uuid4()),
+            "task_type": task_data.task_type.value,
+            "project_id": task_data.project_id,
+            "input_data": json.dumps(task_data.input_data) if task_data.input_data is not None else None,
+            "estimated_time": task_data.estimated_time,
+            "status": TaskStatus.PENDING,
+            "progress": 0.0,
+            "total_steps": 0,
+            "completed_steps": 0,
+            "priority": task_data.priority
+        }
+        for task_data in tasks
+    ]
+    created = (await db.execute(
+        insert(Task).returning(*TASK_COLUMNS, sort_by_parameter_order=True),
+        rows
+    )).all()
+    await add_to_outbox(db, [
+        (row["task_id"], row["task_type"], task_data.input_data, task_data.priority)
+        for row, task_data in zip(rows, tasks)
+    ])
+    await db.commit()
+    
+    for task in created:
+        status_snapshot.apply(task)
+    # Task counts in the cached project details changed
+    await project_cache.invalidate(*{
+        project_key(task.project_id) for task in created if task.project_id is not None
+    })
+    
+    await relay_tasks(db, [row["task_id"] for row in rows])
+    
+    return json_response(rows_to_dicts(created, TASK_COLUMNS))
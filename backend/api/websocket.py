@@ -0,0 +1,389 @@
+"""
+WebSocket 接続管理
+
+1本の接続で複数のタスク・プロジェクトを購読できる /ws/tasks と、
+既存の /api/status/ws/{task_id} の両方がこの ConnectionManager を使う。
+送信は接続ごとの上限付きキューと writer タスクで行い、
+遅いクライアントが他のクライアントへの配信を遅らせないようにする。
+"""
+import asyncio
+import json
+import logging
+from collections import deque
+from typing import Deque, Dict, Optional, Set, Union
+
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from sqlalchemy import select
+
+from config import get_settings
+from models import AsyncSessionLocal, Task
+from monitoring.metrics import (
+    track_websocket_connection, track_websocket_message, track_websocket_drop
+)
+from services.task_event_log import event_log
+from services.task_events import task_event
+from services.task_waiters import task_waiters
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+Message = Union[dict, str]
+
+
+TERMINAL_STATUSES = {"completed", "failed", "cancelled"}
+
+
+class ClientConnection:
+    """
+    WebSocket 1本分の購読状態と送信キュー
+
+    task_update はタスクごとに最新の状態へまとめ、max_update_rate（回/秒）を
+    上限にまとめて送る。前回送った状態から変わったフィールドを changed に入れ、
+    何も変わっていなければ送らない。
+    それ以外のメッセージ（応答・エラーなど）は上限付きのキューに積んで即座に送り、
+    キューがあふれたら最も古いものを捨てる。
+    sequence が有効な場合は送信する JSON に接続ごとの連番 seq を付ける。
+    捨てたメッセージの分は番号を飛ばすので、クライアントは欠落を検知できる。
+    """
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        max_queue: int,
+        send_timeout: float,
+        max_update_rate: float = 0,
+        sequence: bool = True
+    ):
+        self.websocket = websocket
+        self.max_queue = max_queue
+        self.send_timeout = send_timeout
+        self.min_update_interval = 1 / max_update_rate if max_update_rate else 0
+        self.sequence = sequence
+        self.tasks: Set[str] = set()
+        self.projects: Set[int] = set()
+        self.closed = False
+        self._queue: Deque[Message] = deque()
+        # 未送信の task_update（task_id → まとめた更新内容）
+        self._pending_updates: Dict[str, dict] = {}
+        # 最後に送ったタスクの状態（changed の算出用）
+        self._last_sent: Dict[str, dict] = {}
+        self._next_update_at = 0.0
+        self._seq = 0
+        self._wakeup = asyncio.Event()
+        self._writer: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._writer = asyncio.create_task(self._run())
+
+    async def close(self):
+        self.closed = True
+        if self._writer is not None and self._writer is not asyncio.current_task():
+            self._writer.cancel()
+            try:
+                await self._writer
+            except asyncio.CancelledError:
+                pass
+
+    def enqueue(self, message: Message):
+        """応答などを送信キューに積む（送信完了は待たない）"""
+        if self.closed:
+            return
+
+        if len(self._queue) >= self.max_queue:
+            dropped = self._queue.popleft()
+            if self.sequence and not isinstance(dropped, str):
+                self._seq += 1
+            track_websocket_drop("overflow")
+
+        self._queue.append(message)
+        self._wakeup.set()
+
+    def enqueue_update(self, task_id: str, data: dict):
+        """タスクの更新を未送信分にまとめる（送信完了は待たない）"""
+        if self.closed:
+            return
+
+        pending = self._pending_updates.get(task_id)
+        if pending is None:
+            self._pending_updates[task_id] = dict(data)
+        else:
+            pending.update(data)
+            track_websocket_drop("coalesced")
+        self._wakeup.set()
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                await self._wakeup.wait()
+                self._wakeup.clear()
+
+                while self._queue:
+                    await self._send(self._queue.popleft())
+
+                if not self._pending_updates:
+                    continue
+
+                delay = self._next_update_at - loop.time()
+                if delay > 0:
+                    # 送信間隔の上限まで待つ（その間に来た応答などは先に送る）
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), delay)
+                    except asyncio.TimeoutError:
+                        pass
+                    self._wakeup.set()
+                    continue
+
+                updates, self._pending_updates = self._pending_updates, {}
+                self._next_update_at = loop.time() + self.min_update_interval
+                for task_id, update in updates.items():
+                    message = self._diff(task_id, update)
+                    if message is not None:
+                        await self._send(message)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # 送信に失敗した・送信が詰まった接続は閉じる
+            logger.info(f"Closing WebSocket after send failure: {e!r}")
+            self.closed = True
+            try:
+                await asyncio.wait_for(self.websocket.close(), self.send_timeout)
+            except Exception:
+                pass
+
+    def _diff(self, task_id: str, update: dict) -> Optional[dict]:
+        """前回送った状態と比べ、最新の状態と変更されたフィールドを返す"""
+        last = self._last_sent.get(task_id)
+        changed = [
+            key for key, value in update.items()
+            if last is None or last.get(key) != value
+        ]
+        if last is not None and not changed:
+            return None
+
+        state = {**last, **update} if last else dict(update)
+        if state.get("status") in TERMINAL_STATUSES:
+            self._last_sent.pop(task_id, None)
+        else:
+            self._last_sent[task_id] = state
+
+        return {**state, "type": "task_update", "task_id": task_id, "changed": changed}
+
+    async def _send(self, message: Message):
+        if isinstance(message, str):
+            await asyncio.wait_for(self.websocket.send_text(message), self.send_timeout)
+            track_websocket_message("sent", "text")
+            return
+
+        if self.sequence:
+            self._seq += 1
+            message = {**message, "seq": self._seq}
+        await asyncio.wait_for(self.websocket.send_json(message), self.send_timeout)
+        track_websocket_message("sent", message.get("type", "unknown"))
+
+
+class ConnectionManager:
+    """接続と購読（タスク単位・プロジェクト単位）を管理する"""
+
+    def __init__(
+        self,
+        max_queue: int = None,
+        send_timeout: float = None,
+        max_update_rate: float = None,
+        sequence: bool = None
+    ):
+        self.max_queue = max_queue or settings.WS_SEND_QUEUE_SIZE
+        self.send_timeout = send_timeout or settings.WS_SEND_TIMEOUT
+        self.max_update_rate = (
+            settings.WS_MAX_UPDATE_RATE if max_update_rate is None else max_update_rate
+        )
+        self.sequence = settings.WS_SEQUENCE_NUMBERS if sequence is None else sequence
+        self.connections: Set[ClientConnection] = set()
+        self.task_subscribers: Dict[str, Set[ClientConnection]] = {}
+        self.project_subscribers: Dict[int, Set[ClientConnection]] = {}
+
+    async def connect(self, websocket: WebSocket) -> ClientConnection:
+        await websocket.accept()
+        return self.attach(websocket)
+
+    def attach(self, websocket) -> ClientConnection:
+        """送信先（send_json / send_text / close を持つもの）を接続として登録する"""
+        connection = ClientConnection(
+            websocket,
+            self.max_queue,
+            self.send_timeout,
+            self.max_update_rate,
+            self.sequence
+        )
+        connection.start()
+        self.connections.add(connection)
+        track_websocket_connection(1)
+        return connection
+
+    async def disconnect(self, connection: ClientConnection):
+        if connection not in self.connections:
+            return
+        self.connections.discard(connection)
+        track_websocket_connection(-1)
+        for task_id in list(connection.tasks):
+            self.unsubscribe_task(connection, task_id)
+        for project_id in list(connection.projects):
+            self.unsubscribe_project(connection, project_id)
+        await connection.close()
+
+    def subscribe_task(self, connection: ClientConnection, task_id: str):
+        connection.tasks.add(task_id)
+        self.task_subscribers.setdefault(task_id, set()).add(connection)
+
+    def unsubscribe_task(self, connection: ClientConnection, task_id: str):
+        connection.tasks.discard(task_id)
+        subscribers = self.task_subscribers.get(task_id)
+        if subscribers is not None:
+            subscribers.discard(connection)
+            if not subscribers:
+                del self.task_subscribers[task_id]
+
+    def subscribe_project(self, connection: ClientConnection, project_id: int):
+        connection.projects.add(project_id)
+        self.project_subscribers.setdefault(project_id, set()).add(connection)
+
+    def unsubscribe_project(self, connection: ClientConnection, project_id: int):
+        connection.projects.discard(project_id)
+        subscribers = self.project_subscribers.get(project_id)
+        if subscribers is not None:
+            subscribers.discard(connection)
+            if not subscribers:
+                del self.project_subscribers[project_id]
+
+    def subscriber_count(self, task_id: str) -> int:
+        return len(self.task_subscribers.get(task_id, ()))
+
+    async def send_update(self, task_id: str, data: dict):
+        """タスクの購読者と、そのタスクが属するプロジェクトの購読者へ配信"""
+        targets = set(self.task_subscribers.get(task_id, ()))
+        project_id = data.get("project_id")
+        if project_id is not None:
+            targets |= self.project_subscribers.get(project_id, set())
+        if not targets:
+            return
+
+        for connection in targets:
+            connection.enqueue_update(task_id, data)
+
+
+manager = ConnectionManager()
+
+
+async def deliver_task_event(task_id: str, data: dict):
+    """タスクイベントをリプレイ用に記録し、このプロセスの購読者と変更待ちへ配信する"""
+    task_waiters.notify(task_id)
+    await manager.send_update(task_id, event_log.record(task_id, data))
+
+async def replay_task_events(connection: ClientConnection, task_id: str, since: str):
+    """
+    event_id が since より後のイベントを送り直す
+
+    取りこぼした分がバッファに残っていなければ、最新の状態だけを resync として送る
+    （バッファが空の場合のみ DB から読む）。
+    """
+    events, complete = await event_log.read(task_id, since)
+    if not complete:
+        events = events[-1:] or await _load_task_state(task_id)
+
+    for data in events:
+        connection.enqueue({
+            **data,
+            "type": "task_update",
+            "task_id": task_id,
+            "replayed": True,
+            "resync": not complete
+        })
+
+async def _load_task_state(task_id: str) -> list:
+    async with AsyncSessionLocal() as db:
+        task = (await db.execute(select(Task).where(Task.task_id == task_id))).scalar_one_or_none()
+    return [task_event(task)] if task else []
+
+MESSAGE_TYPES = {"subscribe", "unsubscribe", "ping", "task_update"}
+
+
+def _error(connection: ClientConnection, message: str):
+    connection.enqueue({"type": "error", "message": message})
+
+async def _handle_message(connection: ClientConnection, text: str):
+    try:
+        message = json.loads(text)
+    except ValueError:
+        return _error(connection, "Invalid JSON")
+    if not isinstance(message, dict):
+        return _error(connection, "Message must be a JSON object")
+
+    message_type = message.get("type")
+    track_websocket_message("received", message_type if message_type in MESSAGE_TYPES else "invalid")
+
+    if message_type in ("subscribe", "unsubscribe"):
+        subscribe = message_type == "subscribe"
+        if message.get("task_id"):
+            task_id = str(message["task_id"])
+            if subscribe:
+                manager.subscribe_task(connection, task_id)
+            else:
+                manager.unsubscribe_task(connection, task_id)
+            connection.enqueue({"type": f"{message_type}d", "task_id": task_id})
+            if subscribe and message.get("since") is not None:
+                await replay_task_events(connection, task_id, str(message["since"]))
+        elif message.get("project_id") is not None:
+            try:
+                project_id = int(message["project_id"])
+            except (TypeError, ValueError):
+                return _error(connection, "project_id must be an integer")
+            if subscribe:
+                manager.subscribe_project(connection, project_id)
+            else:
+                manager.unsubscribe_project(connection, project_id)
+            connection.enqueue({"type": f"{message_type}d", "project_id": project_id})
+        else:
+            _error(connection, "task_id or project_id is required")
+
+    elif message_type == "ping":
+        connection.enqueue({"type": "pong"})
+
+    elif message_type == "task_update":
+        # 更新はワーカーからの pub/sub でのみ配信する。クライアントからの更新は
+        # 他の購読者へは流さず、送信元にだけ返す（差分の基準の状態も変えない）
+        task_id = message.get("task_id")
+        if not task_id:
+            return _error(connection, "task_id is required")
+        connection.enqueue({**message, "task_id": str(task_id)})
+
+    else:
+        _error(connection, f"Unknown message type: {message_type}")
+
+
+@router.websocket("/ws/tasks")
+async def tasks_websocket(websocket: WebSocket):
+    """
+    複数のタスク・プロジェクトの更新を1本の接続で購読する
+
+    クライアント → サーバー:
+        {"type": "subscribe", "task_id": "..."} / {"type": "subscribe", "project_id": 1}
+        {"type": "subscribe", "task_id": "...", "since": <event_id>}（取りこぼした更新を再送）
+        {"type": "unsubscribe", "task_id": "..."} / {"type": "unsubscribe", "project_id": 1}
+        {"type": "ping"}
+    サーバー → クライアント:
+        {"type": "subscribed" | "unsubscribed", "task_id" | "project_id": ...}
+        {"type": "task_update", "task_id": "...", "changed": [...], ...}
+        {"type": "pong"} / {"type": "error", "message": "..."}
+        JSON メッセージには接続ごとの連番 seq が付く（番号の飛びはメッセージの欠落）
+        task_update にはタスクごとの event_id が付く（再接続時の since に使う）
+    """
+    connection = await manager.connect(websocket)
+    try:
+        while True:
+            await _handle_message(connection, await websocket.receive_text())
+    except WebSocketDisconnect:
+        pass
+    finally:
+        await manager.disconnect(connection)
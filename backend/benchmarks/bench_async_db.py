@@ -0,0 +1,180 @@
+"""
+Benchmark: task lookup latency under concurrent load, blocking vs async sessions
+
+"before" runs the query through the synchronous Session inside an ``async def``
+handler (the old ``get_db`` pattern), which blocks the event loop for the whole
+query. "after" runs the same query through ``get_async_db``.
+
+Alongside the lookups a probe keeps calling ``/ping`` (no DB access). Its
+latency is what every other request on the worker sees while queries run.
+
+Usage:
+    DATABASE_URL=sqlite:///./bench.db python benchmarks/bench_async_db.py
+    python benchmarks/bench_async_db.py --requests 5000 --concurrency 100 --slow-query-ms 20
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+import uuid
+from pathlib import Path
+
+import httpx
+from fastapi import Depends, FastAPI, HTTPException
+from sqlalchemy import event, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from models import (  # noqa: E402
+    Base, engine, async_engine, SessionLocal, get_async_db, Task, TaskStatus
+)
+
+PROBE_INTERVAL = 0.005
+
+app = FastAPI()
+slow_query = None
+
+
+def _install_slow_query(delay_ms: int):
+    """Build a statement that makes every lookup take at least ``delay_ms``"""
+    global slow_query
+    if delay_ms <= 0:
+        return
+
+    if engine.dialect.name == "postgresql":
+        slow_query = text("SELECT pg_sleep(:seconds)").bindparams(seconds=delay_ms / 1000)
+        return
+
+    # SQLite has no sleep(); register one on every new connection
+    def _register(dbapi_connection, connection_record):
+        dbapi_connection.create_function("bench_sleep", 1, lambda ms: time.sleep(ms / 1000))
+
+    event.listen(engine, "connect", _register)
+    event.listen(async_engine.sync_engine, "connect", _register)
+    slow_query = text("SELECT bench_sleep(:ms)").bindparams(ms=delay_ms)
+
+
+@app.get("/ping")
+async def ping():
+    """Probe endpoint with no DB access"""
+    return {"status": "ok"}
+
+
+@app.get("/blocking/{task_id}")
+async def get_task_blocking(task_id: str):
+    """Old handler shape: blocking Session calls inside ``async def``
+
+    The session is scoped to the handler rather than injected via ``get_db``:
+    with the dependency, connections are checked out on the loop but only
+    returned from the threadpool teardown, so the pool drains and the run
+    stalls on checkout timeouts instead of measuring query latency.
+    """
+    with SessionLocal() as db:
+        if slow_query is not None:
+            db.execute(slow_query)
+        task = db.query(Task).filter(Task.task_id == task_id).first()
+        if not task:
+            raise HTTPException(status_code=404)
+        return {"task_id": task.task_id, "status": task.status.value}
+
+
+@app.get("/async/{task_id}")
+async def get_task_async(task_id: str, db: AsyncSession = Depends(get_async_db)):
+    """New handler shape: awaited AsyncSession calls"""
+    if slow_query is not None:
+        await db.execute(slow_query)
+    task = (await db.execute(select(Task).where(Task.task_id == task_id))).scalar_one_or_none()
+    if not task:
+        raise HTTPException(status_code=404)
+    return {"task_id": task.task_id, "status": task.status.value}
+
+
+def seed_tasks(count: int) -> list:
+    """Insert ``count`` pending tasks and return their public ids"""
+    Base.metadata.create_all(bind=engine)
+    task_ids = [str(uuid.uuid4()) for _ in range(count)]
+    db = SessionLocal()
+    try:
+        db.add_all([
+            Task(task_id=task_id, task_type="video_edit", status=TaskStatus.PENDING)
+            for task_id in task_ids
+        ])
+        db.commit()
+    finally:
+        db.close()
+    return task_ids
+
+
+def _percentile_ms(latencies: list, pct: int) -> float:
+    # A starved probe may only complete once or twice; report its worst case
+    if len(latencies) < 2:
+        return max(latencies, default=0.0) * 1000
+    return statistics.quantiles(latencies, n=100)[pct - 1] * 1000
+
+
+async def run_load(path: str, task_ids: list, total: int, concurrency: int) -> dict:
+    """Fire ``total`` GETs with ``concurrency`` in-flight requests and collect latencies"""
+    latencies = []
+    ping_latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=app)
+    done = asyncio.Event()
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def one(i: int):
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.get(f"/{path}/{task_ids[i % len(task_ids)]}")
+                latencies.append(time.perf_counter() - start)
+                response.raise_for_status()
+
+        async def probe():
+            # Measure from when each ping was due, so loop starvation counts
+            while not done.is_set():
+                due = time.perf_counter() + PROBE_INTERVAL
+                await asyncio.sleep(PROBE_INTERVAL)
+                await client.get("/ping")
+                ping_latencies.append(time.perf_counter() - due)
+
+        probe_task = asyncio.create_task(probe())
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        elapsed = time.perf_counter() - started
+        done.set()
+        await probe_task
+
+    return {
+        "requests": total,
+        "rps": total / elapsed,
+        "p50_ms": _percentile_ms(latencies, 50),
+        "p99_ms": _percentile_ms(latencies, 99),
+        "ping_p99_ms": _percentile_ms(ping_latencies, 99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=500, help="Number of tasks to insert")
+    parser.add_argument("--slow-query-ms", type=int, default=5,
+                        help="Artificial per-request query delay (0 to disable)")
+    args = parser.parse_args()
+
+    _install_slow_query(args.slow_query_ms)
+    task_ids = seed_tasks(args.seed)
+
+    print(f"{'mode':<10}{'rps':>10}{'p50 ms':>10}{'p99 ms':>10}{'ping p99 ms':>14}")
+    for label, path in (("before", "blocking"), ("after", "async")):
+        stats = asyncio.run(run_load(path, task_ids, args.requests, args.concurrency))
+        print(
+            f"{label:<10}{stats['rps']:>10.1f}{stats['p50_ms']:>10.2f}"
+            f"{stats['p99_ms']:>10.2f}{stats['ping_p99_ms']:>14.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
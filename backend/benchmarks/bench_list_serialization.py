@@ -0,0 +1,205 @@
+"""
+Benchmark: rows/sec for serializing a 1,000-row task list page
+
+Compares the ways a list endpoint turns tasks into a JSON body:
+
+- ``to_dict``: ORM objects -> ``Task.to_dict()`` (five ``isoformat()`` calls per
+  row) -> FastAPI's ``jsonable_encoder`` + ``json.dumps`` (the old
+  ``/api/tasks/`` path)
+- ``from_orm``: ORM objects -> ``TaskResponse.from_orm`` -> ``TaskListResponse``
+  -> ``jsonable_encoder`` + ``json.dumps`` (the old ``tasks_optimized`` path)
+- ``orjson``: column tuples -> ``rows_to_dicts`` -> ``orjson.dumps`` (the fast
+  path in ``api.serialization``)
+
+With ``--db`` the rows are also loaded from the database for every page, ORM
+objects via ``select(Task)`` for the first two and column tuples via
+``select_tasks()`` for the fast path, so the ORM hydration cost is included.
+
+``TaskResponse`` declares its own status enum, so the ``from_orm`` case hands
+it tasks whose status is the plain value.
+
+Usage:
+    python benchmarks/bench_list_serialization.py
+    python benchmarks/bench_list_serialization.py --rows 1000 --pages 50
+    DATABASE_URL=sqlite:///./bench.db python benchmarks/bench_list_serialization.py --db
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import delete, select
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from models import Base, engine, AsyncSessionLocal, SessionLocal, Task, TaskStatus  # noqa: E402
+from api.serialization import TASK_COLUMNS, select_tasks, rows_to_dicts  # noqa: E402
+from schemas.task import TaskResponse, TaskListResponse  # noqa: E402
+
+BENCH_TASK_TYPE = "bench_serialization"
+
+
+def make_tasks(count: int, status_values: bool = False) -> list:
+    now = datetime.now(timezone.utc)
+    statuses = list(TaskStatus)
+    tasks = []
+    for i in range(count):
+        status = statuses[i % len(statuses)]
+        tasks.append(Task(
+            id=i + 1,
+            task_id=str(uuid.uuid4()),
+            project_id=i % 10 or None,
+            task_type=BENCH_TASK_TYPE,
+            status=status.value if status_values else status,
+            progress=float(i % 100),
+            current_step=f"step {i % 7}",
+            total_steps=10,
+            completed_steps=i % 10,
+            priority=i % 10,
+            version=1 + i % 5,
+            created_at=now - timedelta(seconds=i),
+            started_at=now - timedelta(seconds=i // 2),
+            completed_at=now if status == TaskStatus.COMPLETED else None,
+            estimated_time=120.0,
+            actual_time=60.0 if status == TaskStatus.COMPLETED else None,
+            error_message="boom" if status == TaskStatus.FAILED else None
+        ))
+    return tasks
+
+
+def as_rows(tasks: list) -> list:
+    return [tuple(getattr(task, column.key) for column in TASK_COLUMNS) for task in tasks]
+
+
+def encode_to_dict(tasks: list) -> bytes:
+    body = jsonable_encoder({"tasks": [task.to_dict() for task in tasks], "total": len(tasks)})
+    return json.dumps(body).encode()
+
+
+def with_status_values(tasks: list) -> list:
+    for task in tasks:
+        task.status = task.status.value
+    return tasks
+
+
+def encode_from_orm(tasks: list) -> bytes:
+    page = TaskListResponse(
+        tasks=[TaskResponse.from_orm(task) for task in tasks],
+        total=len(tasks),
+        limit=len(tasks),
+        offset=0,
+        has_more=False
+    )
+    return json.dumps(jsonable_encoder(page)).encode()
+
+
+def encode_orjson(rows: list) -> bytes:
+    return orjson.dumps({"tasks": rows_to_dicts(rows, TASK_COLUMNS), "total": len(rows)})
+
+
+def measure(label: str, page, rows: int, pages: int):
+    page()  # warm up
+    started = time.perf_counter()
+    for _ in range(pages):
+        size = len(page())
+    elapsed = time.perf_counter() - started
+    per_page_ms = elapsed / pages * 1000
+    print(f"{label:<10} {rows * pages / elapsed:>12,.0f} rows/s  {per_page_ms:>8.2f} ms/page  {size:>9,} bytes")
+    return rows * pages / elapsed
+
+
+def run_in_memory(rows: int, pages: int):
+    tasks = make_tasks(rows)
+    from_orm_tasks = make_tasks(rows, status_values=True)
+    tuples = as_rows(tasks)
+    results = {
+        "to_dict": measure("to_dict", lambda: encode_to_dict(tasks), rows, pages),
+        "from_orm": measure(
+            "from_orm", lambda: encode_from_orm(from_orm_tasks), rows, pages
+        ),
+        "orjson": measure("orjson", lambda: encode_orjson(tuples), rows, pages),
+    }
+    return results
+
+
+def seed(rows: int):
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        db.execute(delete(Task).where(Task.task_type == BENCH_TASK_TYPE))
+        for task in make_tasks(rows):
+            task.id = None
+            task.project_id = None
+            db.add(task)
+        db.commit()
+    finally:
+        db.close()
+
+
+def cleanup():
+    db = SessionLocal()
+    try:
+        db.execute(delete(Task).where(Task.task_type == BENCH_TASK_TYPE))
+        db.commit()
+    finally:
+        db.close()
+
+
+async def load_orm(rows: int) -> list:
+    async with AsyncSessionLocal() as db:
+        query = select(Task).where(Task.task_type == BENCH_TASK_TYPE).limit(rows)
+        return (await db.execute(query)).scalars().all()
+
+
+async def load_rows(rows: int) -> list:
+    async with AsyncSessionLocal() as db:
+        query = select_tasks().where(Task.task_type == BENCH_TASK_TYPE).limit(rows)
+        return (await db.execute(query)).all()
+
+
+def run_with_db(rows: int, pages: int):
+    seed(rows)
+    loop = asyncio.new_event_loop()
+    try:
+        results = {
+            "to_dict": measure(
+                "to_dict", lambda: encode_to_dict(loop.run_until_complete(load_orm(rows))), rows, pages
+            ),
+            "from_orm": measure(
+                "from_orm",
+                lambda: encode_from_orm(with_status_values(loop.run_until_complete(load_orm(rows)))),
+                rows,
+                pages
+            ),
+            "orjson": measure(
+                "orjson", lambda: encode_orjson(loop.run_until_complete(load_rows(rows))), rows, pages
+            ),
+        }
+    finally:
+        loop.close()
+        cleanup()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--rows", type=int, default=1000, help="rows per page")
+    parser.add_argument("--pages", type=int, default=50, help="pages per measurement")
+    parser.add_argument("--db", action="store_true", help="load every page from the database too")
+    args = parser.parse_args()
+
+    print(f"{args.rows} rows/page x {args.pages} pages ({'with DB load' if args.db else 'serialization only'})")
+    results = run_with_db(args.rows, args.pages) if args.db else run_in_memory(args.rows, args.pages)
+    print(f"orjson fast path: {results['orjson'] / results['to_dict']:.1f}x to_dict, "
+          f"{results['orjson'] / results['from_orm']:.1f}x from_orm")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,9 @@
 from celery import Celery
-from celery.signals import task_prerun, task_postrun, task_failure
+from celery.signals import task_prerun, task_postrun, task_failure, worker_process_shutdown
 import os
 from dotenv import load_dotenv
+from config import get_settings
+from services.task_routing import CELERY_ROUTING_CONFIG
 
 load_dotenv()
 
@@ -25,15 +27,26 @@ celery_app.conf.update(
     task_soft_time_limit=3300,  # 55分のソフトタイムアウト
     worker_prefetch_multiplier=1,
     worker_max_tasks_per_child=1000,
+    # タスク種別・優先度ごとのキュー（services.task_routing）
+    **CELERY_ROUTING_CONFIG,
+    beat_schedule={
+        'age-queued-tasks': {
+            'task': 'age_queued_tasks',
+            'schedule': get_settings().TASK_PRIORITY_AGING_INTERVAL,
+        },
+        'relay-task-outbox': {
+            'task': 'relay_task_outbox',
+            'schedule': get_settings().TASK_OUTBOX_RELAY_INTERVAL,
+        },
+    },
 )
 
 # タスク開始時のシグナル
 @task_prerun.connect
 def task_prerun_handler(sender=None, task_id=None, task=None, args=None, kwargs=None, **extras):
     """タスク開始時の処理"""
-    from services.task_manager import TaskManager
-    manager = TaskManager()
-    manager.update_task_status(
+    from services.progress_sink import progress_sink
+    progress_sink.update(
         task_id=kwargs.get('task_id'),
         status='processing',
         current_step='Task started'
@@ -42,12 +55,14 @@ def task_prerun_handler(sender=None, task_id=None, task=None, args=None, kwargs=
 # タスク完了時のシグナル
 @task_postrun.connect
 def task_postrun_handler(sender=None, task_id=None, task=None, args=None, kwargs=None, retval=None, state=None, **extras):
-    """タスク完了時の処理"""
-    from services.task_manager import TaskManager
-    manager = TaskManager()
+    """タスク完了時の処理（バッファ済みの進捗・ログもここで書き込まれる）"""
+    from services.progress_sink import progress_sink
+    from services.task_logs import task_log_writer
+    
+    task_log_writer.flush()
     
     if state == 'SUCCESS':
-        manager.update_task_status(
+        progress_sink.update(
             task_id=kwargs.get('task_id'),
             status='completed',
             progress=100.0,
@@ -58,15 +73,23 @@ def task_postrun_handler(sender=None, task_id=None, task=None, args=None, kwargs
 @task_failure.connect
 def task_failure_handler(sender=None, task_id=None, exception=None, args=None, kwargs=None, traceback=None, einfo=None, **extras):
     """タスク失敗時の処理"""
-    from services.task_manager import TaskManager
-    manager = TaskManager()
+    from services.progress_sink import progress_sink
     
-    manager.update_task_status(
+    progress_sink.update(
         task_id=kwargs.get('task_id'),
         status='failed',
         error_message=str(exception),
         current_step='Task failed'
     )
 
+# ワーカープロセス終了時のシグナル
+@worker_process_shutdown.connect
+def worker_process_shutdown_handler(**kwargs):
+    """バッファに残っている進捗・ログを書き込む"""
+    from services.progress_sink import progress_sink
+    from services.task_logs import task_log_writer
+    progress_sink.close()
+    task_log_writer.close()
+
 if __name__ == '__main__':
     celery_app.start()
\ No newline at end of file
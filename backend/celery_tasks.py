@@ -1,14 +1,22 @@
 """
 Enhanced Celery tasks with retry logic and error handling
 """
-from celery import Celery, Task
+from celery import Celery, Task, chord, group
 from celery.exceptions import MaxRetriesExceededError, SoftTimeLimitExceeded
-from typing import Dict, Any, Optional
+from celery.signals import worker_process_shutdown
+from typing import Dict, Any, List, Optional
 import logging
+import time
 import traceback
 from datetime import datetime
+from sqlalchemy import case, update
 from config import get_settings
-from models import SessionLocal, Task as TaskModel, TaskStatus, TaskLog
+from models import SessionLocal, Task as TaskModel, TaskStatus
+from services.task_logs import task_log_writer
+from services.task_events import task_event, publish_task_update
+from services.entity_cache import invalidate_task_sync
+from services.task_routing import CELERY_ROUTING_CONFIG
+from monitoring.metrics import track_batch_completed, track_error
 import json
 
 settings = get_settings()
@@ -30,9 +38,17 @@ app.config_from_object({
     'task_acks_late': True,
     'worker_prefetch_multiplier': 1,
     'worker_max_tasks_per_child': 100,
+    # Queues per task type and priority (services.task_routing)
+    **CELERY_ROUTING_CONFIG,
 })
 
 
+@worker_process_shutdown.connect
+def flush_task_logs(**kwargs):
+    """Write any queued task logs before the worker process exits"""
+    task_log_writer.close()
+
+
 class BaseTaskWithRetry(Task):
     """Base task class with automatic retry and error handling"""
     
@@ -85,6 +101,7 @@ class BaseTaskWithRetry(Task):
         try:
             task = db.query(TaskModel).filter(TaskModel.task_id == task_id).first()
             if task:
+                previous_status = task.status
                 task.status = status
                 if progress is not None:
                     task.progress = progress
@@ -94,7 +111,14 @@ class BaseTaskWithRetry(Task):
                     task.completed_at = datetime.utcnow()
                     if task.started_at:
                         task.actual_time = (task.completed_at - task.started_at).total_seconds()
+                task.updated_at = datetime.utcnow()
+                task.version = TaskModel.version + 1
+                db.flush()
+                # Build the event before commit expires the loaded attributes
+                event = task_event(task, previous_status)
                 db.commit()
+                invalidate_task_sync(task_id, event["project_id"])
+                publish_task_update(task_id, event)
         except Exception as e:
             logger.error(f"Failed to update task status: {e}")
             db.rollback()
@@ -108,27 +132,8 @@ class BaseTaskWithRetry(Task):
         message: str,
         metadata: Optional[Dict[str, Any]] = None
     ):
-        """Add log entry for task"""
-        if not task_id:
-            return
-            
-        db = SessionLocal()
-        try:
-            task = db.query(TaskModel).filter(TaskModel.task_id == task_id).first()
-            if task:
-                log = TaskLog(
-                    task_id=task.id,
-                    level=level,
-                    message=message,
-                    metadata=json.dumps(metadata) if metadata else None
-                )
-                db.add(log)
-                db.commit()
-        except Exception as e:
-            logger.error(f"Failed to add task log: {e}")
-            db.rollback()
-        finally:
-            db.close()
+        """Queue a log entry for the task; task_log_writer inserts them in batches"""
+        task_log_writer.add(task_id, message, level=level, metadata=metadata)
 
 
 @app.task(base=BaseTaskWithRetry, bind=True, name='process_video')
@@ -248,6 +253,19 @@ def analyze_audio_task(
         raise self.retry(exc=exc)
 
 
+BATCH_OPERATIONS = {
+    "video": process_video_task,
+    "audio": analyze_audio_task,
+}
+
+# Columns returned by the batch result UPDATE for task events
+EVENT_COLUMNS = (
+    TaskModel.task_id, TaskModel.project_id, TaskModel.status, TaskModel.progress,
+    TaskModel.current_step, TaskModel.total_steps, TaskModel.completed_steps,
+    TaskModel.version, TaskModel.updated_at
+)
+
+
 @app.task(bind=True, name='batch_process')
 def batch_process_task(
     self,
@@ -256,33 +274,132 @@ def batch_process_task(
 ) -> Dict[str, Any]:
     """
     Process multiple tasks in batch
+
+    All tasks are published as the header of one chord (a single apply_async
+    on one producer connection); batch_process_complete runs once every task
+    has succeeded and stores the results. If any task fails after its
+    retries, batch_process_failed stores the outputs of the ones that
+    succeeded instead. An unknown operation fails the whole batch before
+    anything is published.
     """
-    results = {}
-    failed = []
-    
-    for task_id in task_ids:
-        try:
-            if operation == "video":
-                result = process_video_task.apply_async(
-                    kwargs={"task_id": task_id, "input_data": {}}
-                )
-            elif operation == "audio":
-                result = analyze_audio_task.apply_async(
-                    kwargs={"task_id": task_id, "input_data": {}}
+    worker_task = BATCH_OPERATIONS.get(operation)
+    if worker_task is None:
+        raise ValueError(f"Unknown operation: {operation}")
+
+    header = group(
+        worker_task.s(task_id=task_id, input_data={}) for task_id in task_ids
+    )
+    # Fix the header task ids up front so the errback can look up their results
+    result_ids = [task_result.id for task_result in header.freeze().results]
+    started_at = time.time()
+    callback = batch_process_complete.s(task_ids, operation, started_at).on_error(
+        batch_process_failed.s(task_ids, result_ids, operation, started_at)
+    )
+    result = chord(header)(callback)
+
+    return {
+        "processed": len(task_ids),
+        "batch_id": result.id,
+        "results": {
+            task_id: {"status": "queued", "task_id": task_result.id}
+            for task_id, task_result in zip(task_ids, result.parent.results)
+        }
+    }
+
+
+@app.task(name='batch_process_complete')
+def batch_process_complete(
+    results: List[Dict[str, Any]],
+    task_ids: List[str],
+    operation: str,
+    started_at: float
+) -> Dict[str, Any]:
+    """
+    Chord callback for batch_process: store every result with one UPDATE
+
+    ``results`` are in ``task_ids`` order. Status transitions were already
+    written by each task's own hooks; this writes ``output_data`` for all of
+    them in a single statement and records the batch throughput.
+    """
+    return _store_batch_results(task_ids, results, operation, started_at)
+
+
+@app.task(name='batch_process_failed')
+def batch_process_failed(
+    request,
+    exc,
+    traceback,
+    task_ids: List[str],
+    result_ids: List[str],
+    operation: str,
+    started_at: float
+) -> Dict[str, Any]:
+    """
+    Chord errback for batch_process: store the outputs that did succeed
+
+    The chord only calls back once every header task has finished, so every
+    result is in the backend by now. Failed tasks keep the error their own
+    hooks recorded and get no ``output_data``.
+    """
+    results = []
+    for result_id in result_ids:
+        task_result = app.AsyncResult(result_id)
+        results.append(task_result.result if task_result.successful() else None)
+
+    track_error(type(exc).__name__, "batch_process")
+    summary = _store_batch_results(task_ids, results, operation, started_at)
+    logger.error(f"Batch {operation}: {summary['failed']} of {len(task_ids)} tasks failed: {exc}")
+    return summary
+
+
+def _store_batch_results(
+    task_ids: List[str],
+    results: List[Optional[Dict[str, Any]]],
+    operation: str,
+    started_at: float
+) -> Dict[str, Any]:
+    """Write the results of a batch with one UPDATE (None means the task failed)"""
+    outputs = {
+        task_id: json.dumps(result)
+        for task_id, result in zip(task_ids, results)
+        if result is not None
+    }
+    failed = sum(1 for result in results if not result or result.get("status") != "success")
+
+    rows = []
+    db = SessionLocal()
+    try:
+        if outputs:
+            rows = db.execute(
+                update(TaskModel)
+                .where(TaskModel.task_id.in_(list(outputs)))
+                .values(
+                    output_data=case(outputs, value=TaskModel.task_id),
+                    updated_at=datetime.utcnow(),
+                    version=TaskModel.version + 1
                 )
-            else:
-                raise ValueError(f"Unknown operation: {operation}")
-                
-            results[task_id] = {"status": "queued", "task_id": result.id}
-            
-        except Exception as e:
-            failed.append(task_id)
-            results[task_id] = {"status": "failed", "error": str(e)}
-    
+                .returning(*EVENT_COLUMNS)
+            ).all()
+            db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+    for row in rows:
+        invalidate_task_sync(row.task_id, row.project_id)
+        publish_task_update(row.task_id, task_event(row))
+
+    duration = time.time() - started_at
+    track_batch_completed(operation, len(results) - failed, failed, duration)
+    logger.info(f"Batch {operation} of {len(results)} tasks finished in {duration:.1f}s")
+
     return {
-        "processed": len(task_ids) - len(failed),
-        "failed": len(failed),
-        "results": results
+        "processed": len(results) - failed,
+        "failed": failed,
+        "updated": len(rows),
+        "duration": duration
     }
 
 
@@ -1,6 +1,6 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from api import tasks, projects, status
+from api import tasks, projects, status, websocket
 import uvicorn
 import os
 
@@ -23,6 +23,7 @@ app.add_middleware(
 app.include_router(tasks.router, prefix="/api/tasks", tags=["tasks"])
 app.include_router(projects.router, prefix="/api/projects", tags=["projects"])
 app.include_router(status.router, prefix="/api/status", tags=["status"])
+app.include_router(websocket.router, tags=["websocket"])
 
 @app.get("/")
 async def root():
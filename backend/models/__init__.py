@@ -1,14 +1,27 @@
-from .database import Base, engine, SessionLocal, get_db
+from .database import (
+    Base,
+    engine,
+    SessionLocal,
+    get_db,
+    async_engine,
+    AsyncSessionLocal,
+    get_async_db
+)
 from .task import Task, TaskStatus, TaskLog
 from .project import Project
+from .outbox import TaskOutbox
 
 __all__ = [
     'Base',
     'engine',
     'SessionLocal',
     'get_db',
+    'async_engine',
+    'AsyncSessionLocal',
+    'get_async_db',
     'Task',
     'TaskStatus',
     'TaskLog',
-    'Project'
-]
\ No newline at end of file
+    'Project',
+    'TaskOutbox'
+]
@@ -0,0 +1,21 @@
+from sqlalchemy import Column, Integer, String, DateTime, Text
+from sqlalchemy.sql import func
+from .database import Base
+
+class TaskOutbox(Base):
+    """
+    ワーカーへ投入待ちのタスク（トランザクショナル・アウトボックス）
+
+    タスクの作成と同じトランザクションで書き込み、services.task_outbox の
+    リレーが古い順にまとめて publish してから削除する。
+    """
+    __tablename__ = "task_outbox"
+    
+    id = Column(Integer, primary_key=True)
+    task_id = Column(String(100), nullable=False)
+    task_type = Column(String(50), nullable=False)
+    priority = Column(Integer)
+    # TaskCreate.input_data（JSON）
+    payload = Column(Text)
+    
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -0,0 +1,48 @@
+import time
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+from monitoring.metrics import track_database_pool, track_database_pool_wait
+
+
+class _CheckoutTimingMixin:
+    """接続取得の待ち時間をヒストグラムに記録するプールMixin"""
+
+    pool_name = "default"
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            track_database_pool_wait(self.pool_name, time.perf_counter() - start)
+
+
+class InstrumentedQueuePool(_CheckoutTimingMixin, QueuePool):
+    pool_name = "sync"
+
+
+class InstrumentedAsyncQueuePool(_CheckoutTimingMixin, AsyncAdaptedQueuePool):
+    pool_name = "async"
+
+
+def instrument_pool(pool):
+    """checkout/checkin イベントで接続数ゲージを更新"""
+    if not isinstance(pool, QueuePool):
+        # SQLiteのインメモリ用プール等は対象外
+        return
+
+    name = getattr(pool, "pool_name", "default")
+
+    def _report(delta: int):
+        track_database_pool(name, pool.checkedout() + delta, pool.checkedin() - delta)
+
+    @event.listens_for(pool, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        _report(0)
+
+    @event.listens_for(pool, "checkin")
+    def _on_checkin(dbapi_connection, connection_record):
+        # checkin はプールへ戻る直前に発火するため1本分補正する
+        _report(-1)
+
+    _report(0)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text
+from sqlalchemy import Column, Integer, String, DateTime, Text, inspect
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from .database import Base
@@ -20,7 +20,18 @@ class Project(Base):
     # Relationships
     tasks = relationship("Task", back_populates="project", cascade="all, delete-orphan")
     
-    def to_dict(self):
+    def to_dict(self, task_counts=None):
+        """
+        task_counts: {ステータス値: 件数}（api.projects で一括集計したもの）。
+        未指定の場合はロード済みの tasks からのみ集計し、遅延ロードは行わない。
+        """
+        if task_counts is None:
+            task_counts = {}
+            if "tasks" not in inspect(self).unloaded:
+                for task in self.tasks:
+                    key = task.status.value if task.status else None
+                    task_counts[key] = task_counts.get(key, 0) + 1
+        
         return {
             "id": self.id,
             "name": self.name,
@@ -31,5 +42,6 @@ class Project(Base):
             "output_dir": self.output_dir,
             "created_at": self.created_at.isoformat() if self.created_at else None,
             "updated_at": self.updated_at.isoformat() if self.updated_at else None,
-            "task_count": len(self.tasks) if self.tasks else 0
+            "task_count": sum(task_counts.values()),
+            "task_status_counts": task_counts
         }
\ No newline at end of file
@@ -1,10 +1,13 @@
-from sqlalchemy import Column, Integer, String, DateTime, Float, Text, ForeignKey, Enum as SQLEnum
+from sqlalchemy import Column, Integer, String, DateTime, Float, Text, ForeignKey, Index, Enum as SQLEnum
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
-from datetime import datetime
+from datetime import datetime, timezone
 import enum
 from .database import Base
 
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
 class TaskStatus(enum.Enum):
     PENDING = "pending"
     PROCESSING = "processing"
@@ -14,6 +17,16 @@ class TaskStatus(enum.Enum):
 
 class Task(Base):
     __tablename__ = "tasks"
+    __table_args__ = (
+        # 一覧のキーセットページング (priority, created_at, id)
+        Index("ix_tasks_priority_created_id", "priority", "created_at", "id"),
+        # ステータス絞り込み・ステータス別集計
+        Index("ix_tasks_status_priority_created_id", "status", "priority", "created_at", "id"),
+        # プロジェクト + ステータス絞り込み
+        Index("ix_tasks_project_status_priority_created_id", "project_id", "status", "priority", "created_at", "id"),
+        # サマリーの最近完了・失敗タスク
+        Index("ix_tasks_status_completed_at", "status", "completed_at"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     task_id = Column(String(100), unique=True, index=True, nullable=False)
@@ -24,12 +37,17 @@ class Task(Base):
     current_step = Column(String(200))
     total_steps = Column(Integer, default=0)
     completed_steps = Column(Integer, default=0)
+    priority = Column(Integer, default=5, server_default="5", nullable=False)
+    # 変更のたびに +1 する（ロングポーリングの wait_for_version 用）
+    version = Column(Integer, default=1, server_default="1", nullable=False)
     
     input_data = Column(Text)
     output_data = Column(Text)
     error_message = Column(Text)
     
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # キーセットのカーソルと同じ形式で保存されるよう、値はアプリ側で入れる
+    # （SQLite の CURRENT_TIMESTAMP は秒までの文字列で、カーソルの値と比較がずれる）
+    created_at = Column(DateTime(timezone=True), default=_utcnow, server_default=func.now())
     started_at = Column(DateTime(timezone=True))
     completed_at = Column(DateTime(timezone=True))
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
@@ -52,6 +70,8 @@ class Task(Base):
             "current_step": self.current_step,
             "total_steps": self.total_steps,
             "completed_steps": self.completed_steps,
+            "priority": self.priority,
+            "version": self.version,
             "created_at": self.created_at.isoformat() if self.created_at else None,
             "started_at": self.started_at.isoformat() if self.started_at else None,
             "completed_at": self.completed_at.isoformat() if self.completed_at else None,
@@ -62,15 +82,20 @@ class Task(Base):
 
 class TaskLog(Base):
     __tablename__ = "task_logs"
+    __table_args__ = (
+        # タスク別ログの時系列取得 (task_id, timestamp, id)
+        Index("ix_task_logs_task_timestamp_id", "task_id", "timestamp", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     task_id = Column(Integer, ForeignKey("tasks.id"), nullable=False)
-    timestamp = Column(DateTime(timezone=True), server_default=func.now())
+    timestamp = Column(DateTime(timezone=True), default=_utcnow, server_default=func.now())
     level = Column(String(20), default="INFO")
     message = Column(Text)
     step_name = Column(String(200))
     step_progress = Column(Float)
-    metadata = Column(Text)
+    # "metadata" は declarative で予約済みの属性名なので、列名だけを metadata にする
+    meta = Column("metadata", Text)
     
     # Relationships
     task = relationship("Task", back_populates="logs")
@@ -84,5 +109,5 @@ class TaskLog(Base):
             "message": self.message,
             "step_name": self.step_name,
             "step_progress": self.step_progress,
-            "metadata": self.metadata
+            "metadata": self.meta
         }
\ No newline at end of file
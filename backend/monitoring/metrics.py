@@ -76,6 +76,28 @@ tasks_in_progress = Gauge(
     registry=registry
 )
 
+batch_tasks_processed_total = Counter(
+    'batch_tasks_processed_total',
+    'Tasks processed by batch_process',
+    ['operation', 'status'],
+    registry=registry
+)
+
+batch_processing_duration_seconds = Histogram(
+    'batch_processing_duration_seconds',
+    'Time from batch publish to the chord callback',
+    ['operation'],
+    registry=registry,
+    buckets=(1, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+)
+
+batch_throughput_tasks_per_second = Gauge(
+    'batch_throughput_tasks_per_second',
+    'Throughput of the most recently completed batch',
+    ['operation'],
+    registry=registry
+)
+
 task_queue_size = Gauge(
     'task_queue_size',
     'Number of tasks in queue',
@@ -87,15 +109,25 @@ task_queue_size = Gauge(
 database_connections_active = Gauge(
     'database_connections_active',
     'Active database connections',
+    ['pool'],
     registry=registry
 )
 
 database_connections_idle = Gauge(
     'database_connections_idle',
     'Idle database connections',
+    ['pool'],
     registry=registry
 )
 
+database_pool_checkout_wait_seconds = Histogram(
+    'database_pool_checkout_wait_seconds',
+    'Time spent waiting for a pooled database connection',
+    ['pool'],
+    registry=registry,
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+)
+
 database_query_duration_seconds = Histogram(
     'database_query_duration_seconds',
     'Database query duration',
@@ -156,6 +188,13 @@ websocket_messages_received_total = Counter(
     registry=registry
 )
 
+websocket_messages_dropped_total = Counter(
+    'websocket_messages_dropped_total',
+    'WebSocket messages dropped or merged before sending to a slow client',
+    ['reason'],
+    registry=registry
+)
+
 # Error metrics
 errors_total = Counter(
     'errors_total',
@@ -200,6 +239,16 @@ def track_task_completed(task_type: str, status: str, duration: float):
         task_processing_duration_seconds.labels(task_type=task_type).observe(duration)
 
 
+def track_batch_completed(operation: str, processed: int, failed: int, duration: float):
+    """Track a completed batch_process fan-out and its throughput"""
+    batch_tasks_processed_total.labels(operation=operation, status="completed").inc(processed)
+    if failed:
+        batch_tasks_processed_total.labels(operation=operation, status="failed").inc(failed)
+    batch_processing_duration_seconds.labels(operation=operation).observe(duration)
+    if duration > 0:
+        batch_throughput_tasks_per_second.labels(operation=operation).set(processed / duration)
+
+
 def track_task_progress(task_type: str, delta: int):
     """Track tasks in progress"""
     tasks_in_progress.labels(task_type=task_type).inc(delta)
@@ -210,6 +259,17 @@ def track_database_query(operation: str, table: str, duration: float):
     database_query_duration_seconds.labels(operation=operation, table=table).observe(duration)
 
 
+def track_database_pool(pool: str, active: int, idle: int):
+    """Track database connection pool usage"""
+    database_connections_active.labels(pool=pool).set(active)
+    database_connections_idle.labels(pool=pool).set(idle)
+
+
+def track_database_pool_wait(pool: str, duration: float):
+    """Track time spent waiting for a pooled connection"""
+    database_pool_checkout_wait_seconds.labels(pool=pool).observe(duration)
+
+
 def track_websocket_connection(delta: int):
     """Track WebSocket connections"""
     websocket_connections_active.inc(delta)
@@ -223,6 +283,11 @@ def track_websocket_message(direction: str, message_type: str):
         websocket_messages_received_total.labels(message_type=message_type).inc()
 
 
+def track_websocket_drop(reason: str):
+    """Track outbound WebSocket messages dropped ("overflow") or merged ("coalesced")"""
+    websocket_messages_dropped_total.labels(reason=reason).inc()
+
+
 def track_error(error_type: str, component: str):
     """Track errors"""
     errors_total.labels(error_type=error_type, component=component).inc()
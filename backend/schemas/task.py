@@ -102,6 +102,7 @@ class TaskResponse(BaseModel):
     actual_time: Optional[float]
     error_message: Optional[str]
     priority: int = 5
+    version: int = 1
     
     class Config:
         orm_mode = True
@@ -117,6 +118,7 @@ class TaskListResponse(BaseModel):
     limit: int
     offset: int
     has_more: bool
+    next_cursor: Optional[str] = Field(None, description="Opaque cursor for the next page")
     
     @validator("has_more", pre=False, always=True)
     def calculate_has_more(cls, v, values):
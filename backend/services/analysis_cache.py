@@ -0,0 +1,209 @@
+"""
+音楽・ビデオ分析結果のコンテンツアドレス型キャッシュ
+
+同じ音源・映像ファイルが複数のプロジェクトで使われても、分析をやり直さないようにする。
+キーはファイル内容の SHA-256・分析の種類・パラメータ・分析器のバージョンから作るので、
+パスが違っても内容が同じなら同じ結果を使い、分析器を変えたらバージョンを上げれば古い結果は使われない。
+結果（ビートグリッド・ショットリスト等）は ANALYSIS_CACHE_DIR に JSON で保存し、
+合計が ANALYSIS_CACHE_MAX_BYTES を超えたら最後に使われた時刻（mtime）の古いものから消す。
+同じホストのワーカープロセスはディレクトリを共有する（書き込みは一時ファイルからの rename で行う）。
+合計サイズはディレクトリ内の SIZE_FILE に全プロセスで共有して足し込み（flock で排他）、
+ディレクトリを走査するのは合計が上限を超えたとき（と SIZE_FILE がないとき）だけにする。
+flock のない環境では書き込みのたびに走査する。
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from config import get_settings
+from monitoring.metrics import track_cache_access
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+HASH_BLOCK_SIZE = 1024 * 1024
+# 全プロセスで共有する合計サイズ（バイト数の10進文字列）
+SIZE_FILE = ".size"
+
+
+@lru_cache(maxsize=1024)
+def _file_digest(path: str, size: int, mtime_ns: int) -> str:
+    # サイズと更新時刻が同じ間はハッシュし直さない
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def content_hash(path: str) -> str:
+    """ファイル内容の SHA-256（読めない場合は OSError）"""
+    path = os.path.realpath(path)
+    stat = os.stat(path)
+    return _file_digest(path, stat.st_size, stat.st_mtime_ns)
+
+
+class AnalysisCache:
+    """分析結果を JSON で保存する、サイズ上限付きの LRU ディスクキャッシュ"""
+
+    def __init__(self, directory: str = None, max_bytes: int = None):
+        self.directory = directory or settings.ANALYSIS_CACHE_DIR
+        self.max_bytes = settings.ANALYSIS_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+
+    def key(self, kind: str, path: str, params: Dict[str, Any] = None, version: int = 1) -> Optional[str]:
+        """キャッシュキー（ファイルが読めない場合は None でキャッシュしない）"""
+        try:
+            digest = content_hash(path)
+        except (OSError, TypeError) as e:
+            logger.debug(f"Not caching {kind} analysis of {path}: {e}")
+            return None
+        material = json.dumps([kind, version, digest, params or {}], sort_keys=True)
+        return hashlib.sha256(material.encode()).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def get(self, kind: str, path: str, params: Dict[str, Any] = None, version: int = 1) -> Optional[dict]:
+        """保存済みの結果（なければ None）。使った結果は LRU の先頭にする"""
+        if not self.max_bytes:
+            return None
+        key = self.key(kind, path, params, version)
+        if key is None:
+            return None
+
+        entry = self._path(key)
+        try:
+            with open(entry, "rb") as f:
+                result = json.loads(f.read())
+            os.utime(entry)
+        except FileNotFoundError:
+            result = None
+        except (OSError, ValueError) as e:
+            # 壊れたエントリは消して分析し直す
+            logger.warning(f"Discarding unreadable analysis cache entry {entry}: {e}")
+            self._remove(entry)
+            result = None
+
+        track_cache_access(f"analysis_{kind}", result is not None)
+        return result
+
+    def put(self, kind: str, path: str, result: dict, params: Dict[str, Any] = None, version: int = 1):
+        """結果を保存し、上限を超えていれば古いものから消す（失敗しても分析は止めない）"""
+        if not self.max_bytes:
+            return
+        key = self.key(kind, path, params, version)
+        if key is None:
+            return
+
+        entry = self._path(key)
+        data = json.dumps(result).encode()
+        try:
+            os.makedirs(os.path.dirname(entry), exist_ok=True)
+            try:
+                replaced = os.stat(entry).st_size
+            except FileNotFoundError:
+                replaced = 0
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(entry), suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                os.replace(temp_path, entry)
+            except BaseException:
+                self._remove(temp_path)
+                raise
+            if self._add_to_total(len(data) - replaced):
+                self.evict()
+        except OSError as e:
+            logger.warning(f"Failed to store {kind} analysis in cache: {e}")
+
+    @contextmanager
+    def _total_file(self) -> Iterator[int]:
+        """SIZE_FILE を開いて排他ロックを取る（ファイル記述子を返す）"""
+        os.makedirs(self.directory, exist_ok=True)
+        fd = os.open(os.path.join(self.directory, SIZE_FILE), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield fd
+        finally:
+            os.close(fd)  # ロックも外れる
+
+    @staticmethod
+    def _read_total(fd: int) -> Optional[int]:
+        os.lseek(fd, 0, os.SEEK_SET)
+        try:
+            return int(os.read(fd, 32))
+        except ValueError:
+            return None  # 作ったばかり・壊れている
+
+    @staticmethod
+    def _write_total(fd: int, total: int):
+        os.lseek(fd, 0, os.SEEK_SET)
+        os.ftruncate(fd, 0)
+        os.write(fd, str(total).encode())
+
+    def _add_to_total(self, delta: int) -> bool:
+        """共有の合計サイズに delta を足し、走査が必要なら True を返す"""
+        if fcntl is None:
+            return True
+        with self._total_file() as fd:
+            total = self._read_total(fd)
+            if total is None:
+                return True
+            total += delta
+            self._write_total(fd, total)
+        return total > self.max_bytes
+
+    def evict(self) -> int:
+        """合計サイズが max_bytes 以下になるまで最後に使われたのが古いエントリから消す"""
+        if fcntl is None:
+            return self._evict()[0]
+        # 走査中に他のプロセスが合計を足し込まないよう、ロックを保持したまま走査する
+        with self._total_file() as fd:
+            evicted, total = self._evict()
+            self._write_total(fd, total)
+        return evicted
+
+    def _evict(self) -> Tuple[int, int]:
+        """ディレクトリを走査して消す（消した件数と残りの合計サイズを返す）"""
+        entries = []
+        total = 0
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith(".json"):
+                    continue
+                entry = os.path.join(root, name)
+                try:
+                    stat = os.stat(entry)
+                except FileNotFoundError:
+                    continue  # 別のプロセスが消した
+                entries.append((stat.st_mtime_ns, stat.st_size, entry))
+                total += stat.st_size
+
+        evicted = 0
+        for _, size, entry in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self._remove(entry)
+            total -= size
+            evicted += 1
+        if evicted:
+            logger.info(f"Evicted {evicted} analysis cache entries")
+        return evicted, total
+
+    def _remove(self, entry: str):
+        try:
+            os.remove(entry)
+        except FileNotFoundError:
+            pass
+
+
+analysis_cache = AnalysisCache()
@@ -0,0 +1,132 @@
+"""
+タスク・プロジェクト詳細の Redis キャッシュ
+
+GET /api/tasks/{task_id} と GET /api/projects/{project_id} の応答（to_dict の結果）を
+読み込み時にキャッシュする（read-through）。書き込み側はコミット後に必ず invalidate する。
+- APIルーター: invalidate_task / invalidate_project（非同期）
+- ワーカー（TaskManager / BaseTaskWithRetry）: invalidate_task_sync（同期）
+無効化と読み込みが競合した場合でも、古い値が残るのは最大で TTL の間だけ。
+Redis に接続できない間は CACHE_RETRY_INTERVAL 秒ごとに再試行し、それまでは DB を直接読む。
+"""
+import json
+import logging
+import time
+from typing import Awaitable, Callable, Iterable, Optional, Tuple
+
+import redis
+import redis.asyncio as aioredis
+
+from config import get_settings
+from monitoring.metrics import track_cache_access
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "cache:"
+
+
+def task_key(task_id: str) -> str:
+    return f"{KEY_PREFIX}task:{task_id}"
+
+def project_key(project_id: int) -> str:
+    return f"{KEY_PREFIX}project:{project_id}"
+
+
+class EntityCache:
+    """JSON で保存する read-through キャッシュ（name はメトリクスの cache_name）"""
+
+    def __init__(
+        self,
+        name: str,
+        ttl: int,
+        url: str = None,
+        client: aioredis.Redis = None,
+        sync_client: redis.Redis = None
+    ):
+        self.name = name
+        self.ttl = ttl
+        self.url = url or settings.REDIS_URL
+        self.client = client
+        self.sync_client = sync_client
+        self._retry_at = 0.0
+
+    def _available(self) -> bool:
+        return settings.CACHE_ENABLED and time.monotonic() >= self._retry_at
+
+    def _failed(self, action: str, e: Exception):
+        logger.warning(f"{self.name} cache {action} failed: {e}")
+        self._retry_at = time.monotonic() + settings.CACHE_RETRY_INTERVAL
+
+    def _get_client(self) -> aioredis.Redis:
+        if self.client is None:
+            self.client = aioredis.Redis.from_url(self.url)
+        return self.client
+
+    def _get_sync_client(self) -> redis.Redis:
+        if self.sync_client is None:
+            self.sync_client = redis.Redis.from_url(self.url)
+        return self.sync_client
+
+    async def get_or_load(self, key: str, loader: Callable[[], Awaitable[Optional[dict]]]) -> Optional[dict]:
+        """キャッシュにあればそれを、なければ loader の結果を保存して返す（None は保存しない）"""
+        if not self._available():
+            return await loader()
+
+        try:
+            cached = await self._get_client().get(key)
+        except Exception as e:
+            self._failed("read", e)
+            return await loader()
+
+        track_cache_access(self.name, cached is not None)
+        if cached is not None:
+            return json.loads(cached)
+
+        value = await loader()
+        if value is not None:
+            try:
+                await self._get_client().set(key, json.dumps(value), ex=self.ttl)
+            except Exception as e:
+                self._failed("write", e)
+        return value
+
+    async def invalidate(self, *keys: str):
+        if not settings.CACHE_ENABLED or not keys:
+            return
+        try:
+            await self._get_client().delete(*keys)
+        except Exception as e:
+            self._failed("invalidation", e)
+
+    def invalidate_sync(self, *keys: str):
+        if not settings.CACHE_ENABLED or not keys:
+            return
+        try:
+            self._get_sync_client().delete(*keys)
+        except Exception as e:
+            self._failed("invalidation", e)
+
+
+task_cache = EntityCache("task", settings.CACHE_TASK_TTL)
+project_cache = EntityCache("project", settings.CACHE_PROJECT_TTL)
+
+
+def _task_keys(task_id: str, project_id: Optional[int]) -> list:
+    # プロジェクト詳細はステータス別のタスク数を含むので、タスクの変更でも無効化する
+    return [task_key(task_id)] + ([project_key(project_id)] if project_id is not None else [])
+
+async def invalidate_task(task_id: str, project_id: Optional[int] = None):
+    """タスク（と所属プロジェクト）のキャッシュを無効化"""
+    await task_cache.invalidate(*_task_keys(task_id, project_id))
+
+async def invalidate_tasks(tasks: Iterable[Tuple[str, Optional[int]]]):
+    """(task_id, project_id) の組をまとめて無効化（1回の DELETE）"""
+    keys = [key for task_id, project_id in tasks for key in _task_keys(task_id, project_id)]
+    await task_cache.invalidate(*dict.fromkeys(keys))
+
+def invalidate_task_sync(task_id: str, project_id: Optional[int] = None):
+    """ワーカー用の invalidate_task"""
+    task_cache.invalidate_sync(*_task_keys(task_id, project_id))
+
+async def invalidate_project(project_id: int):
+    await project_cache.invalidate(project_key(project_id))
@@ -0,0 +1,135 @@
+"""
+Celeryワーカー内の進捗書き込みをまとめるシンク
+
+進捗の更新はタスクごとにバッファし、最新の状態だけを
+PROGRESS_FLUSH_INTERVAL_MS ごとに1回の UPDATE で書き込む。
+ステータスが変わる更新はバッファ済みの内容と合わせて即座に書き込む。
+どちらも事前に SELECT しない1回の UPDATE（TaskManager.write_progress）で書き込む。
+DB への書き込みはバッファのロックの外で行い、同じタスクの書き込み順序は
+タスクごとのロック（task_id で振り分けた固定数のロック）で保つ。
+"""
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+from config import get_settings
+from services.task_manager import TaskManager
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = {"completed", "failed", "cancelled"}
+WRITE_LOCK_STRIPES = 64
+
+
+class ProgressSink:
+    """タスクごとに進捗をバッファし、一定間隔でまとめて書き込む"""
+
+    def __init__(self, manager: TaskManager, flush_interval: float):
+        self.manager = manager
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._write_locks = [threading.Lock() for _ in range(WRITE_LOCK_STRIPES)]
+        self._pending: Dict[str, dict] = {}
+        self._last_flush: Dict[str, float] = {}
+        self._stop = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+        self._flusher_pid: Optional[int] = None
+
+    def update(self, task_id: str, status: str = None, **fields):
+        """
+        タスクの更新を受け付ける
+
+        status を指定した場合、またはこのタスクの前回の書き込みから
+        flush_interval 以上経っている場合はすぐに書き込む。
+        それ以外はバッファし、バックグラウンドスレッドが書き込む。
+        """
+        if not task_id:
+            return
+
+        fields = {key: value for key, value in fields.items() if value is not None}
+
+        with self._lock:
+            pending = self._pending.setdefault(task_id, {})
+            pending.update(fields)
+
+            last_flush = self._last_flush.get(task_id)
+            if (
+                status is None
+                and last_flush is not None
+                and time.monotonic() - last_flush < self.flush_interval
+            ):
+                self._ensure_flusher()
+                return
+
+        self._write(task_id, status)
+
+    def flush(self, task_id: str = None):
+        """バッファ済みの更新を書き込む（task_id 省略時は全タスク）"""
+        with self._lock:
+            task_ids = [task_id] if task_id else list(self._pending)
+        for pending_id in task_ids:
+            self._write(pending_id)
+
+    def close(self):
+        """バックグラウンドスレッドを止め、残りを書き込む"""
+        self._stop.set()
+        self.flush()
+
+    def _write_lock(self, task_id: str) -> threading.Lock:
+        return self._write_locks[hash(task_id) % len(self._write_locks)]
+
+    def _write(self, task_id: str, status: str = None):
+        """
+        バッファ済みの内容を取り出して書き込む
+
+        取り出しから書き込みまでタスクごとのロックを保持し、同じタスクの書き込みが
+        前後しないようにする（バッファのロックは取り出しの間だけ保持する）。
+        """
+        with self._write_lock(task_id):
+            with self._lock:
+                fields = self._pending.pop(task_id, {})
+                if status in TERMINAL_STATUSES:
+                    self._last_flush.pop(task_id, None)
+                elif status or fields:
+                    self._last_flush[task_id] = time.monotonic()
+
+            if status or fields:
+                self.manager.write_progress(task_id=task_id, status=status, **fields)
+
+    def _flush_due(self):
+        now = time.monotonic()
+        with self._lock:
+            due = [
+                task_id for task_id in self._pending
+                if now - self._last_flush.get(task_id, 0) >= self.flush_interval
+            ]
+            # 間隔以上書き込みのないタスクは次の更新をすぐに書き込むので、記録は要らない
+            for task_id, last_flush in list(self._last_flush.items()):
+                if task_id not in self._pending and now - last_flush >= self.flush_interval:
+                    del self._last_flush[task_id]
+        for task_id in due:
+            self._write(task_id)
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self._flush_due()
+            except Exception as e:
+                logger.error(f"Error flushing task progress: {e}")
+
+    def _ensure_flusher(self):
+        # prefork ワーカーではフォーク後の子プロセスごとにスレッドを起動する
+        if self._flusher_pid == os.getpid() and self._flusher.is_alive():
+            return
+        self._stop.clear()
+        self._flusher = threading.Thread(
+            target=self._run, name="progress-sink", daemon=True
+        )
+        self._flusher.start()
+        self._flusher_pid = os.getpid()
+
+
+progress_sink = ProgressSink(TaskManager(), settings.PROGRESS_FLUSH_INTERVAL_MS / 1000)
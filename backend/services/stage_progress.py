@@ -0,0 +1,88 @@
+"""
+ワークフローのステージ進捗を親タスクの進捗にまとめる
+
+process_video_edit のように1つのタスクを複数の Celery タスク（ステージ）に分けて
+並列実行する場合、各ステージは自分の進み具合（0〜1）を Redis のハッシュ
+stages:{task_id} に書き込み、全ステージの重み付き合計（0〜100）を親タスクの進捗にする。
+HSET と HGETALL は1つの MULTI で実行するので、別のワーカーで同時に動くステージの
+進捗も取りこぼさない（各ステージの値は増える一方なので、合計も Redis 上の順序では減らない）。
+DB への書き込みはワーカーごとの progress_sink を通るため、並列ステージの間では
+書き込み順が前後して一時的に少し戻って見えることがある。
+"""
+import logging
+from typing import Dict, Optional
+
+import redis
+
+from config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "stages:"
+STAGE_PROGRESS_TTL = 24 * 3600  # 途中で止まったワークフローのハッシュも残らないように
+
+
+def stage_key(task_id: str) -> str:
+    return f"{KEY_PREFIX}{task_id}"
+
+
+class StageProgress:
+    """ステージ名 → 重み（合計 100）で親タスクの進捗を計算する"""
+
+    def __init__(
+        self,
+        weights: Dict[str, float],
+        ttl: int = STAGE_PROGRESS_TTL,
+        url: str = None,
+        client: redis.Redis = None
+    ):
+        self.weights = weights
+        self.ttl = ttl
+        self.url = url or settings.REDIS_URL
+        self.client = client
+
+    def _get_client(self) -> redis.Redis:
+        # prefork ワーカーでは最初の報告時（フォーク後）に接続する
+        if self.client is None:
+            self.client = redis.Redis.from_url(self.url)
+        return self.client
+
+    def rollup(self, fractions: Dict[str, float]) -> float:
+        """ステージごとの進み具合から親タスクの進捗（0〜100）を計算"""
+        total = sum(self.weights.values())
+        done = sum(
+            weight * min(1.0, max(0.0, fractions.get(stage, 0.0)))
+            for stage, weight in self.weights.items()
+        )
+        return round(done * 100.0 / total, 1) if total else 0.0
+
+    def report(self, task_id: str, stage: str, fraction: float) -> Optional[float]:
+        """
+        ステージの進み具合を記録し、親タスクの進捗を返す
+
+        Redis に書き込めない場合は None（進捗の更新を見送るだけでタスクは止めない）
+        """
+        if stage not in self.weights:
+            raise ValueError(f"Unknown stage: {stage}")
+
+        key = stage_key(task_id)
+        try:
+            pipe = self._get_client().pipeline(transaction=True)
+            pipe.hset(key, stage, min(1.0, max(0.0, fraction)))
+            pipe.expire(key, self.ttl)
+            pipe.hgetall(key)
+            stored = pipe.execute()[-1]
+        except Exception as e:
+            logger.warning(f"Failed to report stage progress for task {task_id}: {e}")
+            return None
+
+        fractions = {name.decode(): float(value) for name, value in stored.items()}
+        return self.rollup(fractions)
+
+    def clear(self, task_id: str):
+        """ワークフローの終了時（成功・失敗とも）にハッシュを消す"""
+        try:
+            self._get_client().delete(stage_key(task_id))
+        except Exception as e:
+            logger.warning(f"Failed to clear stage progress for task {task_id}: {e}")
@@ -0,0 +1,281 @@
+"""
+ステータスサマリーのスナップショット
+
+/api/status/summary はダッシュボードから頻繁にポーリングされるため、
+リクエストごとに集計せずプロセス内のスナップショットを返す。
+このプロセスでの状態遷移はその場で、Celeryワーカーや他のAPIプロセスでの遷移は
+pub/sub で受け取ったイベント（services.task_events）で差分反映する。
+STATUS_SUMMARY_MAX_STALENESS 秒ごとの再構築で、取りこぼしや
+イベントを伴わない変更（他のプロセスでの作成・削除など）を補正する。
+"""
+import asyncio
+import time
+from collections import OrderedDict, deque
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Dict, Optional
+
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from api.etag import weak_etag
+from config import get_settings
+from models import Task, TaskStatus
+
+settings = get_settings()
+
+RECENT_COMPLETED_LIMIT = 10
+RECENT_FAILED_LIMIT = 5
+# 反映済みのイベントを見分けるために version を覚えておくタスク数
+APPLIED_VERSIONS_LIMIT = 10000
+
+
+def _isoformat(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value else None
+
+def _processing_entry(task) -> dict:
+    return {
+        "task_id": task.task_id,
+        "task_type": task.task_type,
+        "progress": task.progress,
+        "current_step": task.current_step,
+        "started_at": _isoformat(task.started_at)
+    }
+
+def _completed_entry(task) -> dict:
+    return {
+        "task_id": task.task_id,
+        "task_type": task.task_type,
+        "completed_at": _isoformat(task.completed_at),
+        "actual_time": task.actual_time
+    }
+
+def _failed_entry(task) -> dict:
+    return {
+        "task_id": task.task_id,
+        "task_type": task.task_type,
+        "error_message": task.error_message,
+        "failed_at": _isoformat(task.completed_at)
+    }
+
+def _parse_datetime(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value else None
+
+def _event_task(data: dict) -> SimpleNamespace:
+    """ステータス変更のイベント（task_event）を Task と同じ属性で読めるようにする"""
+    return SimpleNamespace(
+        task_id=data["task_id"],
+        task_type=data.get("task_type"),
+        status=TaskStatus(data["status"]),
+        progress=data.get("progress"),
+        current_step=data.get("current_step"),
+        started_at=_parse_datetime(data.get("started_at")),
+        completed_at=_parse_datetime(data.get("completed_at")),
+        actual_time=data.get("actual_time"),
+        error_message=data.get("error_message"),
+        version=data.get("version")
+    )
+
+
+class StatusSnapshot:
+    """ステータス別件数・実行中タスク・最近の完了/失敗タスクを保持する"""
+
+    def __init__(self, max_staleness: float):
+        self.max_staleness = max_staleness
+        self._lock = asyncio.Lock()
+        self._built_at: Optional[float] = None
+        self._synced_at: Optional[datetime] = None
+        self._counts: Dict[str, int] = {}
+        self._processing: "OrderedDict[str, dict]" = OrderedDict()
+        self._recent_completed: deque = deque(maxlen=RECENT_COMPLETED_LIMIT)
+        self._recent_failed: deque = deque(maxlen=RECENT_FAILED_LIMIT)
+        # task_id → 反映済みの version（自分の publish したイベントを二重に数えないため）
+        self._versions: "OrderedDict[str, int]" = OrderedDict()
+        self._payload: Optional[dict] = None
+        self._etag: Optional[str] = None
+
+    @property
+    def is_stale(self) -> bool:
+        return (
+            self._built_at is None
+            or time.monotonic() - self._built_at >= self.max_staleness
+        )
+
+    async def get(self, db: AsyncSession) -> dict:
+        """サマリーを返す（古くなっていればDBから再構築）"""
+        if self.is_stale:
+            async with self._lock:
+                # 待っている間に他のリクエストが再構築済みなら何もしない
+                if self.is_stale:
+                    await self.rebuild(db)
+
+        if self._payload is None:
+            self._payload = self._render()
+            self._etag = weak_etag(
+                {key: value for key, value in self._payload.items() if key != "synced_at"}
+            )
+        return self._payload
+
+    @property
+    def etag(self) -> Optional[str]:
+        """
+        直近に get() が返したサマリーの弱い ETag
+
+        synced_at を除いた内容から作るので、内容が同じなら再構築後も、
+        別のAPIプロセスでも同じ値になる。
+        """
+        return self._etag
+
+    async def rebuild(self, db: AsyncSession):
+        """DBからスナップショットを作り直す"""
+        counts = {status.value: 0 for status in TaskStatus}
+        result = await db.execute(
+            select(Task.status, func.count()).group_by(Task.status)
+        )
+        for status, count in result:
+            counts[status.value] = count
+
+        # 実行中タスクは表示に必要な列だけを取得
+        processing = (await db.execute(
+            select(
+                Task.task_id, Task.task_type, Task.progress,
+                Task.current_step, Task.started_at, Task.version
+            ).where(Task.status == TaskStatus.PROCESSING)
+        )).all()
+
+        recent_completed = (await db.execute(
+            select(
+                Task.task_id, Task.task_type, Task.completed_at, Task.actual_time, Task.version
+            ).where(
+                Task.status == TaskStatus.COMPLETED
+            ).order_by(Task.completed_at.desc()).limit(RECENT_COMPLETED_LIMIT)
+        )).all()
+
+        recent_failed = (await db.execute(
+            select(
+                Task.task_id, Task.task_type, Task.error_message, Task.completed_at, Task.version
+            ).where(
+                Task.status == TaskStatus.FAILED
+            ).order_by(Task.completed_at.desc()).limit(RECENT_FAILED_LIMIT)
+        )).all()
+
+        self._counts = counts
+        self._processing = OrderedDict(
+            (row.task_id, _processing_entry(row)) for row in processing
+        )
+        self._recent_completed = deque(
+            (_completed_entry(row) for row in recent_completed),
+            maxlen=RECENT_COMPLETED_LIMIT
+        )
+        self._recent_failed = deque(
+            (_failed_entry(row) for row in recent_failed),
+            maxlen=RECENT_FAILED_LIMIT
+        )
+        # 再構築より前のイベントが後から届いても反映しない
+        self._versions = OrderedDict()
+        for row in (*processing, *recent_completed, *recent_failed):
+            self._remember(row.task_id, row.version)
+        self._built_at = time.monotonic()
+        self._synced_at = datetime.utcnow()
+        self._payload = None
+
+    def invalidate(self):
+        """次回の取得時に再構築させる"""
+        self._built_at = None
+        self._payload = None
+
+    def apply(self, task: Task, previous_status: Optional[TaskStatus] = None):
+        """
+        コミット済みのタスク作成・更新を差分反映
+
+        previous_status: 更新前のステータス（新規作成時は None）
+        """
+        if self._built_at is None:
+            return
+
+        self._remember(task.task_id, task.version)
+        status = task.status
+        if status != previous_status:
+            if previous_status is not None:
+                self._counts[previous_status.value] -= 1
+            self._counts[status.value] += 1
+            self._discard(task.task_id)
+
+            if status == TaskStatus.COMPLETED:
+                self._recent_completed.appendleft(_completed_entry(task))
+            elif status == TaskStatus.FAILED:
+                self._recent_failed.appendleft(_failed_entry(task))
+
+        # 実行中タスクは進捗の更新も反映する
+        if status == TaskStatus.PROCESSING:
+            self._processing[task.task_id] = _processing_entry(task)
+
+        self._payload = None
+
+    def remove(self, task: Task):
+        """コミット済みのタスク削除を差分反映"""
+        if self._built_at is None:
+            return
+
+        self._counts[task.status.value] -= 1
+        self._discard(task.task_id)
+        self._versions.pop(task.task_id, None)
+        self._payload = None
+
+    def apply_event(self, data: dict):
+        """
+        別のプロセスでの更新を pub/sub のイベントから差分反映
+
+        ステータスの変更は previous_status 付きのイベントで件数を移し、
+        実行中タスクの進捗は既存のエントリに反映する。
+        反映済みの version 以下のイベント（このプロセス自身の更新など）は無視する。
+        """
+        if self._built_at is None or data.get("status") is None:
+            return
+
+        task_id = data["task_id"]
+        version = data.get("version")
+        if version is not None and version <= self._versions.get(task_id, 0):
+            return
+
+        previous_status = data.get("previous_status")
+        if previous_status is not None:
+            self.apply(_event_task(data), TaskStatus(previous_status))
+            return
+
+        entry = self._processing.get(task_id)
+        if entry is not None and data["status"] == TaskStatus.PROCESSING.value:
+            self._processing[task_id] = {
+                **entry, "progress": data.get("progress"), "current_step": data.get("current_step")
+            }
+            self._payload = None
+        if version is not None:
+            self._remember(task_id, version)
+
+    def _remember(self, task_id: str, version: Optional[int]):
+        if version is None:
+            return
+        self._versions[task_id] = version
+        self._versions.move_to_end(task_id)
+        while len(self._versions) > APPLIED_VERSIONS_LIMIT:
+            self._versions.popitem(last=False)
+
+    def _discard(self, task_id: str):
+        self._processing.pop(task_id, None)
+        for recent in (self._recent_completed, self._recent_failed):
+            for entry in list(recent):
+                if entry["task_id"] == task_id:
+                    recent.remove(entry)
+
+    def _render(self) -> dict:
+        return {
+            "status_counts": dict(self._counts),
+            "total_tasks": sum(self._counts.values()),
+            "processing_tasks": list(self._processing.values()),
+            "recent_completed": list(self._recent_completed),
+            "recent_failed": list(self._recent_failed),
+            "synced_at": _isoformat(self._synced_at)
+        }
+
+
+status_snapshot = StatusSnapshot(settings.STATUS_SUMMARY_MAX_STALENESS)
@@ -0,0 +1,70 @@
+"""
+API からワーカー（celery_app / services.tasks）へのタスク投入
+
+ワーカータスクは名前で指定するので、API プロセスはタスク本体を import しない。
+キューと優先度は TaskCreate.priority から services.task_routing で決める。
+バッチ作成では全タスクを1つの group にまとめ、1回の apply_async で publish する。
+"""
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from celery import group
+from celery.canvas import Signature
+
+from celery_app import celery_app
+from services.task_routing import routing_options
+
+logger = logging.getLogger(__name__)
+
+
+def _worker_task(
+    task_id: str,
+    task_type: str,
+    input_data: Dict[str, Any],
+    priority: Optional[int]
+) -> Optional[Tuple[str, dict]]:
+    if task_type == "video_edit":
+        # ステージ（services.tasks.video_edit_workflow）も同じ priority で振り分ける
+        return "process_video_edit", {"task_id": task_id, "input_data": input_data, "priority": priority}
+    if task_type == "audio_process" and input_data.get("audio_path"):
+        return "analyze_music", {"task_id": task_id, "audio_path": input_data["audio_path"]}
+    if task_type == "analysis" and input_data.get("video_path"):
+        return "analyze_video", {"task_id": task_id, "video_path": input_data["video_path"]}
+    return None
+
+
+def worker_signature(
+    task_id: str,
+    task_type: str,
+    input_data: Optional[Dict[str, Any]],
+    priority: Optional[int] = None
+) -> Optional[Signature]:
+    """タスク種別に対応するワーカータスクの signature（対応するものがなければ None）"""
+    worker_task = _worker_task(task_id, task_type, input_data or {}, priority)
+    if worker_task is None:
+        return None
+    name, kwargs = worker_task
+    return celery_app.signature(name, kwargs=kwargs, **routing_options(name, priority))
+
+
+def dispatch_tasks(
+    tasks: Iterable[Tuple[str, str, Optional[Dict[str, Any]], Optional[int]]]
+) -> Tuple[int, List[str]]:
+    """
+    (task_id, task_type, input_data, priority) をまとめて1つの group として publish
+
+    Returns:
+        (投入したタスク数, ワーカータスクのない種別・入力が足りないため投入しなかった task_id)
+    """
+    signatures = []
+    skipped = []
+    for task in tasks:
+        signature = worker_signature(*task)
+        if signature is None:
+            skipped.append(task[0])
+        else:
+            signatures.append(signature)
+    if signatures:
+        group(signatures).apply_async()
+        logger.info(f"Dispatched {len(signatures)} tasks as one group")
+    return len(signatures), skipped
@@ -0,0 +1,154 @@
+"""
+タスクイベントのリングバッファ（再接続時のリプレイ用）
+
+タスクごとに直近 TASK_EVENT_BUFFER_SIZE 件のイベントを event_id 付きで保持する。
+再接続したクライアントは最後に受け取った event_id を since に渡し、
+取りこぼした分だけを受け取る（DB を読み直さない）。
+
+- memory: APIプロセスごとに保持する。event_id はタスクごとの連番で、
+  プロセスを再起動するとリセットされる。APIプロセスが1つの場合専用：
+  複数ワーカーでは同じ event_id がプロセスごとに別のイベントを指し、
+  別のプロセスへ再接続したクライアントに誤った範囲をリプレイするので redis を使うこと。
+- redis: ワーカーが publish 時に Redis Streams へ追記する。全APIプロセスで共有され、
+  デプロイ後の再接続でもリプレイできる。event_id はストリームのエントリID。
+"""
+import json
+from collections import OrderedDict, deque
+from typing import Deque, List, Optional, Tuple
+
+import redis
+import redis.asyncio as aioredis
+
+from config import get_settings
+
+settings = get_settings()
+
+STREAM_PREFIX = "task_events:"
+
+
+def stream_key(task_id: str) -> str:
+    return f"{STREAM_PREFIX}{task_id}"
+
+
+class MemoryEventLog:
+    """
+    APIプロセス内のタスクごとのリングバッファ（タスク数は LRU で上限を設ける）
+
+    単一プロセス専用。複数のAPIプロセスでは RedisEventLog を使う。
+    """
+
+    def __init__(self, size: int, max_tasks: int):
+        self.size = size
+        self.max_tasks = max_tasks
+        self._buffers: "OrderedDict[str, Deque[dict]]" = OrderedDict()
+
+    def publish(self, client: redis.Redis, task_id: str, data: dict) -> dict:
+        """ワーカー側では何もしない（受信した各APIプロセスで記録する）"""
+        return data
+
+    def record(self, task_id: str, data: dict) -> dict:
+        """受信したイベントに event_id を付けて記録する"""
+        buffer = self._buffers.get(task_id)
+        if buffer is None:
+            buffer = self._buffers[task_id] = deque(maxlen=self.size)
+            while len(self._buffers) > self.max_tasks:
+                self._buffers.popitem(last=False)
+        else:
+            self._buffers.move_to_end(task_id)
+
+        event_id = buffer[-1]["event_id"] + 1 if buffer else 1
+        event = {**data, "event_id": event_id}
+        buffer.append(event)
+        return event
+
+    async def read(self, task_id: str, since: str) -> Tuple[List[dict], bool]:
+        """
+        since より後のイベントを返す
+
+        2番目の値は since から途切れずに続いているか。False の場合は
+        イベントが既にバッファから消えている（またはバッファがリセットされた）。
+        """
+        events = list(self._buffers.get(task_id, ()))
+        try:
+            since_id = int(since)
+        except ValueError:
+            return events, False
+        if not events or not events[0]["event_id"] - 1 <= since_id <= events[-1]["event_id"]:
+            return events, False
+        return [event for event in events if event["event_id"] > since_id], True
+
+
+def _parse_stream_id(event_id: str) -> Optional[Tuple[int, int]]:
+    try:
+        milliseconds, _, sequence = event_id.partition("-")
+        return int(milliseconds), int(sequence or 0)
+    except ValueError:
+        return None
+
+
+class RedisEventLog:
+    """Redis Streams に保持するリングバッファ（全APIプロセスで共有）"""
+
+    def __init__(self, size: int, ttl: int, url: str = None, client: aioredis.Redis = None):
+        self.size = size
+        self.ttl = ttl
+        self.url = url or settings.REDIS_URL
+        self.client = client
+
+    def publish(self, client: redis.Redis, task_id: str, data: dict) -> dict:
+        """ストリームに追記し、エントリIDを event_id として付ける"""
+        key = stream_key(task_id)
+        pipe = client.pipeline(transaction=False)
+        pipe.xadd(key, {"data": json.dumps(data)}, maxlen=self.size, approximate=True)
+        pipe.expire(key, self.ttl)
+        event_id, _ = pipe.execute()
+        if isinstance(event_id, bytes):
+            event_id = event_id.decode()
+        return {**data, "event_id": event_id}
+
+    def record(self, task_id: str, data: dict) -> dict:
+        """publish 時に記録済み"""
+        return data
+
+    def _get_client(self) -> aioredis.Redis:
+        if self.client is None:
+            self.client = aioredis.Redis.from_url(self.url)
+        return self.client
+
+    async def read(self, task_id: str, since: str) -> Tuple[List[dict], bool]:
+        """
+        since より後のイベントを返す（2番目の値は MemoryEventLog.read と同じ）
+
+        since より後のエントリだけを XRANGE の排他的な下限で読み、
+        ストリームの先頭のIDと比べて since が既に消えていないかを判定する。
+        """
+        key = stream_key(task_id)
+        since_id = _parse_stream_id(since)
+        if since_id is None:
+            return self._events(await self._get_client().xrange(key)), False
+
+        pipe = self._get_client().pipeline(transaction=False)
+        pipe.xrange(key, min="-", max="+", count=1)
+        pipe.xrange(key, min=f"({since_id[0]}-{since_id[1]}")
+        first, entries = await pipe.execute()
+        if not first or since_id < _parse_stream_id(self._events(first)[0]["event_id"]):
+            # since がバッファから消えている：残っている分をすべて返す
+            return self._events(await self._get_client().xrange(key)), False
+        return self._events(entries), True
+
+    def _events(self, entries) -> List[dict]:
+        events = []
+        for entry_id, fields in entries:
+            if isinstance(entry_id, bytes):
+                entry_id = entry_id.decode()
+            events.append({**json.loads(fields[b"data"]), "event_id": entry_id})
+        return events
+
+
+def create_event_log():
+    if settings.TASK_EVENT_BUFFER == "redis":
+        return RedisEventLog(settings.TASK_EVENT_BUFFER_SIZE, settings.TASK_EVENT_STREAM_TTL)
+    return MemoryEventLog(settings.TASK_EVENT_BUFFER_SIZE, settings.TASK_EVENT_BUFFER_MAX_TASKS)
+
+
+event_log = create_event_log()
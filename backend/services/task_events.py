@@ -0,0 +1,149 @@
+"""
+タスク更新イベントの Redis pub/sub 配信
+
+ワーカーは DB 更新後に変更後の状態を tasks:{task_id} チャンネルへ publish する。
+各APIプロセスは tasks:* を購読し、ローカルの WebSocket クライアントへ転送する。
+HTTP での通知や、通知を受けた側での DB の再読み込みは行わない。
+リプレイ用のイベント記録は services.task_event_log を参照。
+"""
+import asyncio
+import json
+import logging
+from typing import Awaitable, Callable, Optional
+
+import redis
+import redis.asyncio as aioredis
+
+from config import get_settings
+from services.task_event_log import event_log
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+CHANNEL_PREFIX = "tasks:"
+
+_client: Optional[redis.Redis] = None
+
+
+def channel_for(task_id: str) -> str:
+    return f"{CHANNEL_PREFIX}{task_id}"
+
+def task_event(task, previous_status=None) -> dict:
+    """
+    Task（または同じ列を持つ行）から配信用の状態を作る
+
+    previous_status（変更前のステータス）を渡し、ステータスが変わっていれば、
+    変更前のステータスと、各APIプロセスのステータスサマリーへの差分反映に使う列を加える
+    """
+    # 作成後に一度も更新されていないタスクは updated_at がないので作成時刻を使う
+    # （プロジェクトの SSE のイベントID。再接続時の取得条件と同じ）
+    changed_at = task.updated_at or getattr(task, "created_at", None)
+    event = {
+        "task_id": task.task_id,
+        "project_id": task.project_id,
+        "status": task.status.value if task.status else None,
+        "progress": task.progress,
+        "current_step": task.current_step,
+        "total_steps": task.total_steps,
+        "completed_steps": task.completed_steps,
+        "version": task.version,
+        "updated_at": task.updated_at.isoformat() if task.updated_at else None,
+        "changed_at": changed_at.isoformat() if changed_at else None
+    }
+    if previous_status is not None and previous_status != task.status:
+        event.update({
+            "previous_status": previous_status.value,
+            "task_type": task.task_type,
+            "started_at": task.started_at.isoformat() if task.started_at else None,
+            "completed_at": task.completed_at.isoformat() if task.completed_at else None,
+            "actual_time": task.actual_time,
+            "error_message": task.error_message
+        })
+    return event
+
+def _get_client() -> redis.Redis:
+    # prefork ワーカーでは最初の publish 時（フォーク後）に接続する
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(settings.REDIS_URL)
+    return _client
+
+def publish_task_update(task_id: str, data: dict):
+    """タスクの更新を publish（失敗してもタスク処理は止めない）"""
+    try:
+        client = _get_client()
+        data = event_log.publish(client, task_id, data)
+        client.publish(channel_for(task_id), json.dumps(data))
+    except Exception as e:
+        logger.warning(f"Failed to publish task update: {e}")
+
+
+class TaskEventSubscriber:
+    """tasks:* を購読し、受信したイベントを handler(task_id, data) に渡す"""
+
+    RECONNECT_DELAY_MAX = 30.0
+
+    def __init__(
+        self,
+        handler: Callable[[str, dict], Awaitable[None]],
+        url: str = None,
+        client: aioredis.Redis = None
+    ):
+        self.handler = handler
+        self.url = url or settings.REDIS_URL
+        self.client = client
+        self.ready = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if self._task is None or self._task.done():
+            self.ready = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        delay = 1.0
+        while True:
+            try:
+                await self._listen()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Task event subscription lost, retrying in {delay:.0f}s: {e}")
+                self.ready.clear()
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.RECONNECT_DELAY_MAX)
+            else:
+                delay = 1.0
+
+    async def _listen(self):
+        client = self.client or aioredis.Redis.from_url(self.url)
+        pubsub = client.pubsub()
+        try:
+            await pubsub.psubscribe(f"{CHANNEL_PREFIX}*")
+            self.ready.set()
+            async for message in pubsub.listen():
+                if message["type"] == "pmessage":
+                    await self._dispatch(message)
+        finally:
+            await pubsub.aclose()
+            if self.client is None:
+                await client.aclose()
+
+    async def _dispatch(self, message: dict):
+        channel = message["channel"]
+        if isinstance(channel, bytes):
+            channel = channel.decode()
+        task_id = channel[len(CHANNEL_PREFIX):]
+        try:
+            await self.handler(task_id, json.loads(message["data"]))
+        except Exception as e:
+            logger.error(f"Error forwarding update for task {task_id}: {e}")
@@ -0,0 +1,321 @@
+"""
+タスクログの一括書き込み
+
+ワーカーからのログはキューに積み、TASK_LOG_FLUSH_INTERVAL_MS ごと、または
+TASK_LOG_BATCH_SIZE 件たまった時点でまとめて INSERT する。
+PostgreSQL（psycopg2）で TASK_LOG_COPY_THRESHOLD 件以上のときは COPY を使う。
+task_id（文字列）から主キーへの対応はプロセス内にキャッシュする。
+"""
+import io
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, TypeVar
+
+from sqlalchemy import select, insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from config import get_settings
+from models import SessionLocal, Task, TaskLog
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+LOG_COLUMNS = ["task_id", "timestamp", "level", "message", "step_name", "step_progress", "metadata"]
+
+
+class TaskPkCache:
+    """task_id（文字列）→ tasks.id の LRU キャッシュ"""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+
+    def get_many(self, task_ids: Iterable[str]) -> Dict[str, int]:
+        found = {}
+        with self._lock:
+            for task_id in task_ids:
+                if task_id in self._entries:
+                    self._entries.move_to_end(task_id)
+                    found[task_id] = self._entries[task_id]
+        return found
+
+    def put_many(self, pks: Dict[str, int]):
+        with self._lock:
+            for task_id, pk in pks.items():
+                self._entries[task_id] = pk
+                self._entries.move_to_end(task_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def discard(self, task_id: str):
+        with self._lock:
+            self._entries.pop(task_id, None)
+
+
+task_pk_cache = TaskPkCache(settings.TASK_PK_CACHE_SIZE)
+
+
+def _pk_query(task_ids: List[str]):
+    return select(Task.task_id, Task.id).where(Task.task_id.in_(task_ids))
+
+def resolve_task_pks(db: Session, task_ids: Iterable[str]) -> Dict[str, int]:
+    """task_id → 主キー（キャッシュにないものだけを1クエリで取得）"""
+    task_ids = set(task_ids)
+    pks = task_pk_cache.get_many(task_ids)
+    missing = list(task_ids - pks.keys())
+    if missing:
+        resolved = dict(db.execute(_pk_query(missing)).all())
+        task_pk_cache.put_many(resolved)
+        pks.update(resolved)
+    return pks
+
+async def resolve_task_pks_async(db: AsyncSession, task_ids: Iterable[str]) -> Dict[str, int]:
+    """resolve_task_pks の非同期版（APIルーター用）"""
+    task_ids = set(task_ids)
+    pks = task_pk_cache.get_many(task_ids)
+    missing = list(task_ids - pks.keys())
+    if missing:
+        resolved = dict((await db.execute(_pk_query(missing))).all())
+        task_pk_cache.put_many(resolved)
+        pks.update(resolved)
+    return pks
+
+async def write_with_task_pk_async(
+    db: AsyncSession,
+    task_id: str,
+    write: Callable[[int], Awaitable[T]]
+) -> Optional[T]:
+    """
+    task_id の主キーを解決して write(主キー) を実行する（タスクがなければ None）
+
+    キャッシュ後に別のプロセスでタスクが削除されていると外部キー違反になるので、
+    TaskLogWriter と同じく対応を取り直して1回だけ再試行する。
+    """
+    for retry in (True, False):
+        task_pk = (await resolve_task_pks_async(db, [task_id])).get(task_id)
+        if task_pk is None:
+            return None
+        try:
+            return await write(task_pk)
+        except IntegrityError:
+            await db.rollback()
+            task_pk_cache.discard(task_id)
+            if not retry:
+                raise
+
+
+def log_row(
+    task_pk: int,
+    message: str,
+    level: str = "INFO",
+    step_name: str = None,
+    step_progress: float = None,
+    metadata=None,
+    timestamp: datetime = None
+) -> dict:
+    """task_logs テーブルへの INSERT 用の行を作る（metadata は dict なら JSON 化）"""
+    if metadata is not None and not isinstance(metadata, str):
+        metadata = json.dumps(metadata)
+    return {
+        "task_id": task_pk,
+        "timestamp": timestamp or datetime.now(timezone.utc),
+        "level": level,
+        "message": message,
+        "step_name": step_name,
+        "step_progress": step_progress,
+        "metadata": metadata
+    }
+
+def _csv_field(value) -> str:
+    """COPY の CSV 形式では引用符なしの空欄が NULL、引用符付きの "" が空文字列になる"""
+    if value is None:
+        return ""
+    if isinstance(value, (int, float)):
+        return repr(value)
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    return '"' + str(value).replace('"', '""') + '"'
+
+def _copy_task_logs(db: Session, rows: List[dict]):
+    """COPY FROM STDIN（CSV）で書き込む"""
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write(",".join(_csv_field(row[column]) for column in LOG_COLUMNS))
+        buffer.write("\n")
+    buffer.seek(0)
+
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY task_logs ({', '.join(LOG_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+            buffer
+        )
+    finally:
+        cursor.close()
+
+def insert_task_logs(db: Session, rows: List[dict]):
+    """複数行を1回で書き込む（コミットは呼び出し側で行う）"""
+    if not rows:
+        return
+    if (
+        db.get_bind().dialect.driver == "psycopg2"
+        and settings.TASK_LOG_COPY_THRESHOLD
+        and len(rows) >= settings.TASK_LOG_COPY_THRESHOLD
+    ):
+        _copy_task_logs(db, rows)
+    else:
+        # SQLAlchemy 2.0 は executemany を複数行の INSERT ... VALUES にまとめる
+        db.execute(insert(TaskLog.__table__), rows)
+
+
+async def insert_task_logs_async(db: AsyncSession, rows: List[dict]):
+    """insert_task_logs の非同期版（asyncpg では COPY を使う）"""
+    if not rows:
+        return
+    if (
+        db.get_bind().dialect.driver == "asyncpg"
+        and settings.TASK_LOG_COPY_THRESHOLD
+        and len(rows) >= settings.TASK_LOG_COPY_THRESHOLD
+    ):
+        connection = await db.connection()
+        raw = await connection.get_raw_connection()
+        await raw.driver_connection.copy_records_to_table(
+            "task_logs",
+            records=[tuple(row[column] for column in LOG_COLUMNS) for row in rows],
+            columns=LOG_COLUMNS
+        )
+    else:
+        await db.execute(insert(TaskLog.__table__), rows)
+
+
+class TaskLogWriter:
+    """ワーカー内でログをキューに積み、まとめて書き込む"""
+
+    def __init__(self, flush_interval: float, batch_size: int):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._queue: List[dict] = []
+        self._oldest: Optional[float] = None
+        self._stop = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+        self._flusher_pid: Optional[int] = None
+
+    def add(
+        self,
+        task_id: str,
+        message: str,
+        level: str = "INFO",
+        step_name: str = None,
+        step_progress: float = None,
+        metadata=None
+    ):
+        """ログを1件キューに積む（時刻は積んだ時点のもの）"""
+        if not task_id:
+            return
+
+        entry = {
+            "task_id": task_id,
+            "message": message,
+            "level": level,
+            "step_name": step_name,
+            "step_progress": step_progress,
+            "metadata": metadata,
+            "timestamp": datetime.now(timezone.utc)
+        }
+        with self._lock:
+            self._queue.append(entry)
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            full = len(self._queue) >= self.batch_size
+            if not full:
+                self._ensure_flusher()
+
+        if full:
+            self.flush()
+
+    def flush(self) -> int:
+        """キューの内容を書き込み、書き込んだ件数を返す"""
+        with self._write_lock:
+            with self._lock:
+                entries, self._queue = self._queue, []
+                self._oldest = None
+            if not entries:
+                return 0
+
+            db = SessionLocal()
+            try:
+                return self._write(db, entries)
+            except Exception as e:
+                logger.error(f"Failed to write {len(entries)} task logs: {e}")
+                db.rollback()
+                return 0
+            finally:
+                db.close()
+
+    def close(self):
+        """バックグラウンドスレッドを止め、残りを書き込む"""
+        self._stop.set()
+        self.flush()
+
+    def _write(self, db: Session, entries: List[dict], retry: bool = True) -> int:
+        pks = resolve_task_pks(db, (entry["task_id"] for entry in entries))
+        rows = []
+        for entry in entries:
+            pk = pks.get(entry["task_id"])
+            if pk is None:
+                logger.error(f"Task {entry['task_id']} not found")
+                continue
+            rows.append(log_row(pk, **{k: v for k, v in entry.items() if k != "task_id"}))
+
+        try:
+            insert_task_logs(db, rows)
+            db.commit()
+        except IntegrityError:
+            # キャッシュ後に削除されたタスクがある。対応を取り直して1回だけ再試行する
+            db.rollback()
+            if not retry:
+                raise
+            for entry in entries:
+                task_pk_cache.discard(entry["task_id"])
+            return self._write(db, entries, retry=False)
+
+        return len(rows)
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            with self._lock:
+                due = (
+                    self._oldest is not None
+                    and time.monotonic() - self._oldest >= self.flush_interval
+                )
+            if due:
+                self.flush()
+
+    def _ensure_flusher(self):
+        # prefork ワーカーではフォーク後の子プロセスごとにスレッドを起動する
+        if self._flusher_pid == os.getpid() and self._flusher.is_alive():
+            return
+        self._stop.clear()
+        self._flusher = threading.Thread(
+            target=self._run, name="task-log-writer", daemon=True
+        )
+        self._flusher.start()
+        self._flusher_pid = os.getpid()
+
+
+task_log_writer = TaskLogWriter(
+    settings.TASK_LOG_FLUSH_INTERVAL_MS / 1000,
+    settings.TASK_LOG_BATCH_SIZE
+)
@@ -1,18 +1,27 @@
+from sqlalchemy import select, update, case, func, extract, literal, DateTime
 from sqlalchemy.orm import Session
-from models import SessionLocal, Task, TaskStatus, TaskLog
+from models import SessionLocal, Task, TaskStatus
+from services.task_logs import task_log_writer
+from services.task_events import task_event, publish_task_update
+from services.entity_cache import invalidate_task_sync
 from datetime import datetime
-import requests
-import json
 import logging
 
 logger = logging.getLogger(__name__)
 
+TERMINAL_STATUSES = {TaskStatus.COMPLETED, TaskStatus.FAILED, TaskStatus.CANCELLED}
+
+def _elapsed_seconds(started_at, now: datetime, dialect: str):
+    """now - started_at の秒数を表す SQL 式"""
+    now = literal(now, DateTime)
+    if dialect == "postgresql":
+        return extract("epoch", now - started_at)
+    # SQLite には interval がないのでユリウス日の差から求める
+    return (func.julianday(now) - func.julianday(started_at)) * 86400.0
+
 class TaskManager:
     """タスク管理のヘルパークラス"""
     
-    def __init__(self):
-        self.api_base_url = "http://localhost:8000/api"
-    
     def get_db(self):
         """データベースセッションを取得"""
         return SessionLocal()
@@ -38,6 +47,8 @@ class TaskManager:
                 logger.error(f"Task {task_id} not found")
                 return False
             
+            previous_status = task.status
+            
             # ステータスの更新
             if status:
                 try:
@@ -75,11 +86,19 @@ class TaskManager:
                 task.output_data = output_data
             
             task.updated_at = datetime.utcnow()
+            task.version = Task.version + 1
+            db.flush()
+            
+            # コミット後は属性が期限切れになるため、配信内容は先に作る
+            # （version は flush 後に読み直される）
+            event = task_event(task, previous_status)
             
             db.commit()
             
-            # WebSocket通知を送信
-            self._notify_update(task_id)
+            # キャッシュの無効化は配信より先に行う（通知を受けた側が古い値を読まないように）
+            invalidate_task_sync(task_id, event["project_id"])
+            # 各APIプロセスへ更新を配信
+            publish_task_update(task_id, event)
             
             return True
             
@@ -91,53 +110,151 @@ class TaskManager:
         finally:
             db.close()
     
-    def add_task_log(
+    def write_progress(
         self,
         task_id: str,
-        message: str,
-        level: str = "INFO",
-        step_name: str = None,
-        step_progress: float = None,
-        metadata: dict = None
+        progress: float = None,
+        current_step: str = None,
+        completed_steps: int = None,
+        total_steps: int = None,
+        error_message: str = None,
+        output_data: str = None,
+        status: str = None
     ):
-        """タスクログを追加"""
+        """
+        フィールド（とステータス）を更新
+        
+        事前にSELECTせず、UPDATE ... WHERE task_id = ? の1文だけで書き込む。
+        ステータス遷移では開始・完了時刻と実行時間も同じ UPDATE で設定し、
+        変更前のステータス（ステータスサマリーの差分反映用）は PostgreSQL では
+        ロックした行を FROM に結合して RETURNING で受け取る。
+        """
+        values = {}
+        now = datetime.utcnow()
         db = self.get_db()
+        dialect = db.get_bind().dialect.name
+        
+        if status:
+            try:
+                status = TaskStatus(status)
+            except ValueError:
+                logger.error(f"Invalid status: {status}")
+                status = None
+        
+        if status:
+            values["status"] = status
+            if status == TaskStatus.PROCESSING:
+                values["started_at"] = func.coalesce(Task.started_at, now)
+            if status in TERMINAL_STATUSES:
+                values["completed_at"] = now
+                values["actual_time"] = case(
+                    (Task.started_at.isnot(None), _elapsed_seconds(Task.started_at, now, dialect)),
+                    else_=Task.actual_time
+                )
+        
+        if progress is not None:
+            values["progress"] = min(100.0, max(0.0, progress))
+        
+        if current_step is not None:
+            values["current_step"] = current_step
+        
+        if total_steps is not None:
+            values["total_steps"] = total_steps
+        
+        if completed_steps is not None:
+            values["completed_steps"] = completed_steps
+            # 進捗率の自動計算（total_steps が未指定なら既存の値を使う）
+            if total_steps is not None:
+                if total_steps > 0:
+                    values["progress"] = (completed_steps / total_steps) * 100
+            else:
+                values["progress"] = case(
+                    (Task.total_steps > 0, completed_steps * 100.0 / Task.total_steps),
+                    else_=values.get("progress", Task.progress)
+                )
+        
+        if error_message is not None:
+            values["error_message"] = error_message
+        
+        if output_data is not None:
+            values["output_data"] = output_data
+        
+        values["updated_at"] = now
+        values["version"] = Task.version + 1
         
         try:
-            task = db.query(Task).filter(Task.task_id == task_id).first()
+            # 配信用の状態は RETURNING で受け取り、読み直さない
+            returning = [
+                Task.task_id, Task.project_id, Task.status, Task.progress,
+                Task.current_step, Task.total_steps, Task.completed_steps,
+                Task.version, Task.updated_at
+            ]
+            previous_status = None
+            if status is None:
+                statement = update(Task).where(Task.task_id == task_id)
+            else:
+                returning += [
+                    Task.task_type, Task.started_at, Task.completed_at,
+                    Task.actual_time, Task.error_message
+                ]
+                if dialect == "postgresql":
+                    previous = select(
+                        Task.id, Task.status.label("previous_status")
+                    ).where(Task.task_id == task_id).with_for_update().subquery()
+                    statement = update(Task).where(Task.id == previous.c.id)
+                    returning.append(previous.c.previous_status)
+                else:
+                    # RETURNING で結合先の列を返せない DB（開発用の SQLite）では同じトランザクションで読む
+                    previous_status = db.scalar(select(Task.status).where(Task.task_id == task_id))
+                    statement = update(Task).where(Task.task_id == task_id)
             
-            if not task:
+            row = db.execute(statement.values(**values).returning(*returning)).first()
+            db.commit()
+            
+            if row is None:
                 logger.error(f"Task {task_id} not found")
                 return False
             
-            log = TaskLog(
-                task_id=task.id,
-                level=level,
-                message=message,
-                step_name=step_name,
-                step_progress=step_progress,
-                metadata=json.dumps(metadata) if metadata else None
-            )
-            
-            db.add(log)
-            db.commit()
+            if status is None:
+                # ステータスは変わらないので、プロジェクトのキャッシュはそのまま
+                invalidate_task_sync(task_id)
+            else:
+                previous_status = getattr(row, "previous_status", previous_status)
+                invalidate_task_sync(task_id, row.project_id)
+            # 各APIプロセスへ更新を配信
+            publish_task_update(task_id, task_event(row, previous_status))
             
             return True
             
         except Exception as e:
-            logger.error(f"Error adding log for task {task_id}: {e}")
+            logger.error(f"Error writing progress for task {task_id}: {e}")
             db.rollback()
             return False
         
         finally:
             db.close()
     
-    def _notify_update(self, task_id: str):
-        """WebSocket経由で更新を通知"""
-        try:
-            requests.post(
-                f"{self.api_base_url}/status/notify/{task_id}",
-                timeout=1
-            )
-        except Exception as e:
-            logger.warning(f"Failed to send WebSocket notification: {e}")
\ No newline at end of file
+    def add_task_log(
+        self,
+        task_id: str,
+        message: str,
+        level: str = "INFO",
+        step_name: str = None,
+        step_progress: float = None,
+        metadata: dict = None
+    ):
+        """
+        タスクログを追加
+        
+        ログはキューに積まれ、task_log_writer がまとめて書き込む。
+        """
+        task_log_writer.add(
+            task_id,
+            message,
+            level=level,
+            step_name=step_name,
+            step_progress=step_progress,
+            metadata=metadata
+        )
+        
+        return True
@@ -0,0 +1,144 @@
+"""
+タスク投入のトランザクショナル・アウトボックス
+
+API はタスクの作成と同じトランザクションで task_outbox に投入待ちの行を書き込む
+（コミットされたタスクは必ず投入され、ロールバックされたタスクは投入されない）。
+リレー（celery beat の relay_task_outbox）が古い順に TASK_OUTBOX_BATCH_SIZE 件ずつ読み、
+1つの group として publish してから削除する。
+バッチ作成ではコミット直後に API がそのバッチの行だけを relay_tasks で publish するので、
+1回の API 呼び出しが1回の group publish になる（失敗した場合はリレーが後で送る）。
+publish 後・削除のコミット前に失敗すると次回もう一度 publish される（at-least-once）。
+ワーカータスクのない種別・入力が足りない行は投入できないので、そのタスクを failed にする
+（PENDING のまま残さない）。
+PostgreSQL では FOR UPDATE SKIP LOCKED で複数のリレーが同じ行を取らないようにする。
+"""
+import json
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select, insert, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from config import get_settings
+from models import TaskOutbox
+from services.task_dispatch import dispatch_tasks
+from services.task_manager import TaskManager
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# (task_id, task_type, input_data, priority) — dispatch_tasks と同じ形
+OutboxEntry = Tuple[str, str, Optional[Dict[str, Any]], Optional[int]]
+
+
+async def add_to_outbox(db: AsyncSession, entries: Iterable[OutboxEntry]):
+    """投入待ちのタスクを書き込む（コミットは呼び出し側のトランザクションで行う）"""
+    rows = [
+        {
+            "task_id": task_id,
+            "task_type": task_type,
+            "payload": json.dumps(input_data) if input_data is not None else None,
+            "priority": priority
+        }
+        for task_id, task_type, input_data, priority in entries
+    ]
+    if rows:
+        await db.execute(insert(TaskOutbox), rows)
+
+
+def _entries(messages: List[TaskOutbox]) -> List[OutboxEntry]:
+    return [
+        (
+            message.task_id,
+            message.task_type,
+            json.loads(message.payload) if message.payload else None,
+            message.priority
+        )
+        for message in messages
+    ]
+
+
+def relay_outbox(db: Session, batch_size: int = None) -> int:
+    """
+    outbox を空になるまで batch_size 件ずつ publish する
+
+    Returns:
+        publish した件数
+    """
+    batch_size = batch_size or settings.TASK_OUTBOX_BATCH_SIZE
+    relayed = 0
+    while True:
+        messages = db.execute(
+            select(TaskOutbox)
+            .order_by(TaskOutbox.id)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        ).scalars().all()
+        if not messages:
+            break
+
+        try:
+            published, skipped = dispatch_tasks(_entries(messages))
+        except Exception:
+            # 行は残るので次回の実行で再送される
+            db.rollback()
+            raise
+
+        db.execute(delete(TaskOutbox).where(TaskOutbox.id.in_([message.id for message in messages])))
+        db.commit()
+        relayed += published
+        if skipped:
+            _fail_undispatchable(skipped)
+
+        if len(messages) < batch_size:
+            break
+
+    if relayed:
+        logger.info(f"Relayed {relayed} outbox messages")
+    return relayed
+
+
+async def relay_tasks(db: AsyncSession, task_ids: List[str]) -> int:
+    """
+    コミット済みの task_ids の行だけをすぐに1つの group として publish する
+
+    publish に失敗しても行は残り、relay_task_outbox が後で送る（例外は送出しない）。
+
+    Returns:
+        publish した件数
+    """
+    messages = (await db.execute(
+        select(TaskOutbox)
+        .where(TaskOutbox.task_id.in_(task_ids))
+        .order_by(TaskOutbox.id)
+        .with_for_update(skip_locked=True)
+    )).scalars().all()
+    if not messages:
+        return 0
+
+    try:
+        published, skipped = await run_in_threadpool(dispatch_tasks, _entries(messages))
+    except Exception as e:
+        logger.warning(f"Deferring {len(messages)} outbox messages to the relay: {e}")
+        await db.rollback()
+        return 0
+
+    await db.execute(delete(TaskOutbox).where(TaskOutbox.id.in_([message.id for message in messages])))
+    await db.commit()
+    if skipped:
+        await run_in_threadpool(_fail_undispatchable, skipped)
+    return published
+
+
+def _fail_undispatchable(task_ids: List[str]):
+    """投入先のないタスクを failed にする（イベントも配信される）"""
+    logger.warning(f"No worker task for {len(task_ids)} outbox messages: {', '.join(task_ids)}")
+    task_manager = TaskManager()
+    for task_id in task_ids:
+        task_manager.update_task_status(
+            task_id,
+            status="failed",
+            error_message="No worker task for this task type or the required input is missing"
+        )
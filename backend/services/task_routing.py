@@ -0,0 +1,149 @@
+"""
+Celery のキュー振り分けと優先度
+
+タスク種別（クラス）と TaskCreate.priority（1〜10）からキューとブローカー優先度を決める。
+- クラス: video（長時間のレンダリング）/ analysis（短い解析）/ それ以外は default
+- 段: priority が TASK_PRIORITY_HIGH_THRESHOLD 以上なら high、それ以外は bulk
+  キュー名は "<クラス>.<段>"（例: video.high, analysis.bulk）
+ワーカーはクラスごとに別プールで起動する（README 参照）ので、短い解析が
+長時間のレンダリングの後ろで待たされない。
+
+Redis ブローカーの優先度は kombu がキューを優先度ごとのリストに分けて実現する
+（0 が最優先）。下位のリストが詰まり続けないよう、TASK_PRIORITY_AGING_SECONDS
+以上待っているメッセージを age_queued_tasks（celery beat）が1段ずつ上位へ移す。
+"""
+import json
+import logging
+import time
+from typing import Any, Dict, Iterable, Optional
+
+from celery.signals import before_task_publish
+
+from config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUEUE = "default"
+TIERS = ("high", "bulk")
+
+# ワーカータスク名 → クラス（celery_app / celery_tasks の両方）
+TASK_CLASSES = {
+    "process_video_edit": "video",
+    "video_edit_generate_pattern": "video",
+    "video_edit_finalize": "video",
+    "process_video": "video",
+    "video_edit_analyze_music": "analysis",
+    "video_edit_analyze_video": "analysis",
+    "analyze_music": "analysis",
+    "analyze_video": "analysis",
+    "analyze_audio": "analysis",
+}
+
+# kombu の Redis トランスポート: 優先度 0〜9 をそれぞれ別のリストにする
+PRIORITY_STEPS = list(range(10))
+PRIORITY_SEP = "\x06\x16"  # kombu の既定の区切り（"<queue><sep><priority>"）
+DEFAULT_PRIORITY = 5  # TaskCreate.priority の既定値
+
+ENQUEUED_AT_HEADER = "enqueued_at"
+
+
+def queue_name(task_class: str, tier: str) -> str:
+    return f"{task_class}.{tier}"
+
+QUEUE_NAMES = [
+    queue_name(task_class, tier)
+    for task_class in dict.fromkeys(TASK_CLASSES.values())
+    for tier in TIERS
+] + [DEFAULT_QUEUE]
+
+
+def broker_priority(priority: Optional[int]) -> int:
+    """TaskCreate.priority（10 が最優先）をブローカー優先度（0 が最優先）に変換"""
+    priority = DEFAULT_PRIORITY if priority is None else min(10, max(1, priority))
+    return min(PRIORITY_STEPS[-1], 10 - priority)
+
+
+def routing_options(task_name: str, priority: Optional[int] = None) -> Dict[str, Any]:
+    """apply_async / signature.set に渡すキューと優先度"""
+    task_class = TASK_CLASSES.get(task_name)
+    if task_class is None:
+        return {"queue": DEFAULT_QUEUE, "priority": broker_priority(priority)}
+    tier = "high" if (priority or DEFAULT_PRIORITY) >= settings.TASK_PRIORITY_HIGH_THRESHOLD else "bulk"
+    return {"queue": queue_name(task_class, tier), "priority": broker_priority(priority)}
+
+
+def route_task(name, args, kwargs, options, task=None, **kw):
+    """task_routes 用（キューを指定せずに publish されたタスクを既定の優先度で振り分ける）"""
+    return routing_options(name)
+
+
+# 両方の Celery アプリに適用する設定
+CELERY_ROUTING_CONFIG = {
+    "task_routes": (route_task,),
+    "task_default_queue": DEFAULT_QUEUE,
+    "task_default_priority": broker_priority(DEFAULT_PRIORITY),
+    "broker_transport_options": {
+        "priority_steps": PRIORITY_STEPS,
+        "sep": PRIORITY_SEP,
+        "queue_order_strategy": "priority",
+    },
+}
+
+
+@before_task_publish.connect
+def stamp_enqueued_at(headers=None, **kwargs):
+    """エージング用に publish 時刻をメッセージヘッダーに入れる"""
+    if headers is not None:
+        headers.setdefault(ENQUEUED_AT_HEADER, time.time())
+
+
+def _priority_key(queue: str, step: int) -> str:
+    return f"{queue}{PRIORITY_SEP}{step}" if step else queue
+
+
+def _enqueued_at(raw: bytes) -> Optional[float]:
+    try:
+        return float(json.loads(raw)["headers"][ENQUEUED_AT_HEADER])
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+def promote_aged_messages(
+    client,
+    queues: Iterable[str] = QUEUE_NAMES,
+    max_age: float = None,
+    limit: int = 1000,
+    now: float = None
+) -> int:
+    """
+    max_age 秒以上待っているメッセージを1段上の優先度のリストへ移す
+
+    kombu は各リストの右端から取り出すので、右端（最も古いもの）から調べ、
+    移したメッセージは移動先の左端（その段の列の最後尾）に古い順で並べる。
+    1回の実行で1段だけ上げるよう、上位の段から順に処理する。
+
+    Returns:
+        移したメッセージ数
+    """
+    max_age = settings.TASK_PRIORITY_AGING_SECONDS if max_age is None else max_age
+    now = time.time() if now is None else now
+    promoted = 0
+    for queue in queues:
+        for step in PRIORITY_STEPS[1:]:
+            source, target = _priority_key(queue, step), _priority_key(queue, step - 1)
+            while promoted < limit:
+                raw = client.lindex(source, -1)
+                if raw is None:
+                    break
+                # 時刻のないメッセージ（ヘッダーを付けずに publish されたもの）は古いものとして扱う
+                enqueued_at = _enqueued_at(raw)
+                if enqueued_at is not None and now - enqueued_at < max_age:
+                    break
+                # 取り出しと競合した場合は次のメッセージを移すことになるが、早めに上がるだけで失われない
+                if client.lmove(source, target, "RIGHT", "LEFT") is None:
+                    break
+                promoted += 1
+    if promoted:
+        logger.info(f"Promoted {promoted} aged messages")
+    return promoted
@@ -0,0 +1,40 @@
+"""
+タスクの変更待ち（ロングポーリング用）
+
+GET /api/tasks/{task_id}?wait_for_version=N の待機中のリクエストを、
+Redis pub/sub 経由で届いたタスクイベントで起こす。
+起こされた側は DB から最新の状態を読み直すので、ここでは通知だけを行う。
+"""
+import asyncio
+from typing import Dict, Set
+
+
+class TaskWaiters:
+    """task_id ごとの待機中の Future"""
+
+    def __init__(self):
+        self._waiters: Dict[str, Set[asyncio.Future]] = {}
+
+    def watch(self, task_id: str) -> asyncio.Future:
+        """次の変更で完了する Future を登録する（状態を読む前に登録すること）"""
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(task_id, set()).add(future)
+        return future
+
+    def unwatch(self, task_id: str, future: asyncio.Future):
+        waiters = self._waiters.get(task_id)
+        if waiters is not None:
+            waiters.discard(future)
+            if not waiters:
+                del self._waiters[task_id]
+
+    def notify(self, task_id: str):
+        for future in self._waiters.pop(task_id, ()):
+            if not future.done():
+                future.set_result(None)
+
+    def waiting(self, task_id: str) -> int:
+        return len(self._waiters.get(task_id, ()))
+
+
+task_waiters = TaskWaiters()
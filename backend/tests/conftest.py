@@ -0,0 +1,16 @@
+"""Shared pytest configuration"""
+import os
+
+# Module-level TestClient instances run every request on a fresh event loop,
+# and pooled asyncpg connections are bound to the loop that opened them.
+os.environ.setdefault("DATABASE_POOL_DISABLED", "true")
+
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def reset_status_snapshot():
+    """Tests recreate the tables, so never serve a snapshot from a previous test"""
+    from services.status_snapshot import status_snapshot
+    status_snapshot.invalidate()
+    yield
@@ -0,0 +1,152 @@
+"""Content-addressed analysis result cache tests"""
+import json
+import os
+
+import fakeredis
+
+from monitoring.metrics import registry
+from services import tasks
+from services.analysis_cache import AnalysisCache
+from services.progress_sink import progress_sink
+from services.tasks import CallbackTask, analyze_music, analyze_video, video_edit_analyze_music, video_edit_analyze_video
+
+def _write(path, content: bytes) -> str:
+    path.write_bytes(content)
+    return str(path)
+
+def _hits(name: str) -> float:
+    return registry.get_sample_value("cache_hits_total", {"cache_name": name}) or 0.0
+
+def test_keyed_by_content_params_and_version(tmp_path):
+    """パスが違っても内容が同じなら同じ結果を使い、パラメータ・バージョンが違えば使わないこと"""
+    cache = AnalysisCache(str(tmp_path / "cache"), max_bytes=1024 * 1024)
+    first = _write(tmp_path / "a.wav", b"stem")
+    copy = _write(tmp_path / "b.wav", b"stem")
+    other = _write(tmp_path / "c.wav", b"other stem")
+
+    assert cache.get("music", first) is None
+    cache.put("music", first, {"beats": [0.5, 1.0]})
+
+    assert cache.get("music", copy) == {"beats": [0.5, 1.0]}
+    assert cache.get("music", other) is None
+    assert cache.get("video", copy) is None
+    assert cache.get("music", copy, params={"hop": 256}) is None
+    assert cache.get("music", copy, version=2) is None
+
+def test_missing_file_is_not_cached(tmp_path):
+    """読めないファイルはキャッシュしないこと"""
+    cache = AnalysisCache(str(tmp_path / "cache"), max_bytes=1024 * 1024)
+    cache.put("music", str(tmp_path / "missing.wav"), {"beats": []})
+    assert cache.get("music", str(tmp_path / "missing.wav")) is None
+    assert not os.path.exists(tmp_path / "cache")
+
+def test_lru_eviction_by_size(tmp_path):
+    """上限を超えたら最後に使われたのが古いものから消すこと"""
+    result = {"shots": list(range(20))}
+    # 2件までしか入らない上限
+    cache = AnalysisCache(str(tmp_path / "cache"), max_bytes=len(json.dumps(result)) * 5 // 2)
+    files = [_write(tmp_path / f"{i}.wav", bytes([i])) for i in range(3)]
+
+    cache.put("video", files[0], result)
+    cache.put("video", files[1], result)
+    # 0 を使ったので、2 を入れたときに消えるのは 1
+    for i, path in enumerate(files[:2]):
+        entry = cache._path(cache.key("video", path))
+        os.utime(entry, ns=(i * 10**9, i * 10**9))
+    assert cache.get("video", files[0]) == result
+    cache.put("video", files[2], result)
+
+    assert cache.get("video", files[1]) is None
+    assert cache.get("video", files[0]) == result
+    assert cache.get("video", files[2]) == result
+
+def test_corrupt_entry_is_discarded(tmp_path):
+    """壊れたエントリはミスとして扱い、消すこと"""
+    cache = AnalysisCache(str(tmp_path / "cache"), max_bytes=1024 * 1024)
+    path = _write(tmp_path / "a.wav", b"stem")
+    cache.put("music", path, {"beats": []})
+    entry = cache._path(cache.key("music", path))
+    with open(entry, "w") as f:
+        f.write("{not json")
+
+    assert cache.get("music", path) is None
+    assert not os.path.exists(entry)
+
+def test_cache_hit_completes_analysis_immediately(tmp_path, monkeypatch):
+    """2回目の同じ内容の分析は待たずにキャッシュの結果で完了し、ヒットが記録されること"""
+    updates, sleeps = [], []
+    monkeypatch.setattr(tasks, "analysis_cache", AnalysisCache(str(tmp_path / "cache"), max_bytes=1024 * 1024))
+    monkeypatch.setattr(progress_sink, "update", lambda task_id, **fields: updates.append((task_id, fields)))
+    monkeypatch.setattr(CallbackTask, "log_message", lambda self, task_id, message, level="INFO": None)
+    monkeypatch.setattr(tasks.time, "sleep", sleeps.append)
+
+    first = analyze_music.run("t1", _write(tmp_path / "a.wav", b"stem"))
+    assert sleeps
+
+    sleeps.clear()
+    hits = _hits("analysis_music")
+    second = analyze_music.run("t2", _write(tmp_path / "b.wav", b"stem"))
+
+    assert second == first
+    assert sleeps == []
+    assert _hits("analysis_music") == hits + 1
+    assert [fields.get("progress") for task_id, fields in updates if task_id == "t2"] == [100]
+
+def test_video_edit_stages_share_the_cache(tmp_path, monkeypatch):
+    """ビデオ編集の分析ステージも単体の分析タスクと同じキャッシュを使うこと"""
+    sleeps = []
+    monkeypatch.setattr(tasks, "analysis_cache", AnalysisCache(str(tmp_path / "cache"), max_bytes=1024 * 1024))
+    monkeypatch.setattr(tasks.video_edit_stages, "client", fakeredis.FakeRedis())
+    monkeypatch.setattr(progress_sink, "update", lambda task_id, **fields: None)
+    monkeypatch.setattr(CallbackTask, "log_message", lambda self, task_id, message, level="INFO": None)
+    monkeypatch.setattr(tasks.time, "sleep", sleeps.append)
+
+    music = analyze_music.run("t1", _write(tmp_path / "a.wav", b"stem"))
+    video = video_edit_analyze_video.run("t2", _write(tmp_path / "v.mp4", b"footage"))
+    assert sleeps
+
+    sleeps.clear()
+    assert video_edit_analyze_music.run("t3", _write(tmp_path / "b.wav", b"stem")) == music
+    assert analyze_video.run("t4", _write(tmp_path / "w.mp4", b"footage")) == video
+    assert sleeps == []
+
+def test_put_scans_only_when_total_exceeds_limit(tmp_path, monkeypatch):
+    """書き込みのたびには走査せず、合計が上限を超えたときだけ走査すること"""
+    result = {"shots": list(range(20))}
+    cache = AnalysisCache(str(tmp_path / "cache"), max_bytes=len(json.dumps(result)) * 5 // 2)
+    files = [_write(tmp_path / f"{i}.wav", bytes([i])) for i in range(3)]
+    scans = []
+    evict = cache.evict
+    monkeypatch.setattr(cache, "evict", lambda: scans.append(1) or evict())
+
+    # 最初の書き込みで合計を取り、次は合計に足すだけで足りる
+    cache.put("video", files[0], result)
+    cache.put("video", files[1], result)
+    assert len(scans) == 1
+    for i, path in enumerate(files[:2]):
+        entry = cache._path(cache.key("video", path))
+        os.utime(entry, ns=(i * 10**9, i * 10**9))
+    # 上限を超えたら走査して古いものを消す
+    cache.put("video", files[2], result)
+    assert len(scans) == 2
+    assert cache.get("video", files[0]) is None
+    assert cache.get("video", files[2]) == result
+
+def test_processes_sharing_a_directory_stay_under_limit(tmp_path):
+    """同じディレクトリを使う複数のキャッシュ（プロセス）の合計が上限を超えないこと"""
+    result = {"shots": list(range(20))}
+    max_bytes = len(json.dumps(result)) * 5 // 2
+    directory = str(tmp_path / "cache")
+    workers = [AnalysisCache(directory, max_bytes=max_bytes) for _ in range(2)]
+    files = [_write(tmp_path / f"{i}.wav", bytes([i])) for i in range(6)]
+
+    def cache_size() -> int:
+        return sum(
+            os.path.getsize(os.path.join(root, name))
+            for root, _, names in os.walk(directory) for name in names if name.endswith(".json")
+        )
+
+    for i, path in enumerate(files):
+        workers[i % 2].put("video", path, result)
+        assert cache_size() <= max_bytes
+    assert workers[0].get("video", files[-1]) == result
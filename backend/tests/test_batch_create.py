@@ -0,0 +1,95 @@
+"""Batch task creation tests"""
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+from main import app
+from models import Base, engine, SessionLocal, TaskOutbox
+from services import task_outbox
+from config import get_settings
+
+client = TestClient(app)
+
+@pytest.fixture(autouse=True)
+def setup_database():
+    """テスト用データベースのセットアップ"""
+    Base.metadata.create_all(bind=engine)
+    yield
+    Base.metadata.drop_all(bind=engine)
+
+@pytest.fixture
+def published(monkeypatch):
+    batches = []
+    def dispatch(entries):
+        batches.append(list(entries))
+        return len(batches[-1]), []
+    monkeypatch.setattr(task_outbox, "dispatch_tasks", dispatch)
+    return batches
+
+def _outbox_count() -> int:
+    db = SessionLocal()
+    try:
+        return len(db.scalars(select(TaskOutbox.id)).all())
+    finally:
+        db.close()
+
+def test_batch_create(published):
+    """作成したタスクが要求の順に返り、コミット直後に1つの group として投入されること"""
+    response = client.post("/api/tasks/batch", json=[
+        {"task_type": "video_edit", "input_data": json.dumps({"xml_path": "a.xml"})},
+        {"task_type": "audio_process", "estimated_time": 60, "priority": 9},
+        {"task_type": "analysis"},
+    ])
+    assert response.status_code == 200
+
+    tasks = response.json()
+    assert [task["task_type"] for task in tasks] == ["video_edit", "audio_process", "analysis"]
+    assert all(task["status"] == "pending" and task["version"] == 1 for task in tasks)
+    assert tasks[1]["estimated_time"] == 60
+    assert [task["priority"] for task in tasks] == [5, 9, 5]
+
+    assert client.get(f"/api/tasks/{tasks[0]['task_id']}").json()["task_type"] == "video_edit"
+    assert published == [[
+        (tasks[0]["task_id"], "video_edit", {"xml_path": "a.xml"}, None),
+        (tasks[1]["task_id"], "audio_process", None, 9),
+        (tasks[2]["task_id"], "analysis", None, None),
+    ]]
+    assert _outbox_count() == 0
+
+def test_batch_create_leaves_outbox_on_publish_failure(monkeypatch):
+    """publish に失敗しても作成は成功し、outbox の行はリレーのために残ること"""
+    def fail(entries):
+        raise ConnectionError("broker down")
+    monkeypatch.setattr(task_outbox, "dispatch_tasks", fail)
+    response = client.post("/api/tasks/batch", json=[{"task_type": "video_edit"}, {"task_type": "video_edit"}])
+    assert response.status_code == 200
+    assert len(response.json()) == 2
+    assert _outbox_count() == 2
+
+def test_batch_create_empty():
+    """空の配列では何も作成しないこと"""
+    response = client.post("/api/tasks/batch", json=[])
+    assert response.status_code == 200
+    assert response.json() == []
+
+def test_batch_create_limit(monkeypatch):
+    """TASK_BATCH_MAX_SIZE を超えると何も作成せずに 400 になること"""
+    monkeypatch.setattr(get_settings(), "TASK_BATCH_MAX_SIZE", 2)
+    response = client.post("/api/tasks/batch", json=[{"task_type": "video_edit"} for _ in range(3)])
+    assert response.status_code == 400
+    assert "Maximum 2 tasks" in response.json()["detail"]
+    assert client.get("/api/tasks/").json()["total"] == 0
+
+def test_batch_create_validation():
+    """不正な要素はその位置（body の添字）付きの 422 になること"""
+    response = client.post("/api/tasks/batch", json=[{"task_type": "video_edit"}, {"project_id": 1}])
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["loc"][:2] == ["body", 1]
+    assert client.get("/api/tasks/").json()["total"] == 0
+
+def test_batch_create_invalid_json():
+    """配列でないボディ・壊れた JSON は 400"""
+    assert client.post("/api/tasks/batch", json={"task_type": "video_edit"}).status_code == 400
+    response = client.post("/api/tasks/batch", content=b'[{"task_type": "video_edit"}', headers={"Content-Type": "application/json"})
+    assert response.status_code == 400
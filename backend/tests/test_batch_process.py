@@ -0,0 +1,136 @@
+"""batch_process chord fan-out tests"""
+import json
+import time
+
+import fakeredis
+import pytest
+from celery.signals import before_task_publish
+from sqlalchemy import event
+
+import celery_tasks
+from celery_tasks import app, batch_process_task, batch_process_complete, batch_process_failed
+from models import Base, engine, SessionLocal, Task, TaskStatus
+from monitoring.metrics import registry
+
+@pytest.fixture(autouse=True)
+def setup_database():
+    """テスト用データベースのセットアップ"""
+    Base.metadata.create_all(bind=engine)
+    yield
+    Base.metadata.drop_all(bind=engine)
+
+@pytest.fixture
+def published(monkeypatch):
+    """ブローカーをメモリに、結果バックエンドを fakeredis にして publish を記録する"""
+    messages = []
+    def record(sender=None, routing_key=None, headers=None, body=None, **kwargs):
+        messages.append((sender, routing_key, {**headers, "embed": body[2]}))
+    monkeypatch.setattr(app.conf, "broker_url", "memory://")
+    monkeypatch.setattr(app.backend, "client", fakeredis.FakeRedis())
+    before_task_publish.connect(record, weak=False)
+    yield messages
+    before_task_publish.disconnect(record)
+
+@pytest.fixture
+def events(monkeypatch):
+    sent = []
+    monkeypatch.setattr(celery_tasks, "publish_task_update", lambda task_id, data: sent.append((task_id, data)))
+    monkeypatch.setattr(celery_tasks, "invalidate_task_sync", lambda task_id, project_id=None: None)
+    return sent
+
+def test_batch_is_published_as_one_chord(published):
+    """全タスクが1つの chord のヘッダーとして publish され、コールバックはまだ送られないこと"""
+    result = batch_process_task.run(["t1", "t2", "t3"], "video")
+
+    assert [sender for sender, routing_key, headers in published] == ["process_video"] * 3
+    assert {routing_key for sender, routing_key, headers in published} == {"video.bulk"}
+    assert result["processed"] == 3
+    assert "failed" not in result
+    assert list(result["results"]) == ["t1", "t2", "t3"]
+    assert all(entry["status"] == "queued" for entry in result["results"].values())
+
+    # エラー時のコールバックは publish されたタスクの結果を参照する
+    task_result_ids = [headers["id"] for sender, routing_key, headers in published]
+    assert [entry["task_id"] for entry in result["results"].values()] == task_result_ids
+    errback = published[0][2]["embed"]["chord"]["options"]["link_error"][0]
+    assert errback["task"] == "batch_process_failed"
+    assert list(errback["args"][:2]) == [["t1", "t2", "t3"], task_result_ids]
+
+def test_unknown_operation_publishes_nothing(published):
+    """未知の operation ではどのタスクも publish しないこと"""
+    with pytest.raises(ValueError):
+        batch_process_task.run(["t1", "t2"], "image")
+    assert published == []
+
+def test_complete_updates_all_rows_in_one_statement(events):
+    """コールバックが全タスクの結果を1文で書き込み、スループットを記録すること"""
+    db = SessionLocal()
+    db.add_all(Task(task_id=task_id, task_type="video_edit", status=TaskStatus.COMPLETED) for task_id in ["t1", "t2", "t3"])
+    db.commit()
+    db.close()
+
+    statements = []
+    def count(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("UPDATE"):
+            statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        results = [{"status": "success", "output_path": f"/outputs/{task_id}.mp4"} for task_id in ["t1", "t2", "t3"]]
+        summary = batch_process_complete.run(results, ["t1", "t2", "t3"], "video", time.time() - 2)
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+
+    assert len(statements) == 1
+    assert summary["processed"] == 3
+    assert summary["updated"] == 3
+
+    db = SessionLocal()
+    tasks = {task.task_id: task for task in db.query(Task).all()}
+    db.close()
+    assert json.loads(tasks["t2"].output_data) == {"status": "success", "output_path": "/outputs/t2.mp4"}
+    assert all(task.version == 2 for task in tasks.values())
+    assert sorted(task_id for task_id, data in events) == ["t1", "t2", "t3"]
+
+    throughput = registry.get_sample_value("batch_throughput_tasks_per_second", {"operation": "video"})
+    assert 0 < throughput <= 1.5
+    assert registry.get_sample_value(
+        "batch_tasks_processed_total", {"operation": "video", "status": "completed"}
+    ) >= 3
+
+def test_failed_batch_stores_successful_outputs(published, events):
+    """一部のタスクが失敗しても、成功したタスクの結果は1文で書き込まれること"""
+    db = SessionLocal()
+    db.add_all(Task(task_id=task_id, task_type="video_edit", status=TaskStatus.COMPLETED) for task_id in ["t1", "t3"])
+    db.add(Task(task_id="t2", task_type="video_edit", status=TaskStatus.FAILED, error_message="boom"))
+    db.commit()
+    db.close()
+
+    error = RuntimeError("boom")
+    app.backend.store_result("r1", {"status": "success", "output_path": "/outputs/t1.mp4"}, "SUCCESS")
+    app.backend.mark_as_failure("r2", error)
+    app.backend.store_result("r3", {"status": "success", "output_path": "/outputs/t3.mp4"}, "SUCCESS")
+
+    statements = []
+    def count(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("UPDATE"):
+            statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        summary = batch_process_failed.run(
+            None, error, None, ["t1", "t2", "t3"], ["r1", "r2", "r3"], "video", time.time() - 1
+        )
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+
+    assert len(statements) == 1
+    assert (summary["processed"], summary["failed"], summary["updated"]) == (2, 1, 2)
+
+    db = SessionLocal()
+    tasks = {task.task_id: task for task in db.query(Task).all()}
+    db.close()
+    assert json.loads(tasks["t3"].output_data) == {"status": "success", "output_path": "/outputs/t3.mp4"}
+    assert tasks["t2"].output_data is None
+    assert tasks["t2"].version == 1
+    assert sorted(task_id for task_id, data in events) == ["t1", "t3"]
@@ -0,0 +1,110 @@
+"""Bulk task fetch / update tests"""
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from main import app
+from models import Base, engine, async_engine
+from api import tasks as tasks_module
+
+client = TestClient(app)
+
+@pytest.fixture(autouse=True)
+def setup_database(monkeypatch):
+    """テスト用データベースのセットアップ（publish された更新を記録する）"""
+    published = []
+    monkeypatch.setattr(tasks_module, "publish_task_update", lambda task_id, data: published.append(data))
+    Base.metadata.create_all(bind=engine)
+    yield published
+    Base.metadata.drop_all(bind=engine)
+
+def _create(count: int) -> list:
+    return [client.post("/api/tasks/", json={"task_type": "video_edit"}).json()["task_id"] for _ in range(count)]
+
+def _statements(sql_filter: str, send):
+    statements = []
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(sql_filter):
+            statements.append((statement, executemany))
+    event.listen(async_engine.sync_engine, "before_cursor_execute", record)
+    try:
+        response = send()
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", record)
+    return response, statements
+
+def test_bulk_get():
+    """指定順で返し、見つからない task_id を missing に入れること（1回の SELECT）"""
+    task_ids = _create(3)
+    requested = [task_ids[2], "unknown", task_ids[0]]
+    response, selects = _statements(
+        "SELECT", lambda: client.post("/api/tasks/bulk-get?fields=task_id,status", json={"task_ids": requested})
+    )
+    assert response.status_code == 200
+    body = response.json()
+    assert body["tasks"] == [
+        {"task_id": task_ids[2], "status": "pending"},
+        {"task_id": task_ids[0], "status": "pending"}
+    ]
+    assert body["missing"] == ["unknown"]
+    assert len(selects) == 1
+
+def test_bulk_get_limit(monkeypatch):
+    """上限を超える件数は 400 になること"""
+    monkeypatch.setattr(tasks_module.settings, "TASK_BULK_MAX_SIZE", 2)
+    assert client.post("/api/tasks/bulk-get", json={"task_ids": ["a", "b", "c"]}).status_code == 400
+
+def test_bulk_update_matches_single_update(setup_database):
+    """単体更新と同じ started_at / completed_at / actual_time の記録と進捗計算を行うこと"""
+    task_ids = _create(3)
+    response, updates = _statements("UPDATE", lambda: client.patch("/api/tasks/bulk", json=[
+        {"task_id": task_ids[0], "status": "processing", "progress": 20},
+        {"task_id": task_ids[1], "status": "processing", "progress": 40},
+        {"task_id": task_ids[2], "total_steps": 4, "completed_steps": 1},
+    ]))
+    assert response.status_code == 200
+    assert response.json()["updated"] == 3
+    # 書き換える列が同じ更新は1回の executemany にまとまる
+    assert [executemany for _, executemany in updates] == [True, False]
+
+    third = client.get(f"/api/tasks/{task_ids[2]}").json()
+    assert third["progress"] == 25
+    assert third["started_at"] is None
+
+    # 同じ task_id の更新は指定順に適用する
+    client.patch("/api/tasks/bulk", json=[
+        {"task_id": task_ids[2], "status": "processing"},
+        {"task_id": task_ids[2], "completed_steps": 4},
+        {"task_id": task_ids[2], "status": "completed"},
+        {"task_id": task_ids[0], "progress": 90},
+    ])
+    third = client.get(f"/api/tasks/{task_ids[2]}").json()
+    assert third["status"] == "completed"
+    assert third["progress"] == 100
+    assert third["started_at"] and third["completed_at"]
+    assert third["actual_time"] is not None
+    assert third["version"] == 3
+    first = client.get(f"/api/tasks/{task_ids[0]}").json()
+    assert (first["status"], first["progress"], first["version"]) == ("processing", 90, 3)
+
+    published = setup_database
+    assert [event["task_id"] for event in published[:3]] == task_ids
+    assert [(event["task_id"], event["status"]) for event in published[3:]] == [
+        (task_ids[2], "completed"), (task_ids[0], "processing")
+    ]
+
+def test_bulk_update_is_all_or_nothing():
+    """存在しない task_id・不正なステータスがあれば何も更新しないこと"""
+    task_id = _create(1)[0]
+    response = client.patch("/api/tasks/bulk", json=[
+        {"task_id": task_id, "progress": 50},
+        {"task_id": "unknown", "progress": 50}
+    ])
+    assert response.status_code == 404
+    response = client.patch("/api/tasks/bulk", json=[
+        {"task_id": task_id, "progress": 50},
+        {"task_id": task_id, "status": "bogus"}
+    ])
+    assert response.status_code == 400
+    task = client.get(f"/api/tasks/{task_id}").json()
+    assert task["progress"] == 0
+    assert task["version"] == 1
@@ -0,0 +1,81 @@
+"""Task / project detail cache tests"""
+import fakeredis
+import fakeredis.aioredis
+import pytest
+from fastapi.testclient import TestClient
+from main import app
+from models import Base, engine
+from api import tasks as tasks_module
+from services import entity_cache, task_manager
+from services.task_manager import TaskManager
+
+@pytest.fixture
+def accesses(monkeypatch):
+    """キャッシュをインメモリの Redis に差し替え、ヒット・ミスを記録する"""
+    server = fakeredis.FakeServer()
+    for cache in (entity_cache.task_cache, entity_cache.project_cache):
+        monkeypatch.setattr(cache, "client", fakeredis.aioredis.FakeRedis(server=server))
+        monkeypatch.setattr(cache, "sync_client", fakeredis.FakeRedis(server=server))
+        monkeypatch.setattr(cache, "_retry_at", 0.0)
+    monkeypatch.setattr(tasks_module, "publish_task_update", lambda task_id, data: None)
+    monkeypatch.setattr(task_manager, "publish_task_update", lambda task_id, data: None)
+
+    recorded = []
+    monkeypatch.setattr(entity_cache, "track_cache_access", lambda name, hit: recorded.append((name, hit)))
+
+    Base.metadata.create_all(bind=engine)
+    yield recorded
+    Base.metadata.drop_all(bind=engine)
+
+def test_task_reads_are_cached_and_invalidated(accesses):
+    """2回目以降はキャッシュから返し、API・ワーカーの更新で無効化されること"""
+    with TestClient(app) as client:
+        task_id = client.post("/api/tasks/", json={"task_type": "video_edit"}).json()["task_id"]
+
+        assert client.get(f"/api/tasks/{task_id}").json()["progress"] == 0
+        assert client.get(f"/api/tasks/{task_id}").json()["progress"] == 0
+        assert accesses == [("task", False), ("task", True)]
+
+        client.put(f"/api/tasks/{task_id}", json={"progress": 30})
+        assert client.get(f"/api/tasks/{task_id}").json()["progress"] == 30
+
+        TaskManager().write_progress(task_id, progress=60)
+        assert client.get(f"/api/tasks/{task_id}").json()["progress"] == 60
+
+        TaskManager().update_task_status(task_id, status="processing")
+        assert client.get(f"/api/tasks/{task_id}").json()["status"] == "processing"
+
+        client.delete(f"/api/tasks/{task_id}")
+        assert client.get(f"/api/tasks/{task_id}").status_code == 404
+
+    assert [hit for _, hit in accesses] == [False, True, False, False, False, False]
+
+def test_project_task_counts_are_invalidated(accesses):
+    """プロジェクト詳細のタスク数はタスクの作成で無効化されること"""
+    with TestClient(app) as client:
+        project_id = client.post("/api/projects/", json={"name": "Cached"}).json()["project_id"]
+        assert client.get(f"/api/projects/{project_id}").json()["task_count"] == 0
+        assert client.get(f"/api/projects/{project_id}").json()["task_count"] == 0
+
+        client.post("/api/tasks/", json={"task_type": "video_edit", "project_id": project_id})
+        assert client.get(f"/api/projects/{project_id}").json()["task_count"] == 1
+
+        client.put(f"/api/projects/{project_id}", json={"name": "Renamed"})
+        assert client.get(f"/api/projects/{project_id}").json()["name"] == "Renamed"
+
+    assert accesses == [("project", hit) for hit in (False, True, False, False)]
+
+def test_redis_outage_falls_back_to_database(accesses, monkeypatch):
+    """Redis に接続できなくても DB から返し、しばらくキャッシュを使わないこと"""
+    class Unreachable:
+        async def get(self, key):
+            raise ConnectionError("redis is down")
+
+    monkeypatch.setattr(entity_cache.task_cache, "client", Unreachable())
+    with TestClient(app) as client:
+        task_id = client.post("/api/tasks/", json={"task_type": "video_edit"}).json()["task_id"]
+        assert client.get(f"/api/tasks/{task_id}").status_code == 200
+        assert client.get(f"/api/tasks/{task_id}").status_code == 200
+
+    assert accesses == []
+    assert entity_cache.task_cache._retry_at > 0
@@ -0,0 +1,116 @@
+"""ETag / conditional GET tests"""
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event, update
+from main import app
+from models import Base, engine, async_engine, SessionLocal, Task, TaskStatus
+from api import tasks as tasks_module
+
+client = TestClient(app)
+
+@pytest.fixture(autouse=True)
+def setup_database(monkeypatch):
+    """テスト用データベースのセットアップ（Redis への publish は行わない）"""
+    monkeypatch.setattr(tasks_module, "publish_task_update", lambda task_id, data: None)
+    Base.metadata.create_all(bind=engine)
+    yield
+    Base.metadata.drop_all(bind=engine)
+
+class StatementRecorder:
+    def __enter__(self):
+        self.statements = []
+        event.listen(async_engine.sync_engine, "before_cursor_execute", self._record)
+        return self.statements
+
+    def __exit__(self, *exc):
+        event.remove(async_engine.sync_engine, "before_cursor_execute", self._record)
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+def _revalidate(url: str):
+    """ETag を取得し、同じ ETag で再リクエストした結果を返す"""
+    first = client.get(url)
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+    assert etag.startswith('W/"')
+    return etag, client.get(url, headers={"If-None-Match": etag})
+
+def test_task_etag_follows_version():
+    """タスクの ETag は変更されるまで同じで、変更後は 200 が返ること"""
+    task_id = client.post("/api/tasks/", json={"task_type": "video_edit"}).json()["task_id"]
+    etag, response = _revalidate(f"/api/tasks/{task_id}")
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    assert response.content == b""
+
+    client.put(f"/api/tasks/{task_id}", json={"progress": 10})
+    response = client.get(f"/api/tasks/{task_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+def test_project_and_logs_etags():
+    """プロジェクト・ログも ETag で再検証でき、追記で変わること"""
+    project_id = client.post("/api/projects/", json={"name": "ETag"}).json()["project_id"]
+    etag, response = _revalidate(f"/api/projects/{project_id}")
+    assert response.status_code == 304
+
+    client.post("/api/tasks/", json={"task_type": "video_edit", "project_id": project_id})
+    assert client.get(f"/api/projects/{project_id}", headers={"If-None-Match": etag}).status_code == 200
+
+    task_id = client.post("/api/tasks/", json={"task_type": "video_edit"}).json()["task_id"]
+    client.post(f"/api/tasks/{task_id}/logs", json={"message": "first"})
+    etag, response = _revalidate(f"/api/tasks/{task_id}/logs")
+    assert response.status_code == 304
+
+    client.post(f"/api/tasks/{task_id}/logs", json={"message": "second"})
+    assert client.get(f"/api/tasks/{task_id}/logs", headers={"If-None-Match": etag}).status_code == 200
+
+def test_summary_304_skips_database():
+    """サマリーはスナップショットが新しければ DB を読まずに 304 を返すこと"""
+    client.post("/api/tasks/", json={"task_type": "video_edit"})
+    etag, _ = _revalidate("/api/status/summary")
+
+    with StatementRecorder() as statements:
+        response = client.get("/api/status/summary", headers={"If-None-Match": f'"other", {etag}'})
+    assert response.status_code == 304
+    assert statements == []
+
+    client.post("/api/tasks/", json={"task_type": "video_edit"})
+    assert client.get("/api/status/summary", headers={"If-None-Match": etag}).status_code == 200
+
+def test_active_304_skips_row_load():
+    """アクティブタスクは (id, version) の取得1回だけで 304 を返し、進捗の更新で ETag が変わること"""
+    task_id = client.post("/api/tasks/", json={"task_type": "video_edit"}).json()["task_id"]
+    etag, _ = _revalidate("/api/status/active")
+
+    with StatementRecorder() as statements:
+        response = client.get("/api/status/active", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert len(statements) == 1
+
+    client.put(f"/api/tasks/{task_id}", json={"progress": 50})
+    response = client.get("/api/status/active", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["active_tasks"][0]["progress"] == 50
+
+def _set_status(ids: list, status: TaskStatus):
+    db = SessionLocal()
+    try:
+        db.execute(update(Task).where(Task.id.in_(ids)).values(status=status))
+        db.commit()
+    finally:
+        db.close()
+
+def test_active_etag_changes_when_active_set_changes():
+    """件数・id の合計・version の合計が同じでも、アクティブなタスクが入れ替われば ETag が変わること"""
+    for _ in range(4):
+        client.post("/api/tasks/", json={"task_type": "video_edit"})
+    _set_status([2, 3], TaskStatus.COMPLETED)
+    etag, _ = _revalidate("/api/status/active")
+
+    _set_status([1, 4], TaskStatus.COMPLETED)
+    _set_status([2, 3], TaskStatus.PROCESSING)
+    response = client.get("/api/status/active", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["total"] == 2
@@ -0,0 +1,90 @@
+"""Task version and long-poll tests"""
+import asyncio
+import time
+import pytest
+from fastapi import Request, Response
+from fastapi.testclient import TestClient
+from main import app
+from models import Base, engine, AsyncSessionLocal
+from api import tasks as tasks_module
+from api.tasks import get_task
+from api.websocket import deliver_task_event
+from services import task_manager
+from services.task_manager import TaskManager
+from services.task_waiters import task_waiters
+
+client = TestClient(app)
+
+@pytest.fixture(autouse=True)
+def setup_database(monkeypatch):
+    """テスト用データベースのセットアップ（Redis への publish は行わない）"""
+    monkeypatch.setattr(tasks_module, "publish_task_update", lambda task_id, data: None)
+    monkeypatch.setattr(task_manager, "publish_task_update", lambda task_id, data: None)
+    Base.metadata.create_all(bind=engine)
+    yield
+    Base.metadata.drop_all(bind=engine)
+
+def _create_task() -> str:
+    return client.post("/api/tasks/", json={"task_type": "video_edit"}).json()["task_id"]
+
+def test_version_is_bumped_on_every_update():
+    """API・ワーカーどちらの更新でも version が増えること"""
+    task_id = _create_task()
+    assert client.get(f"/api/tasks/{task_id}").json()["version"] == 1
+
+    client.put(f"/api/tasks/{task_id}", json={"progress": 10})
+    assert client.get(f"/api/tasks/{task_id}").json()["version"] == 2
+
+    manager = TaskManager()
+    assert manager.update_task_status(task_id, status="processing")
+    assert manager.write_progress(task_id, progress=50)
+    assert client.get(f"/api/tasks/{task_id}").json()["version"] == 4
+
+def test_wait_returns_immediately_when_already_changed():
+    """既に version > wait_for_version なら待たないこと"""
+    task_id = _create_task()
+    client.put(f"/api/tasks/{task_id}", json={"progress": 10})
+
+    started = time.monotonic()
+    response = client.get(f"/api/tasks/{task_id}?wait_for_version=1&timeout=5")
+    assert time.monotonic() - started < 1
+    assert response.json()["version"] == 2
+
+def test_wait_times_out_with_current_state():
+    """変更がなければ timeout 後に現在の状態を返すこと"""
+    task_id = _create_task()
+
+    started = time.monotonic()
+    response = client.get(f"/api/tasks/{task_id}?wait_for_version=1&timeout=0.3")
+    assert time.monotonic() - started >= 0.3
+    assert response.status_code == 200
+    assert response.json()["version"] == 1
+
+    assert client.get("/api/tasks/non-existent-id?wait_for_version=1&timeout=0.1").status_code == 404
+    assert client.get(f"/api/tasks/{task_id}?wait_for_version=1&timeout=3600").status_code == 422
+
+def test_wait_wakes_on_task_event(monkeypatch):
+    """タスクイベントが届いたら再確認を待たずに応答すること"""
+    monkeypatch.setattr(tasks_module.settings, "LONG_POLL_RECHECK_INTERVAL", 30)
+    task_id = _create_task()
+
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            request = Request({"type": "http", "headers": []})
+            waiter = asyncio.create_task(get_task(
+                task_id, request, Response(), wait_for_version=1, timeout=10, db=db
+            ))
+            await asyncio.sleep(0.1)
+            assert task_waiters.waiting(task_id) == 1
+
+            # ワーカーの更新が Redis 経由で届いたときと同じ経路で通知する
+            TaskManager().write_progress(task_id, progress=42)
+            started = time.monotonic()
+            await deliver_task_event(task_id, {"task_id": task_id, "progress": 42})
+            result = await asyncio.wait_for(waiter, 5)
+            return result, time.monotonic() - started
+
+    result, elapsed = asyncio.run(scenario())
+    assert (result["version"], result["progress"]) == (2, 42)
+    assert elapsed < 1
+    assert task_waiters.waiting(task_id) == 0
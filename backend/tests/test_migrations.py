@@ -0,0 +1,34 @@
+"""Alembic migration tests"""
+from pathlib import Path
+
+from alembic import command
+from alembic.autogenerate import compare_metadata
+from alembic.config import Config
+from alembic.migration import MigrationContext
+from sqlalchemy import create_engine
+
+from models import Base
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+def _config(url: str) -> Config:
+    config = Config(str(BACKEND_DIR / "alembic.ini"))
+    config.set_main_option("script_location", str(BACKEND_DIR / "alembic"))
+    config.set_main_option("sqlalchemy.url", url)
+    return config
+
+def test_upgrade_head_on_empty_database(tmp_path):
+    """空のデータベースに upgrade head でモデルと同じスキーマができ、downgrade で戻せること"""
+    url = f"sqlite:///{tmp_path / 'migrations.db'}"
+    config = _config(url)
+    command.upgrade(config, "head")
+
+    engine = create_engine(url)
+    try:
+        with engine.connect() as connection:
+            assert compare_metadata(MigrationContext.configure(connection), Base.metadata) == []
+
+        command.downgrade(config, "base")
+        command.upgrade(config, "head")
+    finally:
+        engine.dispose()
@@ -0,0 +1,89 @@
+"""Keyset (cursor) pagination tests"""
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+from main import app
+from models import Base, engine, SessionLocal, Task
+from api.pagination import encode_cursor, decode_cursor
+
+client = TestClient(app)
+
+@pytest.fixture(autouse=True)
+def setup_database():
+    """テスト用データベースのセットアップ"""
+    Base.metadata.create_all(bind=engine)
+    yield
+    Base.metadata.drop_all(bind=engine)
+
+MAX_PAGES = 50
+
+def _walk(url: str, key: str):
+    """next_cursor を辿って全ページを取得（カーソルが進まない場合に止まらなくならないよう上限付き）"""
+    items = []
+    response = client.get(url).json()
+    items.extend(response[key])
+    for _ in range(MAX_PAGES):
+        if not response["next_cursor"]:
+            return items
+        response = client.get(f"{url}&cursor={response['next_cursor']}").json()
+        assert response["total"] is None
+        items.extend(response[key])
+    pytest.fail(f"next_cursor did not reach the last page within {MAX_PAGES} pages")
+
+def test_cursor_roundtrip():
+    """カーソルのエンコード・デコード"""
+    values = [5, datetime(2025, 8, 8, 12, 0, 0), 42]
+    assert decode_cursor(encode_cursor(values), 3) == values
+
+def test_task_cursor_matches_offset():
+    """カーソルで辿った結果がOFFSETと同じ順序・件数になること"""
+    for i in range(11):
+        client.post("/api/tasks/", json={"task_type": f"task_{i}"})
+
+    by_offset = client.get("/api/tasks/?limit=100").json()["tasks"]
+    by_cursor = _walk("/api/tasks/?limit=4", "tasks")
+
+    assert [t["task_id"] for t in by_cursor] == [t["task_id"] for t in by_offset]
+    assert len({t["task_id"] for t in by_cursor}) == 11
+
+def test_task_cursor_with_equal_created_at():
+    """created_at が同じタスクでも id でページが進み、重複・欠落しないこと"""
+    db = SessionLocal()
+    created_at = datetime(2025, 8, 8, 12, 0, 0)
+    db.add_all(Task(task_id=f"same-{i}", task_type="video_edit", created_at=created_at) for i in range(7))
+    db.commit()
+    db.close()
+
+    tasks = _walk("/api/tasks/?limit=3", "tasks")
+    assert sorted(t["task_id"] for t in tasks) == sorted(f"same-{i}" for i in range(7))
+    assert [t["id"] for t in tasks] == sorted((t["id"] for t in tasks), reverse=True)
+
+def test_task_log_cursor():
+    """ログのカーソルページング"""
+    task_id = client.post("/api/tasks/", json={"task_type": "video_edit"}).json()["task_id"]
+    for i in range(7):
+        client.post(f"/api/tasks/{task_id}/logs", json={"message": f"Log message {i}"})
+
+    logs = _walk(f"/api/tasks/{task_id}/logs?limit=3", "logs")
+    assert len({log["id"] for log in logs}) == 7
+
+def test_project_cursor():
+    """プロジェクト一覧のカーソルページング"""
+    for i in range(5):
+        client.post("/api/projects/", json={"name": f"Project {i}"})
+
+    projects = _walk("/api/projects/?limit=2", "projects")
+    assert [p["id"] for p in projects] == sorted(p["id"] for p in projects)
+    assert len(projects) == 5
+
+def test_invalid_cursor():
+    """不正なカーソルは400"""
+    response = client.get("/api/tasks/?cursor=not-a-cursor")
+    assert response.status_code == 400
+
+def test_cursor_with_offset_rejected():
+    """カーソルとOFFSETの併用は400"""
+    cursor = encode_cursor([5, "2025-08-08T12:00:00", 1])
+    response = client.get(f"/api/tasks/?cursor={cursor}&offset=10")
+    assert response.status_code == 400
@@ -0,0 +1,166 @@
+"""Progress sink (write coalescing) tests"""
+import threading
+import time
+import pytest
+from sqlalchemy import event
+from models import Base, engine, SessionLocal, Task, TaskStatus
+from services.progress_sink import ProgressSink
+from services import task_manager
+from services.task_manager import TaskManager
+
+class RecordingManager:
+    """書き込みを記録するだけの TaskManager"""
+
+    def __init__(self):
+        self.calls = []
+
+    def write_progress(self, task_id, status=None, **fields):
+        if status:
+            self.calls.append(("status", task_id, dict(fields, status=status)))
+        else:
+            self.calls.append(("progress", task_id, fields))
+        return True
+
+def test_progress_is_coalesced_per_task():
+    """間隔内の更新は最新の状態だけが1回で書き込まれること"""
+    manager = RecordingManager()
+    sink = ProgressSink(manager, flush_interval=60)
+
+    for i in range(1, 101):
+        sink.update("task-1", progress=i, current_step=f"step {i}")
+
+    # 最初の更新はすぐに書き込まれ、残りはバッファされる
+    assert manager.calls == [("progress", "task-1", {"progress": 1, "current_step": "step 1"})]
+
+    sink.flush()
+    assert len(manager.calls) == 2
+    assert manager.calls[1] == ("progress", "task-1", {"progress": 100, "current_step": "step 100"})
+    sink.close()
+
+def test_status_change_flushes_buffered_fields():
+    """ステータス変更はバッファ済みの内容と合わせて即座に書き込まれること"""
+    manager = RecordingManager()
+    sink = ProgressSink(manager, flush_interval=60)
+
+    sink.update("task-1", progress=10)
+    sink.update("task-1", progress=50, output_data="{}")
+    sink.update("task-1", status="completed", current_step="done")
+
+    assert manager.calls[-1] == ("status", "task-1", {
+        "progress": 50, "output_data": "{}", "current_step": "done", "status": "completed"
+    })
+    sink.flush()
+    assert len(manager.calls) == 2
+    sink.close()
+
+def test_background_flush():
+    """バッファされた更新はバックグラウンドで書き込まれること"""
+    manager = RecordingManager()
+    sink = ProgressSink(manager, flush_interval=0.05)
+
+    sink.update("task-1", progress=10)
+    sink.update("task-1", progress=20)
+    time.sleep(0.3)
+
+    assert manager.calls[-1] == ("progress", "task-1", {"progress": 20})
+    sink.close()
+
+def test_write_does_not_block_other_tasks():
+    """書き込み中も他のタスクの更新はバッファのロックで待たされないこと"""
+    started, release = threading.Event(), threading.Event()
+
+    class SlowManager(RecordingManager):
+        def write_progress(self, task_id, status=None, **fields):
+            if task_id == "slow":
+                started.set()
+                release.wait(1)
+            return super().write_progress(task_id, status=status, **fields)
+
+    manager = SlowManager()
+    sink = ProgressSink(manager, flush_interval=60)
+    writer = threading.Thread(target=sink.update, args=("slow",), kwargs={"status": "processing"})
+    writer.start()
+    assert started.wait(1)
+
+    sink.update("task-1", progress=10)
+    assert manager.calls == [("progress", "task-1", {"progress": 10})]
+    release.set()
+    writer.join()
+    sink.close()
+
+def test_stale_flush_times_are_evicted():
+    """間隔以上書き込みのないタスクの記録は消えること"""
+    manager = RecordingManager()
+    sink = ProgressSink(manager, flush_interval=0.01)
+
+    sink.update("task-1", progress=10)
+    assert "task-1" in sink._last_flush
+    time.sleep(0.02)
+    sink._flush_due()
+    assert sink._last_flush == {}
+    sink.close()
+
+@pytest.fixture
+def database():
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        db.add(Task(task_id="task-1", task_type="video_edit", status=TaskStatus.PROCESSING, total_steps=4))
+        db.commit()
+    finally:
+        db.close()
+    yield
+    Base.metadata.drop_all(bind=engine)
+
+def test_write_progress_is_a_single_update(database, monkeypatch):
+    """write_progress は SELECT せずに UPDATE 1文で書き込むこと"""
+    manager = TaskManager()
+    published = []
+    monkeypatch.setattr(task_manager, "publish_task_update", lambda task_id, data: published.append(data))
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        assert manager.write_progress("task-1", completed_steps=2, current_step="Analyzing")
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+    assert len(statements) == 1
+    assert statements[0].lstrip().upper().startswith("UPDATE")
+    # 配信内容は UPDATE ... RETURNING で得た変更後の状態
+    assert published[0]["progress"] == 50.0
+    assert published[0]["status"] == "processing"
+
+    db = SessionLocal()
+    try:
+        task = db.query(Task).filter(Task.task_id == "task-1").first()
+        assert task.completed_steps == 2
+        assert task.progress == 50.0
+        assert task.current_step == "Analyzing"
+    finally:
+        db.close()
+
+    assert not manager.write_progress("missing", progress=10)
+
+def test_status_change_sets_timestamps(database, monkeypatch):
+    """ステータス変更では完了時刻も同じ UPDATE で設定し、変更前のステータスを配信すること"""
+    manager = TaskManager()
+    published = []
+    monkeypatch.setattr(task_manager, "publish_task_update", lambda task_id, data: published.append(data))
+
+    assert manager.write_progress("task-1", status="completed", progress=100)
+    assert published[0]["status"] == "completed"
+    assert published[0]["previous_status"] == "processing"
+    assert published[0]["completed_at"] is not None
+
+    db = SessionLocal()
+    try:
+        task = db.query(Task).filter(Task.task_id == "task-1").first()
+        assert task.status == TaskStatus.COMPLETED
+        assert task.completed_at is not None
+        assert task.progress == 100
+    finally:
+        db.close()
@@ -0,0 +1,58 @@
+"""Project API tests"""
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from main import app
+from models import Base, engine, async_engine
+
+client = TestClient(app)
+
+@pytest.fixture(autouse=True)
+def setup_database():
+    """テスト用データベースのセットアップ"""
+    Base.metadata.create_all(bind=engine)
+    yield
+    Base.metadata.drop_all(bind=engine)
+
+def _count_queries(url: str) -> int:
+    """リクエスト中に発行されたSQL文の数を数える"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        response = client.get(url)
+        assert response.status_code == 200
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    return len(statements)
+
+def _create_projects(count: int, tasks_per_project: int):
+    for i in range(count):
+        project_id = client.post("/api/projects/", json={"name": f"Project {i}"}).json()["project_id"]
+        for j in range(tasks_per_project):
+            client.post("/api/tasks/", json={"task_type": f"task_{j}", "project_id": project_id})
+
+def test_project_task_counts():
+    """タスク数とステータス別件数"""
+    _create_projects(1, 3)
+    project = client.get("/api/projects/").json()["projects"][0]
+
+    assert project["task_count"] == 3
+    assert project["task_status_counts"]["pending"] == 3
+    assert project["task_status_counts"]["completed"] == 0
+
+    detail = client.get(f"/api/projects/{project['id']}").json()
+    assert detail["task_count"] == 3
+
+def test_list_projects_query_count_is_constant():
+    """プロジェクト数に関わらず一覧のクエリ数が一定であること（N+1 がない）"""
+    _create_projects(2, 2)
+    small = _count_queries("/api/projects/?limit=1000")
+
+    _create_projects(20, 2)
+    large = _count_queries("/api/projects/?limit=1000")
+
+    assert large == small
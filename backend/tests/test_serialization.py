@@ -0,0 +1,126 @@
+"""Fast JSON path (orjson + column tuples) tests"""
+import asyncio
+import json
+
+import orjson
+import pytest
+from fastapi.encoders import jsonable_encoder
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+from main import app
+from models import Base, engine, AsyncSessionLocal, Task
+from api.serialization import TASK_COLUMNS, select_tasks, rows_to_dicts, iter_json_array
+
+client = TestClient(app)
+
+@pytest.fixture(autouse=True)
+def setup_database():
+    """テスト用データベースのセットアップ"""
+    Base.metadata.create_all(bind=engine)
+    yield
+    Base.metadata.drop_all(bind=engine)
+
+def _load(query):
+    async def run():
+        async with AsyncSessionLocal() as db:
+            return await db.execute(query)
+    return asyncio.run(run())
+
+def test_rows_match_to_dict():
+    """列タプルを orjson で直接エンコードした結果が to_dict() と同じ JSON になること"""
+    project_id = client.post("/api/projects/", json={"name": "Fast"}).json()["project_id"]
+    for i in range(3):
+        client.post("/api/tasks/", json={"task_type": "video_edit", "project_id": project_id, "priority": i + 1})
+
+    rows = _load(select_tasks().order_by(Task.id)).all()
+    tasks = _load(select(Task).order_by(Task.id)).scalars().all()
+    fast = orjson.loads(orjson.dumps(rows_to_dicts(rows, TASK_COLUMNS)))
+    slow = json.loads(json.dumps(jsonable_encoder([task.to_dict() for task in tasks])))
+    assert len(fast) == 3
+    for fast_row, slow_row in zip(fast, slow):
+        assert list(fast_row) == [key for key in slow_row if key in fast_row]
+        for key, value in fast_row.items():
+            if key.endswith("_at") and value is not None:
+                # orjson と isoformat() ではタイムゾーン表記だけ異なりうる
+                assert value[:19] == slow_row[key][:19]
+            else:
+                assert value == slow_row[key]
+
+def test_list_endpoints_keep_shape():
+    """一覧エンドポイントが同じキーとカーソルを返すこと"""
+    project_id = client.post("/api/projects/", json={"name": "Shape"}).json()["project_id"]
+    for _ in range(3):
+        client.post("/api/tasks/", json={"task_type": "video_edit", "project_id": project_id})
+
+    page = client.get("/api/tasks/?limit=2")
+    assert page.headers["content-type"] == "application/json"
+    body = page.json()
+    assert body["total"] == 3
+    assert len(body["tasks"]) == 2
+    assert set(body["tasks"][0]) == {column.key for column in TASK_COLUMNS}
+    rest = client.get(f"/api/tasks/?limit=2&cursor={body['next_cursor']}").json()
+    assert len(rest["tasks"]) == 1
+
+    project_tasks = client.get(f"/api/projects/{project_id}/tasks").json()["tasks"]
+    assert [t["task_id"] for t in project_tasks] == [t["task_id"] for t in body["tasks"] + rest["tasks"]]
+    assert project_tasks[0]["status"] == "pending"
+
+def test_sparse_fieldsets():
+    """fields= で SELECT する列と返すキーを絞れること（カーソルはソートキーを返さなくても使える）"""
+    project_id = client.post("/api/projects/", json={"name": "Sparse"}).json()["project_id"]
+    for i in range(3):
+        client.post("/api/tasks/", json={"task_type": "video_edit", "project_id": project_id, "priority": i + 1})
+
+    page = client.get("/api/tasks/?limit=2&fields=task_id,status,progress").json()
+    assert [list(task) for task in page["tasks"]] == [["task_id", "status", "progress"]] * 2
+    rest = client.get(f"/api/tasks/?limit=2&fields=status,task_id&cursor={page['next_cursor']}").json()
+    assert list(rest["tasks"][0]) == ["status", "task_id"]
+    assert len({t["task_id"] for t in page["tasks"] + rest["tasks"]}) == 3
+
+    project_tasks = client.get(f"/api/projects/{project_id}/tasks?fields=task_id").json()["tasks"]
+    assert project_tasks == [{"task_id": t["task_id"]} for t in page["tasks"] + rest["tasks"]]
+
+    active = client.get("/api/status/active?fields=task_id,progress")
+    assert all(list(task) == ["task_id", "progress"] for task in active.json()["active_tasks"])
+    assert active.headers["ETag"] != client.get("/api/status/active").headers["ETag"]
+
+def test_invalid_fields():
+    """存在しない列・空の指定は 400 になること"""
+    assert client.get("/api/tasks/?fields=task_id,secret").status_code == 400
+    assert client.get("/api/tasks/?fields=,").status_code == 400
+    # /active で返さない列は指定できない
+    assert client.get("/api/status/active?fields=error_message").status_code == 400
+
+def _parse(chunks: list) -> list:
+    async def stream():
+        for chunk in chunks:
+            yield chunk
+    async def run():
+        return [item async for item in iter_json_array(stream())]
+    return asyncio.run(run())
+
+def test_iter_json_array_across_chunks():
+    """要素・数値・マルチバイト文字がチャンクをまたいでも同じ結果になること"""
+    body = ' [ {"task_type": "video_edit", "name": "é,]"}, 123 , [1, 2], "x" ] '.encode()
+    expected = [{"task_type": "video_edit", "name": "é,]"}, 123, [1, 2], "x"]
+    for size in (1, 2, 7, len(body)):
+        assert _parse([body[i:i + size] for i in range(0, len(body), size)]) == expected
+    assert _parse([b"[]"]) == []
+
+def test_iter_json_array_stops_early():
+    """読み出しをやめた時点で残りのチャンクを要求しないこと"""
+    requested = []
+    async def stream():
+        for chunk in (b'[{"a": 1},', b'{"a": 2},', b'{"a": 3}]'):
+            requested.append(chunk)
+            yield chunk
+    async def first():
+        async for item in iter_json_array(stream()):
+            return item
+    assert asyncio.run(first()) == {"a": 1}
+    assert len(requested) == 1
+
+@pytest.mark.parametrize("body", [b"{}", b"[1 2]", b"[1", b"[1] x", b"", b"[1,]"])
+def test_iter_json_array_rejects_malformed(body):
+    with pytest.raises(ValueError):
+        _parse([body])
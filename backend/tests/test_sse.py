@@ -0,0 +1,128 @@
+"""Server-Sent Events stream tests"""
+import asyncio
+import json
+import pytest
+from fastapi.testclient import TestClient
+from main import app
+from models import Base, engine, SessionLocal, Task, TaskStatus
+from api import sse, websocket as websocket_module
+from api.sse import format_event, open_event_stream, event_stream_response
+from api.tasks import stream_task_events
+from api.projects import stream_project_events
+from api.websocket import manager
+from services.task_event_log import MemoryEventLog
+
+client = TestClient(app)
+
+@pytest.fixture
+def setup_database():
+    Base.metadata.create_all(bind=engine)
+    yield
+    Base.metadata.drop_all(bind=engine)
+
+async def _read_events(response, count):
+    """レスポンスのチャンク（retry 行・イベント・コメント）を count 件読む"""
+    events = []
+    body = response.body_iterator
+    try:
+        while len(events) < count:
+            chunk = await asyncio.wait_for(body.__anext__(), 1)
+            events.append(chunk)
+    finally:
+        await body.aclose()
+    return events
+
+def test_format_event():
+    """id / event / data 行に変換されること"""
+    message = {"type": "task_update", "task_id": "a", "event_id": 3}
+    assert format_event(message, "event_id") == (
+        f"id: 3\nevent: task_update\ndata: {json.dumps(message)}\n\n"
+    )
+    assert format_event({"type": "pong"}, "event_id") == 'event: pong\ndata: {"type": "pong"}\n\n'
+
+def test_stream_receives_manager_updates():
+    """WebSocket と同じ ConnectionManager の更新が届き、切断時に購読が外れること"""
+    async def scenario():
+        connection = open_event_stream()
+        manager.subscribe_task(connection, "sse-1")
+        response = event_stream_response(connection, heartbeat_interval=0.05)
+        await manager.send_update("sse-1", {"progress": 40, "event_id": 7})
+
+        chunks = await _read_events(response, 3)
+        return chunks, manager.subscriber_count("sse-1")
+
+    chunks, subscribers = asyncio.run(scenario())
+    assert chunks[0] == f"retry: {sse.RETRY_MS}\n\n"
+    assert chunks[1].startswith("id: 7\nevent: task_update\n")
+    assert json.loads(chunks[1].split("data: ")[1])["progress"] == 40
+    # 更新がなければハートビートのコメントを送る
+    assert chunks[2] == ": keepalive\n\n"
+    assert subscribers == 0
+
+def _add_task(task_id: str):
+    db = SessionLocal()
+    try:
+        db.add(Task(task_id=task_id, task_type="video_edit", status=TaskStatus.PENDING))
+        db.commit()
+    finally:
+        db.close()
+
+def test_last_event_id_replays_from_buffer(monkeypatch, setup_database):
+    """Last-Event-ID 以降のイベントだけをバッファから再送すること"""
+    _add_task("sse-2")
+    log = MemoryEventLog(size=10, max_tasks=10)
+    monkeypatch.setattr(websocket_module, "event_log", log)
+    for progress in (10, 20, 30):
+        log.record("sse-2", {"task_id": "sse-2", "progress": progress})
+
+    async def scenario():
+        response = await stream_task_events("sse-2", since=None, last_event_id="1")
+        return await _read_events(response, 3)
+
+    chunks = asyncio.run(scenario())
+    assert [chunk.split("\n")[0] for chunk in chunks[1:]] == ["id: 2", "id: 3"]
+
+def test_project_events_of_new_tasks_have_ids(setup_database):
+    """一度も更新されていないタスクのイベントにも作成時刻の id: が付くこと"""
+    project_id = client.post("/api/projects/", json={"name": "sse"}).json()["project_id"]
+    client.post("/api/tasks/", json={"task_type": "video_edit", "project_id": project_id})
+
+    async def scenario():
+        response = await stream_project_events(project_id, since="2000-01-01T00:00:00", last_event_id=None)
+        return await _read_events(response, 2)
+
+    chunks = asyncio.run(scenario())
+    event_id = chunks[1].split("\n")[0]
+    assert event_id.startswith("id: ")
+    data = json.loads(chunks[1].split("data: ")[1])
+    assert data["updated_at"] is None
+    assert event_id == f"id: {data['changed_at']}"
+
+def test_missing_task_or_project(setup_database):
+    """存在しないタスク・プロジェクトは404、不正なイベントIDは400"""
+    assert client.get("/api/tasks/non-existent-id/events").status_code == 404
+    assert client.get("/api/projects/999/events").status_code == 404
+    # 再接続（Last-Event-ID あり）でも存在を確認する
+    assert client.get("/api/tasks/non-existent-id/events", headers={"Last-Event-ID": "1"}).status_code == 404
+    assert client.get("/api/projects/999/events", headers={"Last-Event-ID": "not-a-time"}).status_code == 404
+    project_id = client.post("/api/projects/", json={"name": "sse"}).json()["project_id"]
+    response = client.get(f"/api/projects/{project_id}/events", headers={"Last-Event-ID": "not-a-time"})
+    assert response.status_code == 400
+
+def test_replay_failure_detaches_connection(monkeypatch, setup_database):
+    """リプレイに失敗したら接続を ConnectionManager から外すこと"""
+    _add_task("sse-3")
+    class FailingEventLog:
+        async def read(self, task_id, since):
+            raise ConnectionError("redis down")
+    monkeypatch.setattr(websocket_module, "event_log", FailingEventLog())
+
+    async def scenario():
+        connections = len(manager.connections)
+        with pytest.raises(ConnectionError):
+            await stream_task_events("sse-3", since=None, last_event_id="1")
+        return connections, len(manager.connections), manager.subscriber_count("sse-3")
+
+    before, after, subscribers = asyncio.run(scenario())
+    assert after == before
+    assert subscribers == 0
@@ -0,0 +1,166 @@
+"""Status summary snapshot tests"""
+import pytest
+from datetime import datetime
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from main import app
+from models import Base, engine, async_engine, SessionLocal, Task, TaskStatus
+from services import task_manager as task_manager_module
+from services.status_snapshot import status_snapshot
+from services.task_events import task_event
+from services.task_logs import task_pk_cache
+from services.task_manager import TaskManager
+
+client = TestClient(app)
+
+@pytest.fixture(autouse=True)
+def setup_database():
+    """テスト用データベースのセットアップ"""
+    Base.metadata.create_all(bind=engine)
+    yield
+    Base.metadata.drop_all(bind=engine)
+
+def _summary_with_query_count():
+    """サマリーを取得し、発行されたSQL文の数も返す"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        response = client.get("/api/status/summary")
+        assert response.status_code == 200
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    return response.json(), len(statements)
+
+def test_summary_applies_api_transitions_without_queries(monkeypatch):
+    """API経由の状態遷移は再集計なしでサマリーに反映されること"""
+    monkeypatch.setattr(status_snapshot, "max_staleness", 3600)
+    task_ids = [
+        client.post("/api/tasks/", json={"task_type": f"task_{i}"}).json()["task_id"]
+        for i in range(3)
+    ]
+
+    summary, queries = _summary_with_query_count()
+    assert queries > 0
+    assert summary["status_counts"]["pending"] == 3
+
+    client.put(f"/api/tasks/{task_ids[0]}", json={"status": "processing", "progress": 40})
+    client.put(f"/api/tasks/{task_ids[1]}", json={"status": "failed", "error_message": "boom"})
+    client.delete(f"/api/tasks/{task_ids[2]}")
+
+    summary, queries = _summary_with_query_count()
+    assert queries == 0
+    assert summary["total_tasks"] == 2
+    assert summary["status_counts"]["pending"] == 0
+    assert summary["status_counts"]["processing"] == 1
+    assert summary["processing_tasks"][0]["progress"] == 40
+    assert summary["recent_failed"][0]["error_message"] == "boom"
+
+    completed_id = client.post("/api/tasks/", json={"task_type": "task_3"}).json()["task_id"]
+    client.put(f"/api/tasks/{completed_id}", json={"status": "completed"})
+    client.put(f"/api/tasks/{task_ids[0]}", json={"status": "pending"})
+
+    summary, _ = _summary_with_query_count()
+    assert summary["processing_tasks"] == []
+    assert summary["recent_completed"][0]["task_id"] == completed_id
+
+def test_summary_staleness_bound(monkeypatch):
+    """API外の更新は max_staleness を過ぎると反映されること"""
+    monkeypatch.setattr(status_snapshot, "max_staleness", 3600)
+    client.get("/api/status/summary")
+
+    # ワーカーによる直接書き込みを模擬
+    db = SessionLocal()
+    try:
+        db.add(Task(task_id="worker-task", task_type="video_edit", status=TaskStatus.PROCESSING))
+        db.commit()
+    finally:
+        db.close()
+
+    assert client.get("/api/status/summary").json()["total_tasks"] == 0
+
+    monkeypatch.setattr(status_snapshot, "max_staleness", 0)
+    summary = client.get("/api/status/summary").json()
+    assert summary["total_tasks"] == 1
+    assert summary["processing_tasks"][0]["task_id"] == "worker-task"
+
+def test_summary_applies_worker_events(monkeypatch):
+    """ワーカーでの状態遷移は pub/sub のイベントから再集計なしで反映されること"""
+    monkeypatch.setattr(status_snapshot, "max_staleness", 3600)
+    events = []
+    monkeypatch.setattr(task_manager_module, "publish_task_update", lambda task_id, data: events.append(data))
+    monkeypatch.setattr(task_manager_module, "invalidate_task_sync", lambda task_id, project_id=None: None)
+    task_id = client.post("/api/tasks/", json={"task_type": "video_edit"}).json()["task_id"]
+    client.get("/api/status/summary")
+
+    manager = TaskManager()
+    manager.update_task_status(task_id, status="processing", current_step="Loading")
+    manager.write_progress(task_id, progress=50, current_step="Rendering")
+    for data in events:
+        status_snapshot.apply_event(data)
+    # 同じイベントが2回届いても二重に数えない
+    status_snapshot.apply_event(events[0])
+
+    summary, queries = _summary_with_query_count()
+    assert queries == 0
+    assert (summary["status_counts"]["pending"], summary["status_counts"]["processing"]) == (0, 1)
+    assert summary["processing_tasks"][0]["task_type"] == "video_edit"
+    assert (summary["processing_tasks"][0]["progress"], summary["processing_tasks"][0]["current_step"]) == (50, "Rendering")
+
+    # 完了はワーカーの書き込みとイベントを模擬する
+    db = SessionLocal()
+    task = db.query(Task).filter(Task.task_id == task_id).one()
+    task.status = TaskStatus.COMPLETED
+    task.completed_at = datetime.utcnow()
+    task.version = task.version + 1
+    db.commit()
+    status_snapshot.apply_event(task_event(task, TaskStatus.PROCESSING))
+    db.close()
+
+    summary, queries = _summary_with_query_count()
+    assert queries == 0
+    assert summary["status_counts"]["processing"] == 0
+    assert summary["status_counts"]["completed"] == 1
+    assert summary["processing_tasks"] == []
+    assert summary["recent_completed"][0]["task_id"] == task_id
+
+def test_own_updates_are_not_applied_twice(monkeypatch):
+    """API での更新が pub/sub で戻ってきても二重に数えないこと"""
+    monkeypatch.setattr(status_snapshot, "max_staleness", 3600)
+
+    task_id = client.post("/api/tasks/", json={"task_type": "video_edit"}).json()["task_id"]
+    client.get("/api/status/summary")
+    client.put(f"/api/tasks/{task_id}", json={"status": "processing"})
+
+    db = SessionLocal()
+    task = db.query(Task).filter(Task.task_id == task_id).one()
+    status_snapshot.apply_event(task_event(task, TaskStatus.PENDING))
+    db.close()
+
+    summary, _ = _summary_with_query_count()
+    assert (summary["status_counts"]["pending"], summary["status_counts"]["processing"]) == (0, 1)
+
+def test_delete_project_removes_its_tasks(monkeypatch):
+    """プロジェクトの削除で一緒に消えるタスクがサマリー・ID キャッシュからも消えること"""
+    monkeypatch.setattr(status_snapshot, "max_staleness", 3600)
+    project_id = client.post("/api/projects/", json={"name": "p"}).json()["project_id"]
+    task_ids = [
+        client.post("/api/tasks/", json={"task_type": "video_edit", "project_id": project_id}).json()["task_id"]
+        for _ in range(2)
+    ]
+    client.post("/api/tasks/", json={"task_type": "video_edit"})
+    client.put(f"/api/tasks/{task_ids[0]}", json={"status": "processing"})
+    client.post(f"/api/tasks/{task_ids[0]}/logs", json={"level": "INFO", "message": "m"})
+    assert task_pk_cache.get_many([task_ids[0]])
+
+    client.get("/api/status/summary")
+    assert client.delete(f"/api/projects/{project_id}").status_code == 200
+
+    summary, queries = _summary_with_query_count()
+    assert queries == 0
+    assert summary["total_tasks"] == 1
+    assert summary["processing_tasks"] == []
+    assert task_pk_cache.get_many(task_ids) == {}
@@ -0,0 +1,41 @@
+"""Worker dispatch tests"""
+from services import task_dispatch
+from services.task_dispatch import dispatch_tasks, worker_signature
+
+class RecordingGroup:
+    published = []
+
+    def __init__(self, signatures):
+        self.signatures = signatures
+
+    def apply_async(self):
+        RecordingGroup.published.append(self.signatures)
+
+def test_worker_signature():
+    """タスク種別ごとに対応するワーカータスクを選ぶこと"""
+    signature = worker_signature("t1", "video_edit", {"xml_path": "a.xml"})
+    assert signature.task == "process_video_edit"
+    assert signature.kwargs == {"task_id": "t1", "input_data": {"xml_path": "a.xml"}, "priority": None}
+    assert signature.options == {"queue": "video.bulk", "priority": 5}
+    signature = worker_signature("t2", "audio_process", {"audio_path": "a.wav"}, priority=9)
+    assert signature.task == "analyze_music"
+    assert signature.options == {"queue": "analysis.high", "priority": 1}
+    # 必要な入力がない・対応するタスクがない種別は投入しない
+    assert worker_signature("t3", "audio_process", None) is None
+    assert worker_signature("t4", "image_process", {}) is None
+
+def test_dispatch_publishes_one_group(monkeypatch):
+    """バッチ全体を1つの group として1回だけ publish すること"""
+    monkeypatch.setattr(task_dispatch, "group", RecordingGroup)
+    RecordingGroup.published = []
+    published, skipped = dispatch_tasks([
+        ("t1", "video_edit", None, 5),
+        ("t2", "image_process", None, 5),
+        ("t3", "analysis", {"video_path": "a.mp4"}, 10),
+    ])
+    assert (published, skipped) == (2, ["t2"])
+    assert len(RecordingGroup.published) == 1
+    assert [signature.task for signature in RecordingGroup.published[0]] == ["process_video_edit", "analyze_video"]
+
+    assert dispatch_tasks([("t4", "image_process", None, 5)]) == (0, ["t4"])
+    assert len(RecordingGroup.published) == 1
@@ -0,0 +1,91 @@
+"""Task event replay buffer tests"""
+import asyncio
+import fakeredis
+import fakeredis.aioredis
+from services import task_events
+from services.task_event_log import MemoryEventLog, RedisEventLog
+
+def _progress(events):
+    return [event["progress"] for event in events]
+
+def test_memory_log_replays_events_after_since():
+    """since より後のイベントだけが返ること"""
+    log = MemoryEventLog(size=10, max_tasks=10)
+    ids = [log.record("task-1", {"progress": i})["event_id"] for i in range(5)]
+    assert ids == [1, 2, 3, 4, 5]
+
+    events, complete = asyncio.run(log.read("task-1", "3"))
+    assert complete
+    assert _progress(events) == [3, 4]
+
+    events, complete = asyncio.run(log.read("task-1", "5"))
+    assert (events, complete) == ([], True)
+
+def test_memory_log_reports_gaps():
+    """バッファから消えたイベントやリセット後の since は途切れとして返ること"""
+    log = MemoryEventLog(size=3, max_tasks=1)
+    for i in range(5):
+        log.record("task-1", {"progress": i})
+
+    # 1, 2 は既に捨てられている
+    events, complete = asyncio.run(log.read("task-1", "1"))
+    assert not complete
+    assert _progress(events) == [2, 3, 4]
+    assert asyncio.run(log.read("task-1", "2"))[1]
+
+    # タスク数の上限を超えると古いタスクから捨てられる
+    log.record("task-2", {"progress": 0})
+    assert asyncio.run(log.read("task-1", "5")) == ([], False)
+    assert not asyncio.run(log.read("task-2", "7"))[1]
+    assert not asyncio.run(log.read("task-2", "not-a-number"))[1]
+
+def test_redis_log_is_written_on_publish(monkeypatch):
+    """Redis Streams の場合は publish 時に追記され、event_id が配信内容に付くこと"""
+    server = fakeredis.FakeServer()
+    client = fakeredis.FakeRedis(server=server)
+    log = RedisEventLog(size=10, ttl=60, client=fakeredis.aioredis.FakeRedis(server=server))
+    monkeypatch.setattr(task_events, "_client", client)
+    monkeypatch.setattr(task_events, "event_log", log)
+
+    pubsub = client.pubsub()
+    pubsub.subscribe(task_events.channel_for("task-1"))
+    pubsub.get_message(timeout=1)
+    for i in range(3):
+        task_events.publish_task_update("task-1", {"progress": i})
+
+    published = [pubsub.get_message(timeout=1) for _ in range(3)]
+    first_id = task_events.json.loads(published[0]["data"])["event_id"]
+    assert client.ttl("task_events:task-1") > 0
+
+    async def read_both():
+        return await log.read("task-1", first_id), await log.read("task-1", "0-1")
+
+    (events, complete), (all_events, gap_complete) = asyncio.run(read_both())
+    assert complete
+    assert _progress(events) == [1, 2]
+    # since がストリームの先頭より前なら途切れとして全件が返る
+    assert not gap_complete
+    assert _progress(all_events) == [0, 1, 2]
+
+def test_redis_log_reads_only_after_since():
+    """since より後のエントリだけを読み、since 自身は返さないこと"""
+    client = fakeredis.aioredis.FakeRedis()
+    log = RedisEventLog(size=100, ttl=60, client=client)
+
+    async def scenario():
+        ids = [await client.xadd("task_events:task-1", {"data": task_events.json.dumps({"progress": i})}) for i in range(5)]
+        ids = [entry_id.decode() for entry_id in ids]
+        return (
+            await log.read("task-1", ids[2]),
+            await log.read("task-1", ids[-1]),
+            await log.read("task-1", "not-an-id"),
+            await log.read("task-2", "0-1"),
+        )
+
+    after, latest, invalid, missing = asyncio.run(scenario())
+    assert after[1]
+    assert _progress(after[0]) == [3, 4]
+    assert latest == ([], True)
+    assert not invalid[1]
+    assert _progress(invalid[0]) == [0, 1, 2, 3, 4]
+    assert missing == ([], False)
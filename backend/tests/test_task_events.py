@@ -0,0 +1,104 @@
+"""Redis pub/sub task event tests"""
+import asyncio
+import fakeredis
+import fakeredis.aioredis
+import pytest
+from models import Base, engine, SessionLocal, Task, TaskStatus
+from services import task_events, task_manager
+from services.task_events import TaskEventSubscriber, publish_task_update
+from services.task_manager import TaskManager
+
+@pytest.fixture
+def redis_server(monkeypatch):
+    """publish 側・購読側で共有するインメモリの Redis"""
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(task_events, "_client", fakeredis.FakeRedis(server=server))
+    return server
+
+async def _wait_for(condition, timeout=5.0):
+    for _ in range(int(timeout / 0.01)):
+        if condition():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("condition not met")
+
+def test_updates_fan_out_to_every_subscriber(redis_server):
+    """publish した更新が全APIプロセス（購読者）に届くこと"""
+    async def scenario():
+        received = []
+
+        async def handler(task_id, data):
+            received.append((task_id, data))
+
+        # APIプロセス2つ分の購読者
+        subscribers = [
+            TaskEventSubscriber(handler, client=fakeredis.aioredis.FakeRedis(server=redis_server))
+            for _ in range(2)
+        ]
+        for subscriber in subscribers:
+            await subscriber.start()
+            await asyncio.wait_for(subscriber.ready.wait(), 5)
+
+        publish_task_update("task-1", {"task_id": "task-1", "progress": 50})
+        await _wait_for(lambda: len(received) == 2)
+
+        for subscriber in subscribers:
+            await subscriber.stop()
+        return received
+
+    assert asyncio.run(scenario()) == [("task-1", {"task_id": "task-1", "progress": 50})] * 2
+
+def test_handler_errors_do_not_stop_subscription(redis_server):
+    """転送時のエラーで購読が止まらないこと"""
+    async def scenario():
+        received = []
+
+        async def handler(task_id, data):
+            if data.get("fail"):
+                raise RuntimeError("client gone")
+            received.append(task_id)
+
+        subscriber = TaskEventSubscriber(handler, client=fakeredis.aioredis.FakeRedis(server=redis_server))
+        await subscriber.start()
+        await asyncio.wait_for(subscriber.ready.wait(), 5)
+
+        publish_task_update("task-1", {"fail": True})
+        publish_task_update("task-2", {})
+        await _wait_for(lambda: received == ["task-2"])
+
+        await subscriber.stop()
+
+    asyncio.run(scenario())
+
+def test_publish_failure_is_swallowed(monkeypatch):
+    """Redis に接続できなくてもタスク処理は止まらないこと"""
+    class Unreachable:
+        def publish(self, channel, message):
+            raise ConnectionError("redis is down")
+
+    monkeypatch.setattr(task_events, "_client", Unreachable())
+    publish_task_update("task-1", {})
+
+@pytest.fixture
+def database():
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        db.add(Task(task_id="task-1", task_type="video_edit", status=TaskStatus.PENDING))
+        db.commit()
+    finally:
+        db.close()
+    yield
+    Base.metadata.drop_all(bind=engine)
+
+def test_task_manager_publishes_without_requery(database, monkeypatch):
+    """TaskManager はコミットした状態をそのまま publish すること"""
+    published = []
+    monkeypatch.setattr(task_manager, "publish_task_update", lambda task_id, data: published.append((task_id, data)))
+
+    assert TaskManager().update_task_status("task-1", status="processing", progress=10)
+
+    task_id, data = published[0]
+    assert task_id == "task-1"
+    assert data["status"] == "processing"
+    assert data["progress"] == 10
@@ -0,0 +1,149 @@
+"""Batched task log ingestion tests"""
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event, select, func
+from sqlalchemy.exc import IntegrityError
+from main import app
+from models import Base, engine, async_engine, SessionLocal, TaskLog
+from api import tasks as tasks_module
+from services import task_logs
+from services.task_logs import TaskLogWriter
+
+client = TestClient(app)
+
+@pytest.fixture(autouse=True)
+def setup_database():
+    """テスト用データベースのセットアップ"""
+    Base.metadata.create_all(bind=engine)
+    yield
+    Base.metadata.drop_all(bind=engine)
+
+def _create_task() -> str:
+    return client.post("/api/tasks/", json={"task_type": "video_edit"}).json()["task_id"]
+
+def _log_count() -> int:
+    db = SessionLocal()
+    try:
+        return db.scalar(select(func.count()).select_from(TaskLog))
+    finally:
+        db.close()
+
+class StatementRecorder:
+    def __init__(self, target):
+        self.target = target
+        self.statements = []
+
+    def __enter__(self):
+        event.listen(self.target, "before_cursor_execute", self._record)
+        return self.statements
+
+    def __exit__(self, *exc):
+        event.remove(self.target, "before_cursor_execute", self._record)
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+def test_batch_endpoint_uses_one_insert():
+    """バッチエンドポイントは1回の INSERT で全件を書き込むこと"""
+    task_id = _create_task()
+    logs = [{"message": f"Log message {i}", "level": "INFO"} for i in range(20)]
+
+    with StatementRecorder(async_engine.sync_engine) as statements:
+        response = client.post(f"/api/tasks/{task_id}/logs/batch", json=logs)
+
+    assert response.status_code == 200
+    assert response.json()["count"] == 20
+    assert len([s for s in statements if s.lstrip().upper().startswith("INSERT")]) == 1
+
+    response = client.get(f"/api/tasks/{task_id}/logs?limit=100")
+    assert len(response.json()["logs"]) == 20
+
+def test_batch_endpoint_copy(monkeypatch):
+    """閾値以上の件数では COPY でも正しく書き込まれること"""
+    monkeypatch.setattr(task_logs.settings, "TASK_LOG_COPY_THRESHOLD", 5)
+    task_id = _create_task()
+    logs = [
+        {"message": f"Log, \"quoted\" {i}", "step_name": None if i % 2 else "step", "step_progress": i}
+        for i in range(10)
+    ]
+
+    response = client.post(f"/api/tasks/{task_id}/logs/batch", json=logs)
+    assert response.status_code == 200
+
+    messages = {log["message"] for log in client.get(f"/api/tasks/{task_id}/logs?limit=100").json()["logs"]}
+    assert messages == {log["message"] for log in logs}
+
+def test_batch_endpoint_errors(monkeypatch):
+    """存在しないタスクは404、上限超過は400"""
+    response = client.post("/api/tasks/non-existent-id/logs/batch", json=[{"message": "x"}])
+    assert response.status_code == 404
+
+    monkeypatch.setattr(task_logs.settings, "TASK_LOG_BATCH_SIZE", 2)
+    task_id = _create_task()
+    response = client.post(f"/api/tasks/{task_id}/logs/batch", json=[{"message": "x"}] * 3)
+    assert response.status_code == 400
+
+def test_stale_cached_task_returns_404(monkeypatch):
+    """キャッシュ済みのタスクが別のプロセスで削除されていれば、解決し直して404を返すこと"""
+    task_logs.task_pk_cache.put_many({"deleted-elsewhere": 999})
+    calls = []
+    async def insert_with_missing_task(db, rows):
+        calls.append(rows[0]["task_id"])
+        raise IntegrityError("INSERT INTO task_logs", {}, Exception("FOREIGN KEY constraint failed"))
+    monkeypatch.setattr(tasks_module, "insert_task_logs_async", insert_with_missing_task)
+
+    response = client.post("/api/tasks/deleted-elsewhere/logs/batch", json=[{"message": "x"}])
+    assert response.status_code == 404
+    assert calls == [999]
+    assert task_logs.task_pk_cache.get_many(["deleted-elsewhere"]) == {}
+
+def test_writer_batches_and_caches_task_ids(monkeypatch):
+    """ワーカー側のライターがまとめて書き込み、task_id の解決をキャッシュすること"""
+    monkeypatch.setattr(task_logs, "task_pk_cache", task_logs.TaskPkCache(100))
+    task_ids = [_create_task(), _create_task()]
+    writer = TaskLogWriter(flush_interval=60, batch_size=1000)
+
+    for i in range(10):
+        writer.add(task_ids[i % 2], f"Log message {i}", metadata={"step": i})
+    writer.add("non-existent-id", "dropped")
+
+    with StatementRecorder(engine) as statements:
+        assert writer.flush() == 10
+    # task_id の解決 + INSERT
+    assert len(statements) == 2
+
+    writer.add(task_ids[0], "again")
+    with StatementRecorder(engine) as statements:
+        assert writer.flush() == 1
+    # キャッシュ済みなので INSERT のみ
+    assert len(statements) == 1
+
+    assert _log_count() == 11
+    writer.close()
+
+def test_writer_flushes_when_batch_is_full():
+    """batch_size に達したら即座に書き込むこと"""
+    task_id = _create_task()
+    writer = TaskLogWriter(flush_interval=60, batch_size=5)
+
+    for i in range(5):
+        writer.add(task_id, f"Log message {i}")
+
+    assert _log_count() == 5
+    writer.close()
+
+def test_writer_copy(monkeypatch):
+    """閾値以上の件数では COPY でも正しく書き込まれること（PostgreSQL のみ COPY を使う）"""
+    monkeypatch.setattr(task_logs.settings, "TASK_LOG_COPY_THRESHOLD", 2)
+    task_id = _create_task()
+    writer = TaskLogWriter(flush_interval=60, batch_size=1000)
+
+    writer.add(task_id, "plain")
+    writer.add(task_id, "with, comma and \"quotes\"", metadata={"a": 1})
+    writer.add(task_id, "", step_name="step", step_progress=50.0)
+    assert writer.flush() == 3
+
+    logs = client.get(f"/api/tasks/{task_id}/logs?limit=100").json()["logs"]
+    assert {log["message"] for log in logs} == {"plain", "with, comma and \"quotes\"", ""}
+    assert {log["step_name"] for log in logs} == {None, "step"}
+    writer.close()
@@ -0,0 +1,134 @@
+"""Transactional outbox tests"""
+import asyncio
+
+import json
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import func, select
+from main import app
+from models import Base, engine, SessionLocal, AsyncSessionLocal, Task, TaskOutbox, TaskStatus
+from services import task_dispatch, task_outbox
+from services.task_outbox import add_to_outbox, relay_outbox
+
+client = TestClient(app)
+
+@pytest.fixture(autouse=True)
+def setup_database():
+    """テスト用データベースのセットアップ"""
+    Base.metadata.create_all(bind=engine)
+    yield
+    Base.metadata.drop_all(bind=engine)
+
+@pytest.fixture
+def published(monkeypatch):
+    batches = []
+    def dispatch(entries):
+        batches.append(list(entries))
+        return len(batches[-1]), []
+    monkeypatch.setattr(task_outbox, "dispatch_tasks", dispatch)
+    return batches
+
+def _create(task_ids: list, commit: bool):
+    async def run():
+        async with AsyncSessionLocal() as db:
+            db.add_all(Task(task_id=task_id, task_type="video_edit", status=TaskStatus.PENDING) for task_id in task_ids)
+            await add_to_outbox(db, [(task_id, "video_edit", {"xml_path": "a.xml"}, 7) for task_id in task_ids])
+            if commit:
+                await db.commit()
+            else:
+                await db.rollback()
+    asyncio.run(run())
+
+def _outbox_count() -> int:
+    db = SessionLocal()
+    try:
+        return db.scalar(select(func.count()).select_from(TaskOutbox))
+    finally:
+        db.close()
+
+def test_outbox_follows_task_transaction():
+    """タスクと同じトランザクションで書き込まれ、ロールバックでは残らないこと"""
+    _create(["rolled-back"], commit=False)
+    assert _outbox_count() == 0
+    _create(["t1", "t2"], commit=True)
+    assert _outbox_count() == 2
+
+def test_create_task_writes_outbox(published):
+    """POST /api/tasks/ がタスクと一緒に outbox へ書き込み、リレーで投入されること"""
+    task_id = client.post("/api/tasks/", json={
+        "task_type": "video_edit",
+        "input_data": json.dumps({"xml_path": "a.xml"}),
+        "priority": 8
+    }).json()["task_id"]
+    client.post("/api/tasks/", json={"task_type": "analysis", "input_data": "not json"})
+    assert _outbox_count() == 2
+
+    db = SessionLocal()
+    try:
+        relay_outbox(db)
+    finally:
+        db.close()
+    assert published[0][0] == (task_id, "video_edit", {"xml_path": "a.xml"}, 8)
+    assert published[0][1][2] is None
+    assert published[0][1][3] is None
+
+    db = SessionLocal()
+    try:
+        assert db.scalar(select(Task.priority).where(Task.task_id == task_id)) == 8
+    finally:
+        db.close()
+
+def test_create_task_rejects_out_of_range_priority():
+    """priority は 1〜10 の範囲外なら 422 になること"""
+    response = client.post("/api/tasks/", json={"task_type": "video_edit", "priority": 11})
+    assert response.status_code == 422
+
+def test_relay_publishes_in_batches(published):
+    """古い順に batch_size 件ずつ publish して削除すること"""
+    _create(["t1", "t2", "t3"], commit=True)
+    db = SessionLocal()
+    try:
+        assert relay_outbox(db, batch_size=2) == 3
+    finally:
+        db.close()
+    assert [[entry[0] for entry in batch] for batch in published] == [["t1", "t2"], ["t3"]]
+    assert published[0][0] == ("t1", "video_edit", {"xml_path": "a.xml"}, 7)
+    assert _outbox_count() == 0
+
+def test_relay_fails_undispatchable_tasks(monkeypatch):
+    """投入先のない行は削除し、そのタスクを failed にして publish 数に数えないこと"""
+    monkeypatch.setattr(task_dispatch, "group", lambda signatures: SimpleNamespace(apply_async=lambda: None))
+    _create(["t1"], commit=True)
+    async def add_unmapped():
+        async with AsyncSessionLocal() as db:
+            db.add(Task(task_id="t2", task_type="analysis", status=TaskStatus.PENDING))
+            await add_to_outbox(db, [("t2", "analysis", None, None)])
+            await db.commit()
+    asyncio.run(add_unmapped())
+
+    db = SessionLocal()
+    try:
+        assert relay_outbox(db) == 1
+        statuses = dict(db.execute(select(Task.task_id, Task.status)).all())
+        error_message = db.scalar(select(Task.error_message).where(Task.task_id == "t2"))
+    finally:
+        db.close()
+    assert statuses == {"t1": TaskStatus.PENDING, "t2": TaskStatus.FAILED}
+    assert error_message
+    assert _outbox_count() == 0
+
+def test_relay_keeps_rows_on_failure(monkeypatch):
+    """publish に失敗した行は残り、次回に再送されること"""
+    _create(["t1"], commit=True)
+    def fail(entries):
+        raise ConnectionError("broker down")
+    monkeypatch.setattr(task_outbox, "dispatch_tasks", fail)
+    db = SessionLocal()
+    try:
+        with pytest.raises(ConnectionError):
+            relay_outbox(db)
+    finally:
+        db.close()
+    assert _outbox_count() == 1
@@ -0,0 +1,53 @@
+"""Queue routing / priority aging tests"""
+import json
+
+import fakeredis
+
+from celery_app import celery_app
+from services.task_routing import (
+    PRIORITY_SEP, broker_priority, routing_options, promote_aged_messages, stamp_enqueued_at
+)
+
+def test_routing_by_type_and_priority():
+    """タスク種別でクラス、priority で high / bulk とブローカー優先度が決まること"""
+    assert routing_options("process_video_edit", 10) == {"queue": "video.high", "priority": 0}
+    assert routing_options("process_video_edit", 3) == {"queue": "video.bulk", "priority": 7}
+    assert routing_options("analyze_music") == {"queue": "analysis.bulk", "priority": 5}
+    assert routing_options("health_check", 9) == {"queue": "default", "priority": 1}
+    assert broker_priority(1) == 9
+    assert broker_priority(42) == 0
+
+def test_celery_app_routes():
+    """キューを指定せずに publish したタスクも振り分けられること"""
+    route = celery_app.amqp.router.route({}, "analyze_video", (), {})
+    assert route["queue"].name == "analysis.bulk"
+    # 明示したキュー・優先度が優先される
+    route = celery_app.amqp.router.route({"queue": "video.high", "priority": 0}, "process_video_edit", (), {})
+    assert route["queue"].name == "video.high"
+    assert route["priority"] == 0
+
+def _message(enqueued_at: float) -> str:
+    headers = {}
+    stamp_enqueued_at(headers=headers)
+    headers["enqueued_at"] = enqueued_at
+    return json.dumps({"body": "", "headers": headers, "properties": {}})
+
+def _key(step: int) -> str:
+    return f"video.bulk{PRIORITY_SEP}{step}" if step else "video.bulk"
+
+def test_aging_promotes_one_step_per_run():
+    """待ち時間が長いメッセージだけを、1回につき1段ずつ上位のリストへ移すこと"""
+    client = fakeredis.FakeRedis()
+    # kombu は LPUSH で積み、右端から取り出す（右端が最も古い）
+    client.lpush(_key(2), _message(0), _message(50), _message(95))
+    client.lpush(_key(1), _message(10))
+
+    assert promote_aged_messages(client, ["video.bulk"], max_age=30, now=100) == 3
+    assert [json.loads(m)["headers"]["enqueued_at"] for m in client.lrange(_key(0), 0, -1)] == [10]
+    # 移したメッセージは移動先の最後尾に古い順で並ぶ（右端から取り出される）
+    assert [json.loads(m)["headers"]["enqueued_at"] for m in client.lrange(_key(1), 0, -1)] == [50, 0]
+    assert client.llen(_key(2)) == 1
+
+    assert promote_aged_messages(client, ["video.bulk"], max_age=30, now=100) == 2
+    assert client.llen(_key(0)) == 3
+    assert promote_aged_messages(client, ["video.bulk"], max_age=30, now=100, limit=0) == 0
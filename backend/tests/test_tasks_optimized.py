@@ -10,6 +10,7 @@ import json
 from main import app
 from models import Base, engine, Task, TaskStatus
 from schemas.task import TaskCreate, TaskUpdate, TaskType
+from config import get_settings
 
 client = TestClient(app)
 
@@ -259,16 +260,16 @@ class TestTaskAPI:
         assert data[1]["task_type"] == "audio_process"
         assert data[2]["task_type"] == "image_process"
     
-    def test_batch_task_creation_limit(self):
+    def test_batch_task_creation_limit(self, monkeypatch):
         """Test batch creation limit"""
-        # Create 101 tasks (exceeds limit)
+        monkeypatch.setattr(get_settings(), "TASK_BATCH_MAX_SIZE", 2)
         tasks_data = [
-            {"task_type": "video_edit"} for _ in range(101)
+            {"task_type": "video_edit"} for _ in range(3)
         ]
         
         response = client.post("/api/tasks/batch", json=tasks_data)
         assert response.status_code == 400
-        assert "Maximum 100 tasks" in response.json()["detail"]
+        assert "Maximum 2 tasks" in response.json()["detail"]
     
     def test_task_logs(self):
         """Test task log functionality"""
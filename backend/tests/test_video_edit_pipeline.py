@@ -0,0 +1,97 @@
+"""Video edit stage graph / stage progress tests"""
+import fakeredis
+import pytest
+
+from celery_app import celery_app
+from services import tasks
+from services.progress_sink import progress_sink
+from services.stage_progress import StageProgress, stage_key
+from services.tasks import (
+    CallbackTask, VIDEO_EDIT_PATTERNS, process_video_edit, video_edit_stages, video_edit_workflow
+)
+
+@pytest.fixture
+def recorded(monkeypatch):
+    """Redis を fakeredis に、進捗・ログの書き込みを記録に置き換える"""
+    updates, logs = [], []
+    monkeypatch.setattr(video_edit_stages, "client", fakeredis.FakeRedis())
+    # canvas の freeze で結果バックエンドに購読を登録するため
+    monkeypatch.setattr(celery_app.backend, "client", fakeredis.FakeRedis())
+    monkeypatch.setattr(progress_sink, "update", lambda task_id, **fields: updates.append((task_id, fields)))
+    monkeypatch.setattr(CallbackTask, "log_message", lambda self, task_id, message, level="INFO": logs.append(message))
+    monkeypatch.setattr(tasks.time, "sleep", lambda seconds: None)
+    monkeypatch.setattr(celery_app.conf, "task_always_eager", True)
+    return updates, logs
+
+def test_stage_progress_rollup():
+    """並列ステージの進み具合が重み付きで親タスクの進捗にまとまること"""
+    stages = StageProgress({"a": 20, "b": 20, "c": 60}, client=fakeredis.FakeRedis())
+    assert stages.report("t1", "a", 0.5) == 10.0
+    # 別のワーカーからの報告も合計に入る
+    assert stages.report("t1", "b", 1.0) == 30.0
+    assert stages.report("t1", "a", 2.0) == 40.0
+    assert stages.report("t2", "c", 0.5) == 30.0
+    with pytest.raises(ValueError):
+        stages.report("t1", "unknown", 1.0)
+
+    stages.clear("t1")
+    assert not stages.client.exists(stage_key("t1"))
+    assert stages.client.ttl(stage_key("t2")) > 0
+
+def test_stage_progress_without_redis():
+    """Redis に書き込めない場合は None を返し、例外を出さないこと"""
+    stages = StageProgress({"a": 100}, url="redis://127.0.0.1:1/0")
+    assert stages.report("t1", "a", 1.0) is None
+
+def test_workflow_graph():
+    """分析2つ → パターン3つ → QA・出力 の順に、並列ステージが group になること"""
+    workflow = video_edit_workflow("t1", {"audio_path": "a.wav", "video_path": "v.mp4"}, priority=9)
+
+    assert [(s.task, s.args) for s in workflow.tasks] == [
+        ("video_edit_analyze_music", ("t1", "a.wav")),
+        ("video_edit_analyze_video", ("t1", "v.mp4")),
+    ]
+    # 分析は結果を受け取らない、親と同じ priority で analysis の high キューへ
+    assert all(s.immutable for s in workflow.tasks)
+    assert workflow.tasks[0].options["queue"] == "analysis.high"
+    assert workflow.tasks[0].options["priority"] == 1
+
+    patterns = workflow.body
+    assert [s.args for s in patterns.tasks] == [("t1", pattern) for pattern in VIDEO_EDIT_PATTERNS]
+    assert all(s.options["queue"] == "video.high" for s in patterns.tasks)
+    assert patterns.body.task == "video_edit_finalize"
+    assert patterns.body.args == ("t1",)
+
+def test_process_video_edit_runs_stages(recorded):
+    """ステージの結果が後続に渡り、最終ステージで親タスクが完了すること"""
+    updates, logs = recorded
+
+    result = process_video_edit.apply(
+        kwargs={"task_id": "t1", "input_data": {"audio_path": "a.wav", "video_path": "v.mp4"}}
+    ).get()
+
+    assert result["status"] == "success"
+    assert result["task_id"] == "t1"
+    assert [message for message in logs if message.startswith("Generated")] == [
+        f"Generated {pattern}" for pattern in VIDEO_EDIT_PATTERNS
+    ]
+
+    # ステージのタスクは task_id を kwargs に持たないので、シグナルからの更新（None）は含めない
+    progress = [fields["progress"] for task_id, fields in updates if task_id == "t1" and fields.get("progress") is not None]
+    assert progress == sorted(progress)
+    assert progress[-1] == 100.0
+    assert ("t1", {"status": "completed", "progress": 100.0, "current_step": "Process completed successfully"}) in updates
+    # 終了時にステージの進捗は消える
+    assert not video_edit_stages.client.exists(stage_key("t1"))
+
+def test_process_video_edit_invalid_input(recorded):
+    """検証に失敗した場合はステージを投入せずに失敗すること"""
+    updates, logs = recorded
+
+    with pytest.raises(ValueError):
+        process_video_edit.apply(
+            kwargs={"task_id": "t1", "input_data": {"audio_path": "a.wav"}}, throw=True
+        ).get()
+
+    assert any(fields.get("status") == "failed" for task_id, fields in updates)
+    assert not any(message.startswith("Generated") for message in logs)
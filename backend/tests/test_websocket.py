@@ -54,4 +54,284 @@ def test_websocket_error_handling():
         # Should receive error
         error = websocket.receive_json()
         assert error["type"] == "error"
-        assert "message" in error
\ No newline at end of file
+        assert "message" in error
+
+def _publish(websocket, task_id, data):
+    """Deliver an event as the Redis pub/sub subscriber would, on the session's loop"""
+    from api.websocket import deliver_task_event
+    
+    websocket.portal.call(deliver_task_event, task_id, data)
+
+
+def test_client_task_update_is_not_broadcast(replay_log):
+    """A client-sent task_update is echoed to the sender only"""
+    client = TestClient(app)
+    
+    with client.websocket_connect("/ws/tasks") as listener:
+        listener.send_json({"type": "subscribe", "task_id": "echo-1"})
+        listener.receive_json()
+        
+        with client.websocket_connect("/ws/tasks") as sender:
+            sender.send_json({"type": "task_update", "task_id": "echo-1", "progress": 99})
+            assert sender.receive_json()["progress"] == 99
+        
+        listener.send_json({"type": "ping"})
+        assert listener.receive_json()["type"] == "pong"
+    
+    assert "echo-1" not in replay_log._buffers
+
+
+def test_websocket_project_subscription(replay_log):
+    """Updates for any task in a subscribed project are delivered"""
+    client = TestClient(app)
+    
+    with client.websocket_connect("/ws/tasks") as websocket:
+        websocket.send_json({"type": "subscribe", "project_id": 7})
+        ack = websocket.receive_json()
+        assert (ack["type"], ack["project_id"]) == ("subscribed", 7)
+        
+        _publish(websocket, "t-1", {"task_id": "t-1", "project_id": 7, "progress": 10})
+        received = websocket.receive_json()
+        assert received["task_id"] == "t-1"
+        assert received["progress"] == 10
+
+
+def test_websocket_unsubscribe(replay_log):
+    """Unsubscribed tasks no longer receive updates"""
+    client = TestClient(app)
+    
+    with client.websocket_connect("/ws/tasks") as websocket:
+        websocket.send_json({"type": "subscribe", "task_id": "a"})
+        websocket.receive_json()
+        websocket.send_json({"type": "unsubscribe", "task_id": "a"})
+        ack = websocket.receive_json()
+        assert (ack["type"], ack["task_id"]) == ("unsubscribed", "a")
+        
+        _publish(websocket, "a", {"task_id": "a", "progress": 1})
+        websocket.send_json({"type": "ping"})
+        # Only the pong arrives; the update had no subscribers
+        assert websocket.receive_json()["type"] == "pong"
+
+
+def test_legacy_task_websocket(replay_log):
+    """The per-task endpoint still answers ping and receives updates"""
+    client = TestClient(app)
+    
+    with client.websocket_connect("/api/status/ws/legacy-1") as websocket:
+        websocket.send_text("ping")
+        assert websocket.receive_text() == "pong"
+        
+        _publish(websocket, "legacy-1", {"task_id": "legacy-1", "progress": 30})
+        received = websocket.receive_json()
+        assert received["progress"] == 30
+
+
+@pytest.fixture
+def replay_log(monkeypatch):
+    from api import websocket as websocket_module
+    from services.task_event_log import MemoryEventLog
+    
+    log = MemoryEventLog(size=3, max_tasks=10)
+    monkeypatch.setattr(websocket_module, "event_log", log)
+    return log
+
+
+def test_reconnect_replays_missed_events(replay_log):
+    """?since=<event_id> replays only the events the client missed"""
+    for progress in (10, 20, 30):
+        replay_log.record("replay-1", {"task_id": "replay-1", "progress": progress})
+    client = TestClient(app)
+    
+    with client.websocket_connect("/api/status/ws/replay-1?since=1") as websocket:
+        received = [websocket.receive_json() for _ in range(2)]
+    
+    assert [(m["event_id"], m["progress"]) for m in received] == [(2, 20), (3, 30)]
+    assert all(m["replayed"] and not m["resync"] for m in received)
+
+
+def test_replay_failure_disconnects(monkeypatch):
+    """A replay that raises still removes the connection from the manager"""
+    from api import websocket as websocket_module
+    from api.websocket import manager
+    
+    class FailingEventLog:
+        async def read(self, task_id, since):
+            raise ConnectionError("redis down")
+    
+    monkeypatch.setattr(websocket_module, "event_log", FailingEventLog())
+    client = TestClient(app)
+    connections = len(manager.connections)
+    
+    with pytest.raises(ConnectionError):
+        with client.websocket_connect("/api/status/ws/replay-fail?since=1") as websocket:
+            websocket.receive_json()
+    
+    assert len(manager.connections) == connections
+    assert manager.subscriber_count("replay-fail") == 0
+
+
+def test_reconnect_after_gap_resyncs_latest_state(replay_log):
+    """When the missed events are gone, only the latest buffered state is sent"""
+    for progress in range(5):
+        replay_log.record("replay-2", {"task_id": "replay-2", "progress": progress})
+    client = TestClient(app)
+    
+    with client.websocket_connect("/ws/tasks") as websocket:
+        websocket.send_json({"type": "subscribe", "task_id": "replay-2", "since": 1})
+        assert websocket.receive_json()["type"] == "subscribed"
+        received = websocket.receive_json()
+        websocket.send_json({"type": "ping"})
+        assert websocket.receive_json()["type"] == "pong"
+    
+    assert (received["event_id"], received["progress"], received["resync"]) == (5, 4, True)
+
+
+class StalledWebSocket:
+    """A client that never finishes receiving"""
+    
+    def __init__(self):
+        self.sent = []
+        self.release = asyncio.Event()
+    
+    async def send_json(self, data):
+        await self.release.wait()
+        self.sent.append(data)
+    
+    async def send_text(self, data):
+        await self.send_json(data)
+    
+    async def close(self):
+        pass
+
+
+def _send_to_stalled_client(extra_messages: int):
+    """Queue 100 updates for one task plus some other messages while the client is stalled"""
+    from api.websocket import ClientConnection
+    
+    async def scenario():
+        websocket = StalledWebSocket()
+        connection = ClientConnection(websocket, max_queue=3, send_timeout=5)
+        connection.start()
+        
+        # The first message is taken by the writer and blocks on send
+        connection.enqueue({"type": "pong"})
+        await asyncio.sleep(0)
+        
+        for progress in range(100):
+            connection.enqueue_update("a", {"progress": progress})
+        connection.enqueue_update("a", {"status": "completed"})
+        for i in range(extra_messages):
+            connection.enqueue({"type": "error", "message": str(i)})
+        
+        websocket.release.set()
+        await asyncio.sleep(0.05)
+        await connection.close()
+        return websocket.sent
+    
+    return asyncio.run(scenario())
+
+
+def test_slow_consumer_updates_are_coalesced():
+    """A stalled client gets one merged update per task"""
+    assert _send_to_stalled_client(1) == [
+        {"type": "pong", "seq": 1},
+        {"type": "error", "message": "0", "seq": 2},
+        {
+            "type": "task_update", "task_id": "a", "progress": 99, "status": "completed",
+            "changed": ["progress", "status"], "seq": 3,
+        },
+    ]
+
+
+def test_slow_consumer_queue_drops_oldest():
+    """The outbound queue is bounded; dropped messages leave a gap in seq"""
+    sent = _send_to_stalled_client(5)
+    assert [(m["type"], m.get("message"), m["seq"]) for m in sent] == [
+        ("pong", None, 1),
+        ("error", "2", 4),
+        ("error", "3", 5),
+        ("error", "4", 6),
+        ("task_update", None, 7),
+    ]
+
+
+def test_slow_consumer_does_not_block_others():
+    """Fan-out only enqueues; a stalled subscriber does not delay the rest"""
+    from api.websocket import ClientConnection, ConnectionManager
+    
+    async def scenario():
+        manager = ConnectionManager(max_queue=10, send_timeout=5)
+        stalled, fast = StalledWebSocket(), StalledWebSocket()
+        fast.release.set()
+        connections = []
+        for websocket in (stalled, fast):
+            connection = ClientConnection(websocket, manager.max_queue, manager.send_timeout)
+            connection.start()
+            manager.connections.add(connection)
+            manager.subscribe_task(connection, "a")
+            connections.append(connection)
+        
+        await asyncio.wait_for(manager.send_update("a", {"progress": 1}), 0.1)
+        await asyncio.sleep(0.01)
+        await manager.send_update("a", {"progress": 2})
+        await asyncio.sleep(0.05)
+        
+        for connection in connections:
+            await manager.disconnect(connection)
+        return fast.sent, stalled.sent
+    
+    fast_sent, stalled_sent = asyncio.run(scenario())
+    assert [m["progress"] for m in fast_sent] == [1, 2]
+    assert stalled_sent == []
+
+
+def _collect_updates(max_update_rate: float, updates, interval: float = 0):
+    """Feed updates to a connection and return what was sent with send times"""
+    from api.websocket import ClientConnection
+    
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        websocket = StalledWebSocket()
+        websocket.release.set()
+        sent_at = []
+        send_json = websocket.send_json
+        
+        async def timed_send_json(data):
+            await send_json(data)
+            sent_at.append(loop.time())
+        
+        websocket.send_json = timed_send_json
+        connection = ClientConnection(
+            websocket, max_queue=10, send_timeout=5, max_update_rate=max_update_rate
+        )
+        connection.start()
+        for update in updates:
+            connection.enqueue_update("a", update)
+            await asyncio.sleep(interval)
+        await asyncio.sleep(0.3)
+        await connection.close()
+        return websocket.sent, sent_at
+    
+    return asyncio.run(scenario())
+
+
+def test_update_rate_is_capped():
+    """Updates to one subscriber are sent at most max_update_rate times per second"""
+    sent, sent_at = _collect_updates(10, [{"progress": 1}, {"progress": 2}, {"progress": 3}])
+    
+    # The first update goes out immediately; the rest are merged and sent ~100ms later
+    assert [m["progress"] for m in sent] == [1, 3]
+    assert [m["seq"] for m in sent] == [1, 2]
+    assert sent_at[1] - sent_at[0] >= 0.09
+
+
+def test_unchanged_state_is_not_resent():
+    """Only changed fields are listed, and an unchanged state is skipped"""
+    sent, _ = _collect_updates(0, [
+        {"status": "processing", "progress": 10},
+        {"status": "processing", "progress": 10},
+        {"status": "processing", "progress": 20},
+    ], interval=0.01)
+    
+    assert [m["changed"] for m in sent] == [["status", "progress"], ["progress"]]
+    assert sent[1]["status"] == "processing"